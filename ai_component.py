@@ -1,10 +1,6 @@
 import streamlit.components.v1 as components
-import json
-from engine import INSURANCE_SCHEMES
 
 def inject_ai_assistant():
-    kb_json = json.dumps(INSURANCE_SCHEMES)
-    
     # Wrap CSS and HTML structure in st.markdown to fix the appendChild error
     html_css = """
     <style>
@@ -83,6 +79,29 @@ def inject_ai_assistant():
                 
                 if (!progText) return;
                 
+                const API_URL = "http://127.0.0.1:8000";
+                let chatSession = null;
+
+                async function createSession(forecastData, activeContext, userId) {
+                    let forecast = null;
+                    try { forecast = JSON.parse(forecastData); } catch (e) {}
+                    const response = await fetch(API_URL + "/chat/sessions", {
+                        method: "POST",
+                        headers: { "Content-Type": "application/json" },
+                        body: JSON.stringify({ forecast: forecast, context: activeContext, user_id: userId })
+                    });
+                    if (!response.ok) throw new Error("Could not start chat session");
+                    return (await response.json()).session_id;
+                }
+
+                function postMessage(sessionId, text) {
+                    return fetch(API_URL + "/chat/sessions/" + sessionId + "/messages", {
+                        method: "POST",
+                        headers: { "Content-Type": "application/json", "Accept": "text/event-stream" },
+                        body: JSON.stringify({ content: text })
+                    });
+                }
+
                 function appendMsg(text, isUser) {
                     const div = parentDoc.createElement("div");
                     div.className = isUser ? "ai-msg-user" : "ai-msg-ai";
@@ -122,15 +141,9 @@ def inject_ai_assistant():
 
                         const forecastEl = parentDoc.getElementById("idcs-forecast-context");
                         const forecastData = forecastEl ? forecastEl.textContent : "null";
+                        const userEl = parentDoc.getElementById("idcs-user-context");
+                        const userId = userEl && userEl.textContent ? parseInt(userEl.textContent, 10) : null;
                         
-                        let systemPrompt = "Your task is to analyze the CURRENT USER DATA provided in the context below.\\n";
-                        systemPrompt += "- If the 'Predicted Income Path' drops below the 'protection_cap', identify the SPECIFIC MONTH and the PERCENTAGE DROP.\\n";
-                        systemPrompt += "- Format your response as: 'I've analyzed your patterns. You have a [X]% chance of a dip in [Month].'\\n";
-                        systemPrompt += "- Do NOT use example data. Only speak to the numbers provided.\\n";
-                        systemPrompt += "- Knowledge Base: " + JSON.stringify({kb_json}) + "\\n";
-                        systemPrompt += "- Current User Forecast Data: " + forecastData + "\\n";
-                        systemPrompt += "- Application Context: " + activeContext;
-
                         // Logic Guardrail: No data
                         if (forecastData === "null" || forecastData === "[]") {
                             replyNode.textContent = "Please upload your M-Pesa statement so I can analyze your specific risk patterns.";
@@ -139,19 +152,37 @@ def inject_ai_assistant():
                         }
 
                         try {
-                            const response = await fetch("http://127.0.0.1:8000/chat", {
-                                method: "POST",
-                                headers: { "Content-Type": "application/json" },
-                                body: JSON.stringify({
-                                    system_prompt: systemPrompt,
-                                    messages: [{ role: "user", content: text }]
-                                })
-                            });
-                            
+                            // The context is uploaded once per page state; each message then sends only the session id
+                            const contextKey = forecastData + "\\u0000" + activeContext + "\\u0000" + userId;
+                            if (!chatSession || chatSession.key !== contextKey) {
+                                chatSession = { key: contextKey, id: await createSession(forecastData, activeContext, userId) };
+                            }
+                            let response = await postMessage(chatSession.id, text);
+                            if (response.status === 404) {
+                                // Session expired on the server: upload the context again, once
+                                chatSession.id = await createSession(forecastData, activeContext, userId);
+                                response = await postMessage(chatSession.id, text);
+                            }
                             if (!response.ok) throw new Error("Local Network Error");
-                            
-                            const data = await response.json();
-                            replyNode.textContent = data.content;
+
+                            // Server-sent events: render each delta as it arrives
+                            replyNode.textContent = "";
+                            const reader = response.body.getReader();
+                            const decoder = new TextDecoder();
+                            let buffer = "";
+                            while (true) {
+                                const { value, done } = await reader.read();
+                                if (done) break;
+                                buffer += decoder.decode(value, { stream: true });
+                                const events = buffer.split("\\n\\n");
+                                buffer = events.pop();
+                                for (const evt of events) {
+                                    const dataLine = evt.split("\\n").find(line => line.startsWith("data: "));
+                                    if (!dataLine || evt.startsWith("event: done")) continue;
+                                    replyNode.textContent += JSON.parse(dataLine.slice(6)).delta;
+                                    chatMsgs.scrollTop = chatMsgs.scrollHeight;
+                                }
+                            }
                             
                             const quoteBtn = parentDoc.createElement("a");
                             quoteBtn.href = "https://provider-portal-2026.com/quote";
@@ -180,5 +211,4 @@ def inject_ai_assistant():
         }, 500);
     </script>
     """
-    js_code = js_code.replace("{kb_json}", kb_json)
     components.html(js_code, height=0, width=0)
@@ -1,17 +1,28 @@
 import streamlit as st # pyre-ignore[21]
 import json
+import hashlib
+import uuid
 import requests # pyre-ignore[21]
 import pandas as pd # pyre-ignore[21]
 import plotly.graph_objects as go # pyre-ignore[21]
-import plotly.express as px # pyre-ignore[21]
-from data_handler import process_and_group_inflows, summarize_data # pyre-ignore[21]
+from data_handler import process_and_group_inflows, summarize_data, statement_cache_keys, forget_statements # pyre-ignore[21]
 import os
 from pdf_generator import generate_stability_passport, submit_to_provider_api # pyre-ignore[21]
 import time
 from datetime import datetime
 from engine import IDCS_Engine, calculate_custom_premium # pyre-ignore[21]
-import sqlite3
+from forecast_jobs import ForecastJobQueue # pyre-ignore[21]
+from charts import forecast_figure, heatmap_figure # pyre-ignore[21]
+from session_store import get_store # pyre-ignore[21]
+from profile_sync import get_sync as get_profile_sync # pyre-ignore[21]
 import bcrypt # pyre-ignore[21]
+import db_pool # pyre-ignore[21]
+import repository # pyre-ignore[21]
+import tracing # pyre-ignore[21]
+import profiling # pyre-ignore[21]
+import assets # pyre-ignore[21]
+import income_views # pyre-ignore[21]
+from database import init_db # pyre-ignore[21]
 import logging
 
 # --- 0. Privacy & Security Defaults ---
@@ -41,25 +52,35 @@ def load_idcs_model():
     log_event("Model Training Successful")
     return IDCS_Engine()
 
-@st.cache_data
-def get_cached_predictions(_engine, df_monthly, mu):
-    """Caches Prophet forecasting to avoid recalculating on UI re-runs."""
-    return _engine.predict_risk_horizon(df_monthly, mu)
+@st.cache_resource
+def ensure_schema():
+    """Creates tables and applies index migrations once per process."""
+    init_db()
 
-import base64
+@st.cache_resource
+def get_forecast_queue():
+    """Process-wide Prophet job queue: forecasts run on its worker pool, not in the script thread."""
+    queue = ForecastJobQueue(max_workers=1)
+    queue.start()
+    return queue
+
+@st.fragment(run_every=2)
+def await_forecast(job_id):
+    """Polls a queued forecast and reruns the page once it has finished."""
+    job = get_forecast_queue().get(job_id)
+    if job is None or job['status'] in ('done', 'failed'):
+        st.rerun()
 
 @st.cache_resource
 def set_idcs_login_branding():
-    """Injects cinematic Nairobi pictorial branding for login."""
-    img_path = "/media/smilee/64 GB/new/myrepo/assets/logo_pictorial.webp"
-    if os.path.exists(img_path):
-        with open(img_path, "rb") as f:
-            encoded = base64.b64encode(f.read()).decode()
+    """Injects cinematic Nairobi pictorial branding for login (served from app/static, not inlined)."""
+    bg_url = assets.url("login_bg")
+    if bg_url:
         st.markdown(f"""
             <style>
             .stApp {{
                 background: linear-gradient(to right, rgba(0,0,0,0.8), rgba(0,0,0,0)), 
-                            url("data:image/webp;base64,{encoded}");
+                            url("{bg_url}");
                 background-size: cover;
                 background-attachment: fixed;
                 background-position: center;
@@ -79,7 +100,16 @@ def set_idcs_dashboard_branding():
         """, unsafe_allow_html=True)
 
 st.set_page_config(page_title="IDCS Dashboard", page_icon="🏦", layout="wide")
+
+# One correlation id per browser session; every rerun's spans are tagged with it
+if "trace_id" not in st.session_state:
+    st.session_state.trace_id = tracing.new_id()
+tracing.set_trace_id(st.session_state.trace_id)
+# Opt-in sampling profile of this rerun (IDCS_PROFILE=1, or ?profile=<IDCS_PROFILE_TOKEN>)
+if profiling.ENABLED and profiling.requested(st.query_params.get("profile")):
+    profiling.profile_thread(st.session_state.trace_id, "streamlit.rerun")
 verify_encryption()
+ensure_schema()
 
 if not os.path.exists(".streamlit/secrets.toml"):
     st.warning("⚠️ Secrets file (`.streamlit/secrets.toml`) missing! Please initialize it for AI features.")
@@ -105,6 +135,9 @@ if "logged_in" not in st.session_state:
     st.session_state.logged_in = False
 if "temp_paths" not in st.session_state:
     st.session_state.temp_paths = []
+if "store_id" not in st.session_state:
+    # Key of this session's datasets (statement transactions and their views) in the session store
+    st.session_state.store_id = uuid.uuid4().hex
 
 # -- BRANDING INJECTION (Conditional) --
 if not st.session_state.logged_in:
@@ -114,11 +147,8 @@ else:
 
 # Inject Custom CSS
 
-try:
-    with open("style.css") as f:
-        st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
-except FileNotFoundError:
-    pass
+# Read and minified once per process
+st.markdown(f"<style>{assets.css('style.css')}</style>", unsafe_allow_html=True)
 
 # Additional styles are loaded from style.css
 
@@ -165,6 +195,31 @@ def render_claims_roadmap(deferred_days, stage=1):
 def toggle_shock():
     st.session_state.simulate_shock = not st.session_state.simulate_shock
 
+def financial_data():
+    """
+    Monthly frame ('Total Income', optional 'status') the sidebar and evaluation read, or None.
+    st.session_state["financial_data"] holds only the name of its dataset in the session store:
+    "transactions" (the statement's monthly totals view) or "history" (months restored by a sync).
+    """
+    name = st.session_state.get("financial_data")
+    if name == "transactions":
+        income = get_store().view(st.session_state.store_id, "transactions", "income", income_views.build)
+        return income["monthly"] if income is not None else None
+    return get_store().get(st.session_state.store_id, name) if name else None
+
+def evaluation_key(hist_payload, current_income):
+    """Everything an evaluation and its DB writes depend on; equal keys mean the last result still holds."""
+    history_hash = hashlib.sha256(json.dumps(hist_payload, sort_keys=True).encode("utf-8")).hexdigest()
+    return (
+        st.session_state.get('full_name'),
+        st.session_state.get('employment_status'),
+        history_hash,
+        float(current_income),
+        bool(st.session_state.simulate_shock),
+        st.session_state.get('custom_premium', 0),
+        st.session_state.get('deferred_period', 30)
+    )
+
 # -- AUTH STATE INIT --
 if "logged_in" not in st.session_state:
     st.session_state.logged_in = False
@@ -183,9 +238,10 @@ if not st.session_state.logged_in:
         
         with login_col1:
             st.markdown('<div class="idcs-logo-container">', unsafe_allow_html=True)
-            try:
-                st.image("idcs_logo.png", use_container_width=True)
-            except Exception:
+            logo_html = assets.img_tag("logo", "IDCS Portal", sizes="(max-width: 768px) 90vw, 40vw")
+            if logo_html:
+                st.markdown(logo_html, unsafe_allow_html=True)
+            else:
                 # Fallback
                 st.info("IDCS Portal")
             st.markdown('</div>', unsafe_allow_html=True)
@@ -224,13 +280,10 @@ if not st.session_state.logged_in:
                         if password:
                             # Rule 2: Secure Authentication with Bcrypt
                             email = st.session_state.auth_email
-                            with sqlite3.connect("idcs.db") as conn:
-                                cursor = conn.cursor()
-                                cursor.execute("SELECT password_hash FROM users WHERE email=?", (email,))
-                                result = cursor.fetchone()
+                            with db_pool.transaction() as conn:
+                                stored_hash = repository.get_password_hash(conn, email)
                                 
-                                if result:
-                                    stored_hash = result[0]
+                                if stored_hash:
                                     if bcrypt.checkpw(password.encode('utf-8'), stored_hash):
                                         st.session_state.logged_in = True
                                         log_event("User logged in successfully")
@@ -240,8 +293,7 @@ if not st.session_state.logged_in:
                                 else:
                                     # For demo purposes, we auto-register if the user doesn't exist
                                     hashed = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
-                                    cursor.execute("INSERT INTO users (email, password_hash, name) VALUES (?, ?, ?)", 
-                                                 (email, hashed, email.split('@')[0]))
+                                    repository.register_user(conn, email, hashed, email.split('@')[0])
                                     conn.commit()
                                     st.session_state.logged_in = True
                                     log_event("New user registered and logged in")
@@ -263,7 +315,12 @@ from ai_component import inject_ai_assistant # pyre-ignore[21]
 inject_ai_assistant()
 
 # -- DASHBOARD TOP BANNER --
-st.image("idcs_banner.webp", use_container_width=True, caption="IDCS: Kenyan Workforce Prosperity")
+st.markdown(f"""
+<figure style="margin: 0;">
+{assets.img_tag("banner", "IDCS banner")}
+<figcaption style="text-align: center; color: #9e9e9e; font-size: 14px;">IDCS: Kenyan Workforce Prosperity</figcaption>
+</figure>
+""", unsafe_allow_html=True)
 
 # -- SIDEBAR --
 with st.sidebar:
@@ -271,6 +328,9 @@ with st.sidebar:
     st.markdown("### User Identity")
     
     st.session_state.full_name = st.text_input("Full Name", value=st.session_state.get("full_name", ""))
+    if st.session_state.full_name:
+        # Start loading the profile in the background so "Refresh Data" finds it ready
+        get_profile_sync().prefetch(st.session_state.full_name)
     st.session_state.age = st.slider("Age", 18, 65, value=st.session_state.get("age", 30))
     st.session_state.employment_status = st.selectbox("Employment Status", ["Public Full-Time", "Private Contract", "Self-Employed/Jua Kali", "Unemployed"], index=0)
     st.session_state.dependants = st.number_input("Dependants", min_value=0, step=1, value=st.session_state.get("dependants", 0))
@@ -284,14 +344,19 @@ with st.sidebar:
                 genai.configure(api_key=st.secrets["GEMINI_API_KEY"])
                 models = [m.name for m in genai.list_models() if 'generateContent' in m.supported_generation_methods]
                 for m in models:
-                    st.sidebar.markdown(f"<code style='font-size:10px;'>{m}</code>", unsafe_allow_html=True)
+                    st.markdown(f"<code style='font-size:10px;'>{m}</code>", unsafe_allow_html=True)
             except Exception as e:
-                st.sidebar.error("Could not list models. Check API Key.")
+                st.error("Could not list models. Check API Key.")
         else:
-            st.sidebar.warning("Key missing for Doctor")
-    
-    if st.sidebar.checkbox("Show Available AI Models"):
-        list_available_models()
+            st.warning("Key missing for Doctor")
+
+    @st.fragment
+    def render_model_doctor():
+        """Toggling the model listing only reruns this panel."""
+        if st.checkbox("Show Available AI Models"):
+            list_available_models()
+
+    render_model_doctor()
 
     st.markdown("---")
     st.markdown("### Current Month Data")
@@ -300,8 +365,8 @@ with st.sidebar:
     # Initial Metric calculation for UI caps
     import numpy as np # pyre-ignore[21]
     st.session_state.dip_probability = 0
-    if "financial_data" in st.session_state and st.session_state["financial_data"] is not None:
-        df_fin = st.session_state["financial_data"]
+    df_fin = financial_data()
+    if df_fin is not None:
         incomes = df_fin['Total Income'].tolist()
         incomes.append(current_income)
         st.session_state.live_mu = float(np.mean(incomes))
@@ -318,54 +383,66 @@ with st.sidebar:
     st.markdown("---")
     st.markdown("### Premium & Underwriting")
     
-    st.session_state.deferred_period = st.select_slider(
-        "Deferred Period",
-        options=[30, 60, 90],
-        value=st.session_state.get("deferred_period", 30),
-        help="Longer periods reduce your monthly premium."
-    )
-    st.caption(f"Waiting Period: {st.session_state.deferred_period} Days")
-
-    # Benefit target capped at 70% of mean
-    mu_val = st.session_state.live_mu
-    max_benefit = mu_val * 0.70
-    st.session_state.benefit_target = st.number_input(
-        "Monthly Benefit Target (KES)",
-        min_value=0.0,
-        max_value=float(max_benefit),
-        value=st.session_state.get("benefit_target", min(30000.0, max_benefit)),
-        step=1000.0
-    )
-
-    st.info(f"Capped at 70% of mean: KES {max_benefit:,.0f}")
-
-    # Session State Safety
-    if 'mu_val' not in st.session_state: 
-        st.session_state.mu_val = 0.0
-    if 'dip_prob' not in st.session_state:
-        st.session_state.dip_prob = st.session_state.get('dip_probability', 0.0)
-
-    user_age = st.session_state.age
-    user_deps = st.session_state.dependants
-    user_emp = st.session_state.employment_status
-
-    # Calculate Custom Premium
-    if mu_val > 0:
-        st.session_state.mu_val = mu_val
-        st.session_state.custom_premium, st.session_state.max_comp = calculate_custom_premium(
-            mean=st.session_state.mu_val,
-            dip_probability=st.session_state.dip_prob,
-            age=user_age,
-            dependencies=user_deps,
-            employment_status=user_emp,
-            risk_score=st.session_state.get('risk_score', 0)
+    @st.fragment
+    def render_premium_panel():
+        """
+        Deferred period, benefit target and premium. Tweaking them reruns only this panel;
+        a deferred-period change escalates to a full rerun while an evaluation depends on it.
+        """
+        previous_deferred = st.session_state.get("deferred_period", 30)
+        st.session_state.deferred_period = st.select_slider(
+            "Deferred Period",
+            options=[30, 60, 90],
+            value=st.session_state.get("deferred_period", 30),
+            help="Longer periods reduce your monthly premium."
+        )
+        st.caption(f"Waiting Period: {st.session_state.deferred_period} Days")
+
+        # Benefit target capped at 70% of mean
+        mu_val = st.session_state.live_mu
+        max_benefit = mu_val * 0.70
+        st.session_state.benefit_target = st.number_input(
+            "Monthly Benefit Target (KES)",
+            min_value=0.0,
+            max_value=float(max_benefit),
+            value=st.session_state.get("benefit_target", min(30000.0, max_benefit)),
+            step=1000.0
         )
-        st.markdown(f"""
-        <div class="premium-glow">
-            <div style="font-size: 14px; color: #00d296; text-transform: uppercase; letter-spacing: 1px;">Monthly Premium</div>
-            Ksh {st.session_state.custom_premium:,.2f}
-        </div>
-        """, unsafe_allow_html=True)
+
+        st.info(f"Capped at 70% of mean: KES {max_benefit:,.0f}")
+
+        # Session State Safety
+        if 'mu_val' not in st.session_state: 
+            st.session_state.mu_val = 0.0
+        if 'dip_prob' not in st.session_state:
+            st.session_state.dip_prob = st.session_state.get('dip_probability', 0.0)
+
+        user_age = st.session_state.age
+        user_deps = st.session_state.dependants
+        user_emp = st.session_state.employment_status
+
+        # Calculate Custom Premium
+        if mu_val > 0:
+            st.session_state.mu_val = mu_val
+            st.session_state.custom_premium, st.session_state.max_comp = calculate_custom_premium(
+                mean=st.session_state.mu_val,
+                dip_probability=st.session_state.dip_prob,
+                age=user_age,
+                dependencies=user_deps,
+                employment_status=user_emp,
+                risk_score=st.session_state.get('risk_score', 0)
+            )
+            st.markdown(f"""
+            <div class="premium-glow">
+                <div style="font-size: 14px; color: #00d296; text-transform: uppercase; letter-spacing: 1px;">Monthly Premium</div>
+                Ksh {st.session_state.custom_premium:,.2f}
+            </div>
+            """, unsafe_allow_html=True)
+
+        if st.session_state.deferred_period != previous_deferred and st.session_state.get('last_user'):
+            st.rerun()
+
+    render_premium_panel()
 
 
 
@@ -381,88 +458,79 @@ with st.sidebar:
         if st.session_state.full_name:
             with st.status("Syncing Profile...", expanded=True) as status:
                 st.markdown('<div class="sync-card">', unsafe_allow_html=True)
-                
+
+                def sync_step(label):
+                    icon_col, text_col = st.columns([1, 5])
+                    with icon_col:
+                        icon = st.empty()
+                        icon.markdown("<div class='sync-indicator icon-amber'>⏳</div>", unsafe_allow_html=True)
+                    with text_col:
+                        text = st.empty()
+                        text.markdown(f"<div style='margin-top: 4px; font-weight: 500;'>{label}</div>", unsafe_allow_html=True)
+                    return icon, text
+
+                def step_done(icon, text, label):
+                    icon.markdown("<div class='icon-emerald'>✅</div>", unsafe_allow_html=True)
+                    text.markdown(f"<div style='margin-top: 4px; color: #aaa;'>{label}</div>", unsafe_allow_html=True)
+
+                # Usually already loading since the Full Name was entered; a load that has
+                # already finished is redone so Refresh always reads the current records. Each
+                # step is ticked off when the background load actually reaches it
+                fetch = get_profile_sync().prefetch(st.session_state.full_name, fresh=True)
+
                 # Step 1: DB Check
-                step1_col1, step1_col2 = st.columns([1, 5])
-                with step1_col1:
-                    icon1 = st.empty()
-                    icon1.markdown("<div class='sync-indicator icon-amber'>⏳</div>", unsafe_allow_html=True)
-                with step1_col2:
-                    text1 = st.empty()
-                    text1.markdown("<div style='margin-top: 4px; font-weight: 500;'>Connecting to DB...</div>", unsafe_allow_html=True)
-                
-                time.sleep(1) # Visual delay for effect
-                icon1.markdown("<div class='icon-emerald'>✅</div>", unsafe_allow_html=True)
-                text1.markdown("<div style='margin-top: 4px; color: #aaa;'>DB Connection Verified</div>", unsafe_allow_html=True)
-                
-                # Progress line
-                st.markdown("<div class='vertical-progress-line'></div>", unsafe_allow_html=True)
-                
-                # Step 2: Profile Load
-                step2_col1, step2_col2 = st.columns([1, 5])
-                with step2_col1:
-                    icon2 = st.empty()
-                    icon2.markdown("<div class='sync-indicator icon-amber'>⏳</div>", unsafe_allow_html=True)
-                with step2_col2:
-                    text2 = st.empty()
-                    text2.markdown("<div style='margin-top: 4px; font-weight: 500;'>Loading Cloud Profile...</div>", unsafe_allow_html=True)
-                
+                icon1, text1 = sync_step("Connecting to DB...")
                 try:
-                    name_escape = st.session_state.full_name.replace("'", "''")
-                    with sqlite3.connect("idcs.db", timeout=10.0) as conn:
-                        user_df = pd.read_sql(f"SELECT * FROM users WHERE name='{name_escape}'", conn)
-                        if not user_df.empty:
-                            user_id = user_df.iloc[0]['id']
-                            st.session_state.current_user_id = int(user_id)
-                            udata_is_new = False
-                            hist_df = pd.read_sql(f"SELECT income_amount as amount, status, month_index as month FROM income_history WHERE user_id={user_id} ORDER BY month_index", conn)
-                            udata_history = hist_df.to_dict('records') if not hist_df.empty else []
-                        else:
-                            cursor = conn.cursor()
-                            cursor.execute("INSERT INTO users (name, age, employment_type, src_cap, src_tax_bracket) VALUES (?, ?, ?, ?, ?)", (st.session_state.full_name, st.session_state.age, st.session_state.employment_status, 50000.0, 'Bracket 3'))
-                            conn.commit()
-                            st.session_state.current_user_id = cursor.lastrowid
-                            udata_is_new = True
-                            udata_history = []
-                    
-                    if True:
-                        time.sleep(0.5)
-                        icon2.markdown("<div class='icon-emerald'>✅</div>", unsafe_allow_html=True)
-                        if udata_is_new:
-                            text2.markdown("<div style='margin-top: 4px; color: #aaa;'>New Profile Configured</div>", unsafe_allow_html=True)
-                            st.session_state["financial_data"] = None
-                        else:
-                            text2.markdown("<div style='margin-top: 4px; color: #aaa;'>Profile Loaded</div>", unsafe_allow_html=True)
-                            
-                        # Progress line
-                        st.markdown("<div class='vertical-progress-line'></div>", unsafe_allow_html=True)
-                            
-                        # Step 3: Data Refresh
-                        step3_col1, step3_col2 = st.columns([1, 5])
-                        with step3_col1:
-                            icon3 = st.empty()
-                            icon3.markdown("<div class='sync-indicator icon-amber'>⏳</div>", unsafe_allow_html=True)
-                        with step3_col2:
-                            text3 = st.empty()
-                            text3.markdown("<div style='margin-top: 4px; font-weight: 500;'>Refreshing Datasets...</div>", unsafe_allow_html=True)
-                            
-                        time.sleep(0.8)
-                        if not udata_is_new and udata_history:
-                            df_hist = pd.DataFrame(udata_history)
-                            df_hist['Month'] = df_hist['month']
-                            df_hist['Total Income'] = df_hist['amount']
-                            st.session_state["financial_data"] = df_hist
-                            text3.markdown("<div style='margin-top: 4px; color: #aaa;'>Historical Data Restored</div>", unsafe_allow_html=True)
-                        else:
-                            text3.markdown("<div style='margin-top: 4px; color: #aaa;'>Data Refresh Complete</div>", unsafe_allow_html=True)
-                        
-                        icon3.markdown("<div class='icon-emerald'>✅</div>", unsafe_allow_html=True)
-                        st.markdown('</div>', unsafe_allow_html=True) # close sync-card
-                        
-                        st.session_state.last_sync_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                        status.update(label="Sync Completed!", state="complete", expanded=False)
-                        st.success("Successfully synced all profile assets.")
+                    for event in fetch.events():
+                        if event["step"] == "error":
+                            raise RuntimeError(event["message"])
+
+                        if event["step"] == "connected":
+                            step_done(icon1, text1, "DB Connection Verified")
+                            st.markdown("<div class='vertical-progress-line'></div>", unsafe_allow_html=True)
+                            # Step 2: Profile Load
+                            icon2, text2 = sync_step("Loading Cloud Profile...")
+
+                        elif event["step"] == "profile":
+                            if event["found"]:
+                                st.session_state.current_user_id = int(fetch.user['id'])
+                                step_done(icon2, text2, "Profile Loaded")
+                            else:
+                                with db_pool.transaction() as conn:
+                                    st.session_state.current_user_id = repository.create_user(conn, st.session_state.full_name, st.session_state.age, st.session_state.employment_status)
+                                get_profile_sync().invalidate(st.session_state.full_name)
+                                st.session_state["financial_data"] = None
+                                step_done(icon2, text2, "New Profile Configured")
+                            st.markdown("<div class='vertical-progress-line'></div>", unsafe_allow_html=True)
+                            # Step 3: Data Refresh
+                            icon3, text3 = sync_step("Refreshing Datasets...")
+
+                        elif event["step"] == "datasets":
+                            if fetch.transactions is not None:
+                                # Stored statement rows: the forecast pipeline below re-runs without a new upload.
+                                # The fetch is shared across sessions, so this session keeps its own copy
+                                df_tx = fetch.transactions.copy()
+                                get_store().put(st.session_state.store_id, "transactions", df_tx)
+                                get_store().view(st.session_state.store_id, "transactions", "income", income_views.build)
+                                st.session_state.statement_cache_keys = st.session_state.get('statement_cache_keys', []) + statement_cache_keys(
+                                    df_tx=df_tx)
+                                step_done(icon3, text3, "Statement Transactions Restored")
+                            elif fetch.history:
+                                df_hist = pd.DataFrame(fetch.history)
+                                df_hist['Month'] = df_hist['month']
+                                df_hist['Total Income'] = df_hist['amount']
+                                get_store().put(st.session_state.store_id, "history", df_hist)
+                                st.session_state["financial_data"] = "history"
+                                step_done(icon3, text3, "Historical Data Restored")
+                            else:
+                                step_done(icon3, text3, "Data Refresh Complete")
+
+                    st.markdown('</div>', unsafe_allow_html=True) # close sync-card
+                    st.session_state.last_sync_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                    status.update(label="Sync Completed!", state="complete", expanded=False)
+                    st.success("Successfully synced all profile assets.")
                 except Exception as e:
+                    get_profile_sync().invalidate(st.session_state.full_name)
                     st.markdown('</div>', unsafe_allow_html=True)
                     status.update(label="Sync Error", state="error", expanded=False)
                     st.error("Could not connect to backend API.")
@@ -479,8 +547,8 @@ with st.sidebar:
     live_mu = st.session_state.live_mu
     live_sigma = st.session_state.live_sigma
     
-    if "financial_data" in st.session_state and st.session_state["financial_data"] is not None:
-        df_fin = st.session_state["financial_data"]
+    df_fin = financial_data()
+    if df_fin is not None:
         unpaid_months = int((df_fin.get('status', pd.Series(["Paid"]*len(df_fin))) == "Unpaid").sum()) # pyre-ignore[16]
         w_emp = 1.1 if st.session_state.get('employment_status') in ["Public Full-Time", "Private Contract"] else 1.0
         
@@ -529,10 +597,14 @@ with st.sidebar:
     )
     st.plotly_chart(fig_gauge, use_container_width=True)
     
-    try:
-        fig_gauge.write_image("gauge.png")
-    except Exception:
-        pass
+    # Kaleido export for the passport PDF is slow; only redo it when the gauge itself changes
+    gauge_key = (st.session_state.stability_score, 'threshold' in gauge_config)
+    if st.session_state.get('gauge_png_key') != gauge_key:
+        try:
+            fig_gauge.write_image("gauge.png")
+            st.session_state.gauge_png_key = gauge_key
+        except Exception:
+            pass
     
     st.markdown("<br>", unsafe_allow_html=True)
     check_btn = st.button("Evaluate Claim", type="primary", use_container_width=True)
@@ -584,12 +656,22 @@ if st.button("🔄 Sync & Analyze Statement", type="primary"):
             
             mpesa_content = mpesa_upload.getvalue() if mpesa_upload else None
             bank_content = bank_upload.getvalue() if bank_upload else None
-            df_hist, monthly_avg_data, raw_list = process_and_group_inflows(mpesa_content, bank_content)
+            with tracing.span("app.statement_sync", mpesa=bool(mpesa_content), bank=bool(bank_content)):
+                df_hist, monthly_avg_data, raw_list = process_and_group_inflows(mpesa_content, bank_content)
             
             if not df_hist.empty:
-                st.session_state["financial_data"] = df_hist
-                st.session_state["monthly_inflow"] = monthly_avg_data
-                st.session_state["raw_income_data"] = raw_list  # Store as requested
+                # One columnar copy per session; monthly totals and the analysis frame are views of it
+                get_store().put(st.session_state.store_id, "transactions", df_hist[['date', 'amount', 'description']])
+                get_store().view(st.session_state.store_id, "transactions", "income", income_views.build)
+                # Shared-cache entries derived from this statement, purged by "Wipe My Profile"
+                st.session_state.statement_cache_keys = st.session_state.get('statement_cache_keys', []) + statement_cache_keys(
+                    mpesa_content, bank_content, get_store().get(st.session_state.store_id, "transactions"))
+                st.session_state["financial_data"] = "transactions"
+                if st.session_state.get("current_user_id"):
+                    # Persist raw rows so later syncs can recompute forecasts from storage
+                    with db_pool.transaction() as conn:
+                        repository.replace_transactions(conn, st.session_state.current_user_id, raw_list)
+                    get_profile_sync().invalidate(st.session_state.full_name)
                 st.session_state.live_mu = float(df_hist['amount'].mean())
                 st.session_state.live_sigma = float(df_hist.get('amount', pd.Series([0])).std())
                 st.success(f"Vision Extraction Complete! Analyzed {len(monthly_avg_data)} months of income history.")
@@ -600,117 +682,92 @@ if st.button("🔄 Sync & Analyze Statement", type="primary"):
             st.session_state["financial_data"] = None
 
 # Step 1 Legacy: Data Preview / Heatmap
-if "monthly_inflow" in st.session_state:
+@st.fragment
+def render_income_history():
+    """Table, heatmap and summary of the grouped statement; depends only on the session's transactions."""
+    store = get_store()
+    views = store.view(st.session_state.store_id, "transactions", "income", income_views.build)
+    if not views:
+        return
     st.markdown("### 📊 Income History (Foundation for Predictor)")
     
     col_t1, col_t2 = st.columns([1, 2])
     
     with col_t1:
         # Display as a table
-        history_data = [
-            {"Month": m, "Inflow (KES)": f"{amt:,.2f}", "Status": "Stable" if amt > 0 else "🚨 DIP"}
-            for m, amt in st.session_state.monthly_inflow.items()
-        ]
-        st.table(pd.DataFrame(history_data))
+        st.table(views["history_table"])
         
     with col_t2:
         st.markdown("#### 🔥 Monthly Income Heatmap")
-        # Prepare data for heatmap
-        m_data = st.session_state.monthly_inflow
-        df_h = pd.DataFrame(list(m_data.items()), columns=['Month', 'Amount'])
-        df_h['Year'] = df_h['Month'].apply(lambda x: x.split('-')[0])
-        # Force month order
-        all_months = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
-        df_h['MonthName'] = df_h['Month'].apply(lambda x: datetime.strptime(x, '%Y-%m').strftime('%b'))
-        
-        # Pivot for heatmap
-        pivot_h = df_h.pivot(index="Year", columns="MonthName", values="Amount").fillna(0)
-        # Reorder columns to ensure Jan-Dec
-        available_cols = [m for m in all_months if m in pivot_h.columns]
-        pivot_h = pivot_h[available_cols]
-        
-        fig_h = px.imshow(pivot_h, 
-                          labels=dict(x="Month", y="Year", color="Inflow (KES)"),
-                          color_continuous_scale='Viridis',
-                          text_auto='.2s')
-        
-        fig_h.update_layout(
-            paper_bgcolor='rgba(0,0,0,0)', 
-            plot_bgcolor='rgba(0,0,0,0)', 
-            font=dict(color='white'),
-            margin=dict(l=20, r=20, t=20, b=20),
-            height=300
-        )
-        st.plotly_chart(fig_h, use_container_width=True)
+        with tracing.span("app.heatmap", months=len(views["monthly_inflow"])):
+            fig_h = store.view(st.session_state.store_id, "transactions", "heatmap_figure",
+                               lambda _df: heatmap_figure(views["heatmap"]))
+            st.plotly_chart(fig_h, use_container_width=True)
 
-    if st.session_state.get("raw_income_data"):
-        with st.expander("View Human-Readable Summary"):
-            st.write(summarize_data(st.session_state.raw_income_data))
+    with st.expander("View Human-Readable Summary"):
+        st.write(summarize_data(store.get(st.session_state.store_id, "transactions")))
 
-# Use session state to avoid NameError
-live_mu = st.session_state.get('live_mu', 0)
+render_income_history()
 
-if "raw_income_data" in st.session_state and st.session_state["raw_income_data"]:
-    # 1. Standardization Wrapper
-    df_raw = pd.DataFrame(st.session_state.raw_income_data)
-    # Force Column Mapping
-    column_map = {'amount': 'Total Income', 'credit': 'Total Income', 'value': 'Total Income', 'date': 'TransactionDate', 'description': 'Description'}
-    df_raw = df_raw.rename(columns=column_map)
-    
-    # 2. Handle Grouping (The Monthly Aggregate)
-    df_raw['Month'] = pd.to_datetime(df_raw['TransactionDate']).dt.strftime('%Y-%m')
-    df_monthly = df_raw.groupby('Month')['Total Income'].sum().reset_index()
-    
-    # Standardize 'Month' column name for downstream compatibility
-    df_monthly = df_monthly.rename(columns={'Month': 'MonthGroup'}) # Avoiding keyword conflict
-    
-    # Calculate mu from grouped monthly totals
-    mu = float(df_monthly['Total Income'].mean())
-    st.session_state.live_mu = mu
-    
-    # Rule 1: ENFORCE DATA VOLATILITY
-    for temp_path in st.session_state.get('temp_paths', []):
-        if os.path.exists(temp_path):
-            os.remove(str(temp_path)) # pyre-ignore[6]
-    st.session_state.temp_paths = []
-    
-    # 3. Fix the Variance Calculation
-    df_monthly['Variance from Average'] = df_monthly['Total Income'] - mu
-    # Sync with session state for Step 2 Predictor
-    st.session_state["financial_data"] = df_monthly
-    st.session_state.df_analysis = df_monthly
-    
-    # 4. Predictive Logic Transition (Prophet Integration)
-    engine = load_idcs_model()
-    # Prophet logic expects 'month' and 'mu'
-    predictions, risk_score, prophet_md = get_cached_predictions(engine, df_monthly.rename(columns={'MonthGroup': 'month'}), mu)
+
+@st.fragment
+def render_forecast(df_monthly, mu):
+    """Queued Prophet forecast, chart and risk alerts for the grouped monthly history."""
+    # 4. Predictive Logic Transition (Prophet job queue)
+    # Prophet logic expects 'month' and 'mu'; identical inputs reuse the same job across reruns
+    df_prophet_in = df_monthly.rename(columns={'MonthGroup': 'month'})
+    forecast_queue = get_forecast_queue()
+    history = df_prophet_in.rename(columns={'Total Income': 'amount'})[['month', 'amount']].to_dict('records')
+    st.markdown("<h3 style='color: #fff;'>Predicted Income Path (Next 6 Mo)</h3>", unsafe_allow_html=True)
+    if len(history) < 2:
+        # Prophet can't fit a single point; don't queue a job that is bound to fail
+        st.session_state.predictions = []
+        st.session_state.risk_score = 0
+        st.info("A forecast needs at least 2 months of income history.")
+        return
+
+    # Remember the job per input so plain reruns read it instead of re-enqueuing (a DB write).
+    # A failed job stays on screen until the user retries it, so a failure never loops.
+    forecast_key = (tuple((h['month'], float(h['amount'])) for h in history), mu)
+    forecast_job = None
+    if st.session_state.get('forecast_key') == forecast_key:
+        forecast_job = forecast_queue.get(st.session_state.forecast_job_id)
+    if forecast_job is None:
+        st.session_state.forecast_job_id = forecast_queue.enqueue(history, mu)
+        st.session_state.forecast_key = forecast_key
+        forecast_job = forecast_queue.get(st.session_state.forecast_job_id)
+
+    forecast = None
+    predictions, risk_score = [], 0
+    if forecast_job['status'] == 'done':
+        predictions = forecast_job['result']['predictions']
+        risk_score = forecast_job['result']['risk_score']
+        if forecast_job['result']['forecast']:
+            forecast = pd.DataFrame(forecast_job['result']['forecast'])
+            forecast['ds'] = pd.to_datetime(forecast['ds'])
     st.session_state.predictions = predictions
     st.session_state.risk_score = risk_score
-    
-    if prophet_md:
-        _, forecast = prophet_md
+
+    if forecast is not None:
         # Save forecast summary for AI Assistant (Dynamic)
         summary_df = forecast.tail(6)[['ds', 'yhat', 'yhat_lower']]
         st.session_state.prophet_forecast = summary_df
-    
+
     # UI Analytics: 6-Month Risk Horizon
-    st.markdown("<h3 style='color: #fff;'>Predicted Income Path (Next 6 Mo)</h3>", unsafe_allow_html=True)
-    
-    if prophet_md:
-        model, forecast = prophet_md
+    if forecast_job['status'] in ('pending', 'running'):
+        st.info("⏳ Forecasting your income path in the background...")
+        await_forecast(forecast_job['job_id'])
+    elif forecast_job['status'] == 'failed':
+        st.error(f"Forecast failed: {forecast_job['error']}")
+        if st.button("🔁 Retry Forecast", key="retry_forecast"):
+            st.session_state.forecast_job_id = forecast_queue.enqueue(history, mu)
+            st.rerun(scope="fragment")
+
+    if forecast is not None:
         # 5. Visualization: Show Prophet forecast chart
-        fig_p = model.plot(forecast)
-        ax = fig_p.gca()
-        
-        # Highlight 'High Risk' months with a Red Overlay
-        threshold = mu * 0.7
-        future_forecast = forecast.tail(6)
-        for _, row in future_forecast.iterrows():
-            if row['yhat_lower'] < threshold:
-                ax.axvspan(row['ds'], row['ds'] + pd.DateOffset(months=1), color='red', alpha=0.2, label='High Risk Dip' if 'High Risk Dip' not in [l.get_label() for l in ax.get_lines()] else "")
-        
-        st.pyplot(fig_p)
-        
+        with tracing.span("app.forecast_chart"):
+            st.plotly_chart(forecast_figure(history, forecast_job['result']['forecast'], mu), use_container_width=True)
+
     if st.session_state.get('predictions'):
         st.markdown("#### High Risk Horizon Alerts")
         pred_cols = st.columns(6)
@@ -728,32 +785,36 @@ if "raw_income_data" in st.session_state and st.session_state["raw_income_data"]
                 if p_data['is_high_risk']:
                     st.caption("🚨 High Risk Dip")
 
+
+@st.fragment
+def render_plans(mu):
+    """Plan cards; choosing a plan reruns only this section unless an evaluation is on screen."""
     # --- NEW: DYNAMIC VS. UPFRONT PRICING LOGIC ---
     st.markdown("---")
     st.markdown("<h3 style='color: #fff; text-align: center;'>Choose Your Income Safety Plan</h3>", unsafe_allow_html=True)
-    
+
     # 1. CALCULATE BASE PREMIUMS
     base_rate = st.session_state.get('custom_premium', mu * 0.02)
     next_6_months_premiums = []
-    
+
     for p_data in st.session_state.predictions:
         # Formula: Monthly_Premium = (Base_Rate * (1 + Risk_Score_Monthly))
         # Risk_Score_Monthly: 0.5 if high risk, else 0
         risk_score_monthly = 0.5 if p_data['is_high_risk'] else 0.0
         m_premium = base_rate * (1 + risk_score_monthly)
         next_6_months_premiums.append(m_premium)
-    
+
     # 2. DEFINE THE TWO PATHS
     # Path A (Dynamic): Current premium + 5% convenience fee
     dynamic_premium = base_rate * 1.05
-    
+
     # Path B (Upfront): Sum of 6 months - 15% discount
     upfront_total = sum(next_6_months_premiums) * 0.85
     savings = sum(next_6_months_premiums) - upfront_total
 
     # 3. CREATE THE SELECTION UI
     plan_col1, plan_col2 = st.columns(2, gap="large")
-    
+
     with plan_col1:
         st.markdown(f"""
         <div class="plan-card">
@@ -768,7 +829,8 @@ if "raw_income_data" in st.session_state and st.session_state["raw_income_data"]
         if st.button("Select Monthly", type="secondary", use_container_width=True):
             st.session_state.selected_plan = "Monthly"
             st.session_state.final_premium = dynamic_premium
-            st.rerun()
+            # The evaluation's AI context reports the plan, so refresh everything while it is shown
+            st.rerun(scope="app" if st.session_state.get('last_user') else "fragment")
 
     with plan_col2:
         st.markdown(f"""
@@ -784,7 +846,8 @@ if "raw_income_data" in st.session_state and st.session_state["raw_income_data"]
         if st.button("Select Upfront", type="primary", use_container_width=True):
             st.session_state.selected_plan = "Upfront"
             st.session_state.final_premium = upfront_total
-            st.rerun()
+            # The evaluation's AI context reports the plan, so refresh everything while it is shown
+            st.rerun(scope="app" if st.session_state.get('last_user') else "fragment")
 
     # 5. FEEDBACK
     if st.session_state.selected_plan:
@@ -793,6 +856,28 @@ if "raw_income_data" in st.session_state and st.session_state["raw_income_data"]
             st.success(f"🎊 **Plan locked!** You saved KES {savings:,.0f} compared to the dynamic forecast. Your 6-month shield is active.")
         else:
             st.info(f"✅ **Monthly Plan Active.** Your subscription is set to KES {dynamic_premium:,.0f}/mo. Premium will refresh next month based on history.")
+
+# Use session state to avoid NameError
+live_mu = st.session_state.get('live_mu', 0)
+
+income = get_store().view(st.session_state.store_id, "transactions", "income", income_views.build)
+if income is not None:
+    # Monthly totals, mu and variances were computed once when the statement was ingested
+    df_monthly = income["monthly"]
+    mu = income["mu"]
+    st.session_state.live_mu = mu
+    
+    # Rule 1: ENFORCE DATA VOLATILITY
+    for temp_path in st.session_state.get('temp_paths', []):
+        if os.path.exists(temp_path):
+            os.remove(str(temp_path)) # pyre-ignore[6]
+    st.session_state.temp_paths = []
+    
+    # Step 2 Predictor reads the same view through its handle
+    st.session_state["financial_data"] = "transactions"
+    
+    render_forecast(df_monthly, mu)
+    render_plans(mu)
     
     st.markdown("---")
     
@@ -819,7 +904,7 @@ if "raw_income_data" in st.session_state and st.session_state["raw_income_data"]
     # Generate context for AI Assistant
     pct_diff = ((mu - current_month_income) / mu) * 100 if mu > 0 else 0
     dip_status = f"{pct_diff:.1f}% dip" if current_month_income < mu else "no significant dip"
-    variance_str = ", ".join([f"{row['MonthGroup']} (Var: {row['Variance from Average']:,.0f})" for _, row in df_monthly.iterrows()])
+    variance_str = income["variance_trace"]
     
     # Prepare Forecast JSON for AI Assistant
     if st.session_state.prophet_forecast is not None:
@@ -828,6 +913,8 @@ if "raw_income_data" in st.session_state and st.session_state["raw_income_data"]
     else:
         forecast_json = "null"
     st.markdown(f"<div id='idcs-forecast-context' style='display:none;'>{forecast_json}</div>", unsafe_allow_html=True)
+    # Links chat sessions to this profile so "Wipe My Profile" deletes them too
+    st.markdown(f"<div id='idcs-user-context' style='display:none;'>{st.session_state.get('current_user_id') or ''}</div>", unsafe_allow_html=True)
     
     fin_ai_ctx = f"Financial Review: Verified Average is KES {mu:,.2f}. Manual Input for Current Month is KES {current_month_income:,.2f}. Stability Score: {st.session_state.get('stability_score', 0):.1f}. Risk Score: {st.session_state.get('risk_score', 0):.1f}. Dip Status: {dip_status}. Variance Trace: {variance_str}."
     st.markdown(f"<div id='financial-verification-context' style='display:none;'>{fin_ai_ctx}</div>", unsafe_allow_html=True)
@@ -837,16 +924,15 @@ else:
     st.markdown("---")
 
 
-if check_btn or st.session_state.get('last_user'):
-    st.session_state.last_user = st.session_state.get('full_name')
-    
-    if not st.session_state.get('full_name'):
-        st.error("👈 Please enter your Full Name in the sidebar.")
-        st.stop()
-        
+@st.fragment
+def render_evaluation(current_income):
+    """
+    Persists the profile and renders the evaluation tabs. Interactions inside the tabs
+    (export, wipe) rerun only this section.
+    """
     hist_payload = []
-    if "financial_data" in st.session_state and st.session_state["financial_data"] is not None:
-        df_fin = st.session_state["financial_data"]
+    df_fin = financial_data()
+    if df_fin is not None:
         for _, row in df_fin.iterrows():
             hist_payload.append({
                 "amount": float(row["Total Income"]),
@@ -862,47 +948,51 @@ if check_btn or st.session_state.get('last_user'):
 
     with st.spinner("Analyzing actuarial parameters..."):
         try:
-            name_escape = st.session_state.full_name.replace("'", "''")
-            with sqlite3.connect("idcs.db", timeout=10.0) as conn:
-                user_df = pd.read_sql(f"SELECT * FROM users WHERE name='{name_escape}'", conn)
-                cursor = conn.cursor()
-                if user_df.empty:
-                    cursor.execute("INSERT INTO users (name, age, employment_type, src_cap, src_tax_bracket) VALUES (?, ?, ?, ?, ?)", (st.session_state.full_name, st.session_state.age, st.session_state.employment_status, 50000.0, 'Bracket 3'))
-                    user_id = cursor.lastrowid
-                    if hist_payload:
-                        for idx, inc in enumerate(hist_payload):
-                            cursor.execute("INSERT INTO income_history (user_id, month_index, income_amount, status) VALUES (?, ?, ?, ?)", (user_id, idx+1, inc['amount'], inc['status']))
-                else:
-                    user_id = user_df.iloc[0]['id']
-                
-                cursor.execute("UPDATE users SET premium=?, deferred_period=? WHERE id=?", (float(st.session_state.get('custom_premium', 0)), int(st.session_state.get('deferred_period', 30)), user_id))
-                conn.commit()
-                
-            w_emp = 1.1 if st.session_state.employment_status == "SRC_Teacher" else 1.0
-            idcs_model = load_idcs_model()
-            eval_data = idcs_model.calculate_metrics(
-                income_history=hist_payload,
-                src_cap=50000.0,
-                current_income=income_to_evaluate,
-                w_emp=w_emp
-            )
-            
+            # Reruns with unchanged inputs reuse the last result and skip the DB round trip
+            eval_key = evaluation_key(hist_payload, current_income)
+            memo = st.session_state.get('evaluation_memo')
+            if memo is not None and memo[0] == eval_key:
+                eval_data = memo[1]
+            else:
+                with tracing.span("app.evaluation_persist"), db_pool.transaction() as conn:
+                    db_user = repository.find_user_by_name(conn, st.session_state.full_name)
+                    if db_user is None:
+                        user_id = repository.create_user(conn, st.session_state.full_name, st.session_state.age, st.session_state.employment_status)
+                        if hist_payload:
+                            repository.add_income_history(conn, user_id, hist_payload)
+                    else:
+                        user_id = db_user['id']
+
+                    repository.update_premium(conn, user_id, st.session_state.get('custom_premium', 0), st.session_state.get('deferred_period', 30))
+                    conn.commit()
+                get_profile_sync().invalidate(st.session_state.full_name)
+
+                w_emp = 1.1 if st.session_state.employment_status == "SRC_Teacher" else 1.0
+                idcs_model = load_idcs_model()
+                eval_data = idcs_model.calculate_metrics(
+                    income_history=hist_payload,
+                    src_cap=50000.0,
+                    current_income=income_to_evaluate,
+                    w_emp=w_emp
+                )
+                st.session_state.evaluation_memo = (eval_key, eval_data)
+
             if True:
                 user = {"name": st.session_state.full_name, "employment_type": st.session_state.employment_status, "src_cap": 50000.0}
                 history = hist_payload
-                
+
                 # Header Micro-humanization
                 st.markdown(f"<h3 style='color: #fff; margin-bottom: 24px;'>Habari, {user['name']}. Let's check your income health today.</h3>", unsafe_allow_html=True)
-                
+
                 from engine import INSURANCE_SCHEMES, calculate_match_score # pyre-ignore[21]
-                
+
                 user_profile = {
                     'employment_status': st.session_state.get('employment_status', ''),
                     'dependants': st.session_state.get('dependants', 0),
                     'mu': eval_data['mu'],
                     'sigma': eval_data['sigma']
                 }
-                
+
                 scored_schemes = []
                 for s_name, s_data in INSURANCE_SCHEMES.items():
                     score = calculate_match_score(user_profile, s_name)
@@ -913,10 +1003,10 @@ if check_btn or st.session_state.get('last_user'):
                         "Coverage Limit": s_data['key_benefit'],
                         "Match Score": int(score)
                     })
-                    
+
                 scored_schemes = sorted(scored_schemes, key=lambda x: x['Match Score'], reverse=True)
                 top_matches_str = ", ".join([f"{s['Scheme Name']} ({s['Match Score']}%)" for s in scored_schemes[0:2]]) # pyre-ignore[6]
-                
+
                 # Context integration for AI (Passed from Python Backend to Client-side Window Context)
                 # Context integration for AI (Passed from Python Backend to Client-side Window Context)
                 identity_ctx = f"Full Name: {st.session_state.get('full_name', '')}, Age: {st.session_state.get('age', '')}, Employment Status: {st.session_state.get('employment_status', '')}, Dependants: {st.session_state.get('dependants', '')}."
@@ -924,7 +1014,7 @@ if check_btn or st.session_state.get('last_user'):
                 if eval_data['eligible']:
                     ai_ctx += f" Approved Payout: KES {eval_data['payout']:,.2f}."
                 st.markdown(f"<div id='idcs-ai-context' style='display:none;'>{ai_ctx}</div>", unsafe_allow_html=True)
-                
+
                 if eval_data.get('dip_probability', 0) > 0:
                     prob = eval_data['dip_probability']
                     pred_month = eval_data.get('predicted_dip_month') or 'a future month'
@@ -932,31 +1022,31 @@ if check_btn or st.session_state.get('last_user'):
                         st.error(f"WARNING: Based on your history, you are {prob:.0f}% likely to incur an income dip in {pred_month}.")
                     else:
                         st.warning(f"WARNING: Based on your history, you are {prob:.0f}% likely to incur an income dip in {pred_month}.")
-                
+
                 if st.session_state.simulate_shock:
                     st.warning(f"⚠️ Simulated Mode Active! Evaluating with artificial 30% drop (Income = KES {income_to_evaluate:,.2f})")
 
                 # -- TABS --
                 tab1, tab2, tab3, tab4, tab5 = st.tabs(["Check Eligibility", "My History", "Sustainability Projections", "Recommendations", "Privacy Dashboard"])
-                
+
                 with tab1:
                     col1, col2 = st.columns([1, 1.5])
-                    
+
                     with col1:
                         score = eval_data['stability_score']
                         if score > 75: color = "status-green"
                         elif score >= 50: color = "status-yellow"
                         else: color = "status-red"
-                            
+
                         metric_card("Stability Score", f"{score:.1f}", color)
                         metric_card("Verified Average", f"KES {eval_data['mu']:,.0f}")
-                        
+
                     with col2:
                         if eval_data['dip_detected']:
                             if eval_data['eligible']:
                                 msg = f"Based on your stability profile ({score:.1f}), your claim is approved.<br><br><span style='font-size: 32px; font-weight: 700; color: #00d296;'>Payout: KES {eval_data['payout']:,.2f}</span>"
                                 status_card("✅ Alert: Income Dip Compensated", msg, is_success=True)
-                                
+
                                 st.markdown("### Underwriting & Timeline")
                                 st.info(f"**Dip Trigger Active:** Current Month (KES {income_to_evaluate:,.0f}) is < 80% of Verified Average (KES {eval_data['mu']*0.8:,.0f})")
                                 st.success(f"**Claim Eligibility:** VERIFIED (Deferred Period of {st.session_state.deferred_period} Days acknowledged)")
@@ -967,14 +1057,14 @@ if check_btn or st.session_state.get('last_user'):
                                 if eval_data['paid_months'] < 3: reason.append("Less than 3 paid months recorded.")
                                 msg = "Dip detected, but you do not meet the minimum safety criteria:<br>- " + "<br>- ".join(reason)
                                 status_card("❌ Alert: Eligibility Failed", msg, is_success=False)
-                                
+
                                 st.markdown("### Underwriting & Timeline")
                                 st.info(f"**Dip Trigger Active:** Current Month < 80% Mean")
                                 st.warning("**Claim Eligibility:** PENDING (Criteria not met)")
                                 render_claims_roadmap(st.session_state.deferred_period, stage=1)
                         else:
                             status_card("📈 Status: Stable", f"No significant dip detected. Your income (KES {income_to_evaluate:,.2f}) is above the 80% stability threshold (KES {eval_data['mu']*0.8:,.2f}).", is_success=True)
-                            
+
                             st.markdown("### Underwriting & Timeline")
                             st.markdown(f"**Dip Trigger:** inactive (Current Month > 80% Verified Average)")
                             render_claims_roadmap(st.session_state.deferred_period, stage=0)
@@ -985,15 +1075,15 @@ if check_btn or st.session_state.get('last_user'):
                     if history is not None and len(history) > 0:
                         months = [f"M-{6-i}" for i in range(len(history))] + ["Current"]
                         actuals = [h["amount"] for h in history] + [income_to_evaluate]
-                        
+
                         mu = eval_data['mu']
                         thresh = mu * 0.8
                         thresholds = [thresh] * len(months)
-                        
+
                         fig = go.Figure()
                         fig.add_trace(go.Scatter(x=months, y=actuals, mode='lines+markers', name='Actual Income', line=dict(color='#00d296', width=4), marker=dict(size=10))) # pyre-ignore[6]
                         fig.add_trace(go.Scatter(x=months, y=thresholds, mode='lines', name='Stability Threshold (0.8\u03bc)', line=dict(color='#ff4b4b', width=2, dash='dash'))) # pyre-ignore[6]
-                        
+
                         fig.update_layout(
                             plot_bgcolor='rgba(0,0,0,0)',
                             paper_bgcolor='rgba(0,0,0,0)',
@@ -1020,11 +1110,11 @@ if check_btn or st.session_state.get('last_user'):
                             st.markdown(f"⚠️ **Penalty Active:** You have {eval_data['unpaid_months']} unpaid months causing a subtraction of {eval_data['unpaid_months']*5} stability points.")
                         else:
                             st.markdown("✅ **Consistent Payments:** No penalties for unpaid months applied.")
-                            
+
                 with tab4:
                     st.markdown("### Market Recommendations")
                     market_avg = st.session_state.get('custom_premium', 0) * 1.15 if st.session_state.get('custom_premium', 0) > 0 else 1500
-                    
+
                     st.markdown("Here is why our data-driven premium is better for you:")
                     comp_df = pd.DataFrame([
                         {"Scheme Type": "IDCS Custom Scheme", "Monthly Premium": f"KES {st.session_state.get('custom_premium', 0):,.2f}", "Calculated By": "Datapoints & Risk Probability"},
@@ -1035,18 +1125,19 @@ if check_btn or st.session_state.get('last_user'):
                 with tab5:
                     st.markdown("### 🔐 Privacy & Data Control")
                     st.info("Directly manage your data sovereignty and right to be forgotten.")
-                    
+
                     ctrl_col1, ctrl_col2 = st.columns(2)
-                    
+
                     with ctrl_col1:
                         st.markdown("#### a) Transparency")
                         st.caption("Human-readable explanation of patterns extracted by Gemini:")
-                        if st.session_state.get("raw_income_data"):
-                            st.write(summarize_data(st.session_state.raw_income_data))
+                        df_tx = get_store().get(st.session_state.store_id, "transactions")
+                        if df_tx is not None:
+                            st.write(summarize_data(df_tx))
                             st.success("Raw Statement Purged. Only the anonymized forecast remains.")
                         else:
                             st.write("No statement data processed yet.")
-                            
+
                     with ctrl_col2:
                         st.markdown("#### b) Data Ownership")
                         st.caption("Export your Predicted Income Path (6-Month Forecast) for your own records.")
@@ -1065,21 +1156,21 @@ if check_btn or st.session_state.get('last_user'):
                     st.markdown("---")
                     st.markdown("#### c) Right to be Forgotten")
                     st.warning("This action is irreversible. It will purge your identity and all historical records from our database.")
-                    
+
                     if st.button("🗑️ Wipe My Profile", type="primary", use_container_width=True):
                         try:
                             name_to_wipe = st.session_state.full_name
-                            with sqlite3.connect("idcs.db") as conn:
-                                cursor = conn.cursor()
+                            with db_pool.transaction() as conn:
                                 # Get user ID
-                                cursor.execute("SELECT id FROM users WHERE name=?", (name_to_wipe,))
-                                u_id = cursor.fetchone()
-                                if u_id:
-                                    cursor.execute("DELETE FROM income_history WHERE user_id=?", (u_id[0],))
-                                    cursor.execute("DELETE FROM users WHERE id=?", (u_id[0],))
+                                db_user = repository.find_user_by_name(conn, name_to_wipe)
+                                if db_user:
+                                    repository.delete_user(conn, db_user['id'])
                                     conn.commit()
+                                    get_profile_sync().invalidate(name_to_wipe)
                                     log_event("User Profile Purged")
                                     # Reset session
+                                    forget_statements(st.session_state.get('statement_cache_keys', []))
+                                    get_store().drop(st.session_state.store_id)
                                     for key in list(st.session_state.keys()):
                                         del st.session_state[key]
                                     st.success("Profile purged. Redirecting...")
@@ -1089,12 +1180,22 @@ if check_btn or st.session_state.get('last_user'):
                                     st.error("Profile not found in database.")
                         except Exception as e:
                             st.error(f"Purge failed: {e}")
-                    
+
 
             else:
                 st.error("Evaluating failed.")
         except Exception as e:
             st.error(f"Failed to process claim. Local Evaluation Error: {e}")
+
+
+if check_btn or st.session_state.get('last_user'):
+    st.session_state.last_user = st.session_state.get('full_name')
+    
+    if not st.session_state.get('full_name'):
+        st.error("👈 Please enter your Full Name in the sidebar.")
+        st.stop()
+
+    render_evaluation(current_income)
 else:
     st.info("👈 Enter your Full Name in the sidebar and evaluate to load data.")
 
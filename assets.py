@@ -0,0 +1,140 @@
+import hashlib
+import html
+import os
+import re
+import shutil
+import threading
+from typing import Dict, List, Optional, Tuple
+
+# --- Static Asset Pipeline ---
+# Branding images are resized into responsive WebP variants with fingerprinted names and
+# written to static/, which Streamlit serves at app/static/ (server.enableStaticServing in
+# .streamlit/config.toml). Pages reference them by URL with srcset instead of base64-inlining
+# or st.image-uploading the full-resolution originals on every session/rerun. Because each
+# name carries a content hash, a proxy in front can cache app/static/ as immutable.
+#
+#   python assets.py      # prebuild variants at deploy time (otherwise built on first use)
+#
+# Pillow is optional: without it the original file is published once, fingerprinted, as-is.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(BASE_DIR, "static")
+STATIC_URL = "app/static"
+
+SOURCES = {
+    "logo": "idcs_logo.png",
+    "banner": "idcs_banner.webp",
+    "login_bg": os.path.join("assets", "logo_pictorial.webp"),
+}
+WIDTHS = (320, 640, 1280)
+WEBP_QUALITY = 80
+
+_manifest: Optional[Dict[str, List[Tuple[int, str]]]] = None
+_css: Dict[str, str] = {}
+_lock = threading.Lock()
+
+
+def _fingerprint(path: str) -> str:
+    digest = hashlib.sha256(f"{WIDTHS}:{WEBP_QUALITY}".encode("utf-8"))
+    with open(path, "rb") as f:
+        digest.update(f.read())
+    return digest.hexdigest()[:10]
+
+
+def _build_variants(name: str, source: str) -> List[Tuple[int, str]]:
+    """[(width, filename)] for one source, smallest first; existing files are reused."""
+    fingerprint = _fingerprint(source)
+    try:
+        from PIL import Image # pyre-ignore[21]
+    except ImportError:
+        ext = os.path.splitext(source)[1]
+        filename = f"{name}-{fingerprint}{ext}"
+        target = os.path.join(STATIC_DIR, filename)
+        if not os.path.exists(target):
+            shutil.copyfile(source, target)
+        return [(0, filename)]
+
+    variants = []
+    with Image.open(source) as img:
+        img.load()
+        # Never upscale: the widest variant is the source itself
+        widths = sorted({w for w in WIDTHS if w < img.width} | {img.width})
+        for width in widths:
+            filename = f"{name}-{fingerprint}-{width}w.webp"
+            target = os.path.join(STATIC_DIR, filename)
+            if not os.path.exists(target):
+                height = round(img.height * width / img.width)
+                resized = img if width == img.width else img.resize((width, height), Image.LANCZOS)
+                tmp = f"{target}.{os.getpid()}.tmp"
+                resized.save(tmp, "WEBP", quality=WEBP_QUALITY, method=6)
+                os.replace(tmp, target)  # other processes never see a half-written file
+            variants.append((width, filename))
+    return variants
+
+
+def build() -> Dict[str, List[Tuple[int, str]]]:
+    """Builds (once per process) and returns {asset: [(width, filename)]}."""
+    global _manifest
+    with _lock:
+        if _manifest is None:
+            os.makedirs(STATIC_DIR, exist_ok=True)
+            manifest = {}
+            for name, rel in SOURCES.items():
+                source = os.path.join(BASE_DIR, rel)
+                if os.path.exists(source):
+                    manifest[name] = _build_variants(name, source)
+            _manifest = manifest
+        return _manifest
+
+
+def url(name: str, width: Optional[int] = None) -> Optional[str]:
+    """URL of the smallest variant at least `width` wide (the largest when width is None)."""
+    variants = build().get(name)
+    if not variants:
+        return None
+    if width is not None:
+        for w, filename in variants:
+            if w >= width:
+                return f"{STATIC_URL}/{filename}"
+    return f"{STATIC_URL}/{variants[-1][1]}"
+
+
+def srcset(name: str) -> str:
+    return ", ".join(f"{STATIC_URL}/{filename} {w}w" for w, filename in build().get(name, []) if w)
+
+
+def img_tag(name: str, alt: str, sizes: str = "100vw", style: str = "width: 100%; height: auto;") -> str:
+    """<img> for a responsive asset; empty string if the source is missing."""
+    src = url(name)
+    if src is None:
+        return ""
+    candidates = srcset(name)
+    srcset_attr = f' srcset="{candidates}" sizes="{sizes}"' if candidates else ""
+    return f'<img src="{src}"{srcset_attr} alt="{html.escape(alt)}" style="{style}" decoding="async">'
+
+
+def css(path: str = "style.css") -> str:
+    """Stylesheet read and minified once per process."""
+    with _lock:
+        if path not in _css:
+            try:
+                with open(os.path.join(BASE_DIR, path), encoding="utf-8") as f:
+                    text = f.read()
+            except FileNotFoundError:
+                text = ""
+            text = re.sub(r"/\*.*?\*/", "", text, flags=re.S)
+            _css[path] = re.sub(r"\s*([{};,])\s*", r"\1", re.sub(r"\s+", " ", text)).strip()
+        return _css[path]
+
+
+def main():
+    manifest = build()
+    for name, variants in manifest.items():
+        original = os.path.getsize(os.path.join(BASE_DIR, SOURCES[name]))
+        print(f"{name:<10} {SOURCES[name]:<30} {original / 1024:>8.0f} KB")
+        for width, filename in variants:
+            print(f"{'':<10} {filename:<30} {os.path.getsize(os.path.join(STATIC_DIR, filename)) / 1024:>8.0f} KB")
+
+
+if __name__ == "__main__":
+    main()
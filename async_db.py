@@ -0,0 +1,66 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+import db_pool
+
+# --- Async Data Access (aiosqlite) ---
+# Same database and pragmas as database.py, but queries run on aiosqlite's worker
+# thread and are awaited, so an async endpoint never holds a threadpool worker
+# while it waits on SQLite. Models are shared with database.py.
+
+ASYNC_DB_URL = f"sqlite+aiosqlite:///{db_pool.DB_PATH}"
+async_engine = create_async_engine(ASYNC_DB_URL, pool_size=10, max_overflow=20)
+
+
+@event.listens_for(async_engine.sync_engine, "connect")
+def _apply_pragmas(dbapi_conn, _record):
+    cursor = dbapi_conn.cursor()
+    for pragma in db_pool.PRAGMAS:
+        cursor.execute(pragma)
+    cursor.close()
+    # Let SQLAlchemy emit BEGIN itself (see _begin)
+    dbapi_conn.isolation_level = None
+
+
+@event.listens_for(async_engine.sync_engine, "begin")
+def _begin(conn):
+    # Write transactions read then write. A deferred BEGIN takes a read snapshot first and
+    # fails with "database is locked" (no busy wait) if another writer commits before the
+    # upgrade; IMMEDIATE takes the write lock upfront and queues on busy_timeout instead.
+    # Read-only transactions stay deferred so WAL readers run concurrently.
+    if conn.get_execution_options().get("idcs_immediate"):
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+    else:
+        conn.exec_driver_sql("BEGIN")
+
+
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
+
+
+# SQLite has a single writer. Queueing write transactions on an in-process lock (FIFO)
+# is far cheaper than letting them spin on busy_timeout against each other.
+_write_lock = asyncio.Lock()
+
+
+@asynccontextmanager
+async def read_transaction(session: AsyncSession):
+    """Deferred transaction: a WAL snapshot, no write lock."""
+    async with session.begin():
+        yield session
+
+
+@asynccontextmanager
+async def write_transaction(session: AsyncSession):
+    """BEGIN IMMEDIATE, queued behind this process's other writers."""
+    async with _write_lock:
+        async with session.begin():
+            await session.connection(execution_options={"idcs_immediate": True})
+            yield session
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as session:
+        yield session
@@ -0,0 +1,108 @@
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx # pyre-ignore[21]
+
+# --- Sync vs Async /evaluate Load Test ---
+# Starts the API on a throwaway database and fires the same workload at
+# /evaluate (sync Session, several commits) and /v2/evaluate (aiosqlite, one transaction).
+#
+#   python bench_async_db.py --requests 2000 --concurrency 128
+
+
+def make_payload(i: int) -> dict:
+    history = [{"amount": random.uniform(20000, 80000), "status": random.choice(["Paid", "Paid", "Unpaid"])}
+               for _ in range(6)]
+    return {
+        "name": f"bench-member-{i}",
+        "age": random.randint(20, 60),
+        "employment_type": "Self-Employed/Jua Kali",
+        "current_income": random.uniform(10000, 80000),
+        "income_history": history,
+        "premium": 750.0,
+        "deferred_period": 30
+    }
+
+
+async def run_load(base_url: str, path: str, total: int, concurrency: int, offset: int) -> dict:
+    latencies = []
+    errors = 0
+    queue: asyncio.Queue = asyncio.Queue()
+    for i in range(total):
+        # Half the requests hit members created earlier in the run (lookup + update path)
+        queue.put_nowait(make_payload(offset + (i if i % 2 == 0 else i // 2)))
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=60.0) as client:
+        async def worker():
+            nonlocal errors
+            while not queue.empty():
+                payload = queue.get_nowait()
+                t0 = time.perf_counter()
+                try:
+                    r = await client.post(path, json=payload)
+                    if r.status_code != 200:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - t0)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "rps": total / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        "errors": errors
+    }
+
+
+def wait_until_up(base_url: str, timeout: float = 30.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(base_url + "/").status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("API did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare sync /evaluate with async /v2/evaluate")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=128)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, IDCS_DB_PATH=os.path.join(tmp, "bench.db"))
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.port), "--log-level", "warning"],
+            env=env
+        )
+        try:
+            wait_until_up(base_url)
+            for label, path, offset in (("sync  /evaluate", "/evaluate", 0),
+                                        ("async /v2/evaluate", "/v2/evaluate", 10 ** 6)):
+                res = asyncio.run(run_load(base_url, path, args.requests, args.concurrency, offset))
+                print(f"{label:<20} {res['rps']:8.1f} req/s   p50 {res['p50_ms']:7.1f} ms   "
+                      f"p95 {res['p95_ms']:7.1f} ms   errors {res['errors']}")
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
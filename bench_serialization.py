@@ -0,0 +1,82 @@
+import argparse
+import os
+import random
+import tempfile
+import timeit
+
+# --- Response Serialization Microbenchmark ---
+# Compares the old way main.py built and encoded responses (ORM objects -> per-row dicts ->
+# jsonable_encoder -> json.dumps via JSONResponse) with the typed response models (rows passed
+# through -> pydantic-core validation -> JSON bytes), for a long /user history and a large
+# /evaluate/batch response. Runs against a throwaway database.
+#
+#   python bench_serialization.py --months 1200 --batch 5000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark API response serialization")
+    parser.add_argument("--months", type=int, default=1200, help="History length for the /user payload")
+    parser.add_argument("--batch", type=int, default=5000, help="Items in the /evaluate/batch payload")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    os.environ["IDCS_DB_PATH"] = os.path.join(tmp.name, "bench.db")
+    os.environ.setdefault("IDCS_TRACE", "0")
+
+    from fastapi.encoders import jsonable_encoder # pyre-ignore[21]
+    from fastapi.responses import JSONResponse # pyre-ignore[21]
+    from pydantic import TypeAdapter # pyre-ignore[21]
+    import main as api # pyre-ignore[21]
+    from database import IncomeHistory, SessionLocal, User # pyre-ignore[21]
+
+    db = SessionLocal()
+    user = User(name="bench-member", age=40, employment_type="Private Contract", src_tax_bracket="Bracket 3", src_cap=50000.0)
+    db.add(user)
+    db.flush()
+    db.add_all([IncomeHistory(user_id=user.id, month_index=m + 1, income_amount=random.uniform(1e4, 9e4), status="Paid")
+                for m in range(args.months)])
+    db.commit()
+
+    user_adapter = TypeAdapter(api.UserResponse)
+    batch_adapter = TypeAdapter(api.BatchEvaluationResponse)
+
+    # 1. /user: history fetch + encode
+    def user_old():
+        db.expire_all()
+        incomes = db.query(IncomeHistory).filter(IncomeHistory.user_id == user.id).order_by(IncomeHistory.month_index).all()
+        history = [{"amount": inc.income_amount, "status": inc.status, "month": inc.month_index} for inc in incomes]
+        content = {"user_id": user.id, "name": user.name, "history": history, "is_new": False}
+        return JSONResponse(jsonable_encoder(content)).body
+
+    def user_new():
+        content = {"user_id": user.id, "name": user.name, "history": db.execute(api._history_query(user.id)).all(), "is_new": False}
+        return user_adapter.dump_json(user_adapter.validate_python(content, from_attributes=True))
+
+    # 2. /evaluate/batch: encode only (scoring is identical in both)
+    history = [{"amount": random.uniform(1e4, 9e4), "status": "Paid"} for _ in range(12)]
+    evaluation = api.engine.calculate_metrics(history, 50000.0, 20000.0)
+    results = [{"index": i, "user": {"id": i, "name": f"m{i}", "employment_type": "Private Contract", "src_cap": 50000.0},
+                "evaluation": dict(evaluation)} for i in range(args.batch)]
+    batch_content = {"results": results, "succeeded": args.batch, "failed": 0}
+
+    def batch_old():
+        return JSONResponse(jsonable_encoder(batch_content)).body
+
+    def batch_new():
+        return batch_adapter.dump_json(batch_adapter.validate_python(batch_content, from_attributes=True))
+
+    assert len(user_old()) > 0 and user_new()
+    print(f"{'payload':<28} {'old ms':>10} {'new ms':>10} {'speedup':>9}")
+    for label, old, new in ((f"/user ({args.months} months)", user_old, user_new),
+                            (f"/evaluate/batch ({args.batch})", batch_old, batch_new)):
+        t_old = min(timeit.repeat(old, number=1, repeat=args.repeat)) * 1000
+        t_new = min(timeit.repeat(new, number=1, repeat=args.repeat)) * 1000
+        print(f"{label:<28} {t_old:>10.2f} {t_new:>10.2f} {t_old / t_new:>8.1f}x")
+
+    db.close()
+    tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
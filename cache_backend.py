@@ -0,0 +1,349 @@
+import functools
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, Optional, Tuple
+
+import db_pool # pyre-ignore[21]
+import tracing # pyre-ignore[21]
+from metrics import record_cache # pyre-ignore[21]
+
+# --- Cross-Process Result Cache ---
+# st.cache_data/st.cache_resource live inside one Streamlit process, so replicas behind a
+# load balancer would each repeat the same Gemini work. This cache sits underneath them:
+#
+#   @st.cache_data                                   # per-process copy (fast path)
+#   @shared_cache("inflows", should_cache=...)       # shared by every process on the host
+#   def process_and_group_inflows(...): ...
+#
+# Fill-once: a miss takes a lease on the key before computing. Concurrent misses (any process)
+# wait for the holder's value instead of computing it again; a lease whose holder died expires
+# after LEASE_SECS and the next caller takes over.
+#
+# Backends (IDCS_CACHE_BACKEND): "sqlite" (default, IDCS_CACHE_PATH=idcs_cache.db), "file"
+# (a directory of pickles, IDCS_CACHE_PATH=cache) or "none". Only picklable results can be
+# shared; resources such as the Gemini client or the IDCS engine stay per-process.
+#
+# Both backends store pickles, and unpickling runs arbitrary code: anyone who can write the
+# cache can execute code in every app process that reads it. The SQLite file and the pickle
+# files are created 0600 (the directory 0700) for that reason. Keep IDCS_CACHE_PATH on a
+# local path owned by the app's user, never writable by another user or a shared volume.
+#
+# Namespaces holding statement data are declared sensitive=True. They are only shared when
+# IDCS_CACHE_KEY (a Fernet key, `cryptography` package) is set; values are then encrypted at
+# rest and kept for IDCS_CACHE_SENSITIVE_TTL_SECS. Without a key they are never written here.
+# Callers record cache_key(...) per session and forget() the keys when a profile is wiped.
+
+BACKEND = os.environ.get("IDCS_CACHE_BACKEND", "sqlite")
+CACHE_PATH = os.environ.get("IDCS_CACHE_PATH")
+DEFAULT_TTL_SECS = float(os.environ.get("IDCS_CACHE_TTL_SECS", str(24 * 3600)))
+LEASE_SECS = float(os.environ.get("IDCS_CACHE_LEASE_SECS", "300"))
+CACHE_KEY = os.environ.get("IDCS_CACHE_KEY", "")
+SENSITIVE_TTL_SECS = float(os.environ.get("IDCS_CACHE_SENSITIVE_TTL_SECS", "900"))
+
+_MISS: Tuple[bool, Any] = (False, None)
+
+
+class CacheBackend:
+    poll_interval = 0.1
+
+    def __init__(self, lease_secs: float = LEASE_SECS):
+        self.lease_secs = lease_secs
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        """(hit, value); expired entries are misses."""
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any, ttl: float):
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+    def _acquire(self, key: str) -> bool:
+        """Takes the fill lease for key without blocking; False if another caller holds it."""
+        raise NotImplementedError
+
+    def _release(self, key: str):
+        raise NotImplementedError
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any], ttl: float = DEFAULT_TTL_SECS,
+                       should_cache: Optional[Callable[[Any], bool]] = None) -> Any:
+        deadline = time.monotonic() + self.lease_secs
+        while True:
+            hit, value = self.get(key)
+            if hit:
+                return value
+            if self._acquire(key):
+                try:
+                    # Filled between our miss and the lease
+                    hit, value = self.get(key)
+                    if hit:
+                        return value
+                    value = compute()
+                    if should_cache is None or should_cache(value):
+                        self.set(key, value, ttl)
+                    return value
+                finally:
+                    self._release(key)
+            if time.monotonic() > deadline:
+                # The holder has been at it for a whole lease; don't wait forever
+                return compute()
+            time.sleep(self.poll_interval)
+
+
+class NullCache(CacheBackend):
+    def get(self, key):
+        return _MISS
+
+    def set(self, key, value, ttl):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def _acquire(self, key):
+        return True
+
+    def _release(self, key):
+        pass
+
+
+class SQLiteCache(CacheBackend):
+    """Values and leases in their own WAL database, so cache traffic never locks idcs.db."""
+
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS cache_leases (key TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)",
+    )
+    PURGE_EVERY = 100  # sets between sweeps of expired rows
+
+    def __init__(self, path: str = "idcs_cache.db", lease_secs: float = LEASE_SECS):
+        super().__init__(lease_secs)
+        self.path = path
+        self._pool = db_pool.ConnectionPool(path=path)
+        self._sets = 0
+        with self._conn() as conn, conn:
+            for statement in self.SCHEMA:
+                conn.execute(statement)
+        try:
+            os.chmod(path, 0o600)
+        except OSError:
+            pass
+
+    @staticmethod
+    def _owner() -> str:
+        return f"{os.getpid()}:{threading.get_ident()}"
+
+    @contextmanager
+    def _conn(self) -> Iterator[sqlite3.Connection]:
+        conn = self._pool.acquire()
+        try:
+            yield conn
+        finally:
+            self._pool.release(conn)
+
+    def get(self, key):
+        with self._conn() as conn:
+            row = conn.execute("SELECT value FROM cache WHERE key = ? AND expires_at > ?", (key, time.time())).fetchone()
+        return (True, pickle.loads(row[0])) if row else _MISS
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        with self._conn() as conn, conn:
+            conn.execute("INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                         (key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), now + ttl))
+            self._sets += 1
+            if self._sets % self.PURGE_EVERY == 0:
+                conn.execute("DELETE FROM cache WHERE expires_at <= ?", (now,))
+
+    def delete(self, key):
+        with self._conn() as conn, conn:
+            conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def _acquire(self, key):
+        now = time.time()
+        with self._conn() as conn, conn:
+            conn.execute("DELETE FROM cache_leases WHERE key = ? AND expires_at <= ?", (key, now))
+            cur = conn.execute("INSERT OR IGNORE INTO cache_leases (key, owner, expires_at) VALUES (?, ?, ?)",
+                               (key, self._owner(), now + self.lease_secs))
+        return cur.rowcount == 1
+
+    def _release(self, key):
+        with self._conn() as conn, conn:
+            conn.execute("DELETE FROM cache_leases WHERE key = ? AND owner = ?", (key, self._owner()))
+
+
+class FileCache(CacheBackend):
+    """One pickle per key; writes go through a temp file and os.replace, leases are O_EXCL files."""
+
+    def __init__(self, directory: str = "cache", lease_secs: float = LEASE_SECS):
+        super().__init__(lease_secs)
+        self.directory = directory
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+
+    def _path(self, key: str, suffix: str) -> str:
+        return os.path.join(self.directory, hashlib.sha256(key.encode("utf-8")).hexdigest() + suffix)
+
+    def get(self, key):
+        try:
+            with open(self._path(key, ".pkl"), "rb") as f:
+                expires_at, value = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+            return _MISS
+        return (True, value) if expires_at > time.time() else _MISS
+
+    def set(self, key, value, ttl):
+        path = self._path(key, ".pkl")
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump((time.time() + ttl, value), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key, ".pkl"))
+        except OSError:
+            pass
+
+    def _acquire(self, key):
+        path = self._path(key, ".lease")
+        try:
+            os.close(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600))
+            return True
+        except FileExistsError:
+            pass
+        # A lease older than lease_secs belongs to a holder that died; break it and retry once
+        try:
+            if time.time() - os.stat(path).st_mtime > self.lease_secs:
+                os.remove(path)
+                os.close(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600))
+                return True
+        except OSError:
+            pass
+        return False
+
+    def _release(self, key):
+        try:
+            os.remove(self._path(key, ".lease"))
+        except OSError:
+            pass
+
+
+def make_key(namespace: str, args: tuple, kwargs: dict) -> str:
+    """namespace:sha256 of the call arguments (bytes hashed as-is, DataFrames by content)."""
+    digest = hashlib.sha256()
+    for value in list(args) + [kwargs[k] for k in sorted(kwargs)]:
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            digest.update(b"b")
+            digest.update(bytes(value))
+        elif value.__class__.__name__ == "DataFrame":
+            import pandas as pd # pyre-ignore[21]
+            digest.update(b"d")
+            digest.update(json.dumps(list(map(str, value.columns))).encode("utf-8"))
+            digest.update(pd.util.hash_pandas_object(value, index=True).values.tobytes())
+        else:
+            digest.update(b"j")
+            digest.update(json.dumps(value, sort_keys=True, default=str).encode("utf-8"))
+        digest.update(b"\0")
+    digest.update(json.dumps(sorted(kwargs)).encode("utf-8"))
+    return f"{namespace}:{digest.hexdigest()}"
+
+
+def create_backend(kind: str = BACKEND, path: Optional[str] = CACHE_PATH) -> CacheBackend:
+    if kind == "sqlite":
+        return SQLiteCache(path or "idcs_cache.db")
+    if kind == "file":
+        return FileCache(path or "cache")
+    if kind == "none":
+        return NullCache()
+    raise ValueError(f"Unknown IDCS_CACHE_BACKEND '{kind}' (choose sqlite, file or none)")
+
+
+_backend: Optional[CacheBackend] = None
+_backend_lock = threading.Lock()
+
+
+def get_backend() -> CacheBackend:
+    """Process-wide backend, created from the environment on first use."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = create_backend()
+        return _backend
+
+
+_cipher = None
+
+
+def get_cipher():
+    """Fernet for sensitive namespaces, or None when IDCS_CACHE_KEY is unset."""
+    global _cipher
+    if _cipher is None and CACHE_KEY:
+        from cryptography.fernet import Fernet # pyre-ignore[21]
+        _cipher = Fernet(CACHE_KEY.encode("utf-8"))
+    return _cipher
+
+
+def forget(keys):
+    """Deletes shared entries (e.g. a wiped profile's statement results)."""
+    backend = get_backend()
+    for key in keys:
+        backend.delete(key)
+
+
+def shared_cache(namespace: str, ttl: Optional[float] = None,
+                 should_cache: Optional[Callable[[Any], bool]] = None, sensitive: bool = False) -> Callable:
+    """
+    Caches fn's (picklable) result in the shared backend, keyed by its arguments.
+    The wrapper's cache_key(*args, **kwargs) returns the key a call is stored under.
+    """
+    if ttl is None:
+        ttl = SENSITIVE_TTL_SECS if sensitive else DEFAULT_TTL_SECS
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            cipher = get_cipher() if sensitive else None
+            if sensitive and cipher is None:
+                # No key configured: personal data stays in this process only
+                return fn(*args, **kwargs)
+
+            backend = get_backend()
+            key = make_key(namespace, args, kwargs)
+            computed = []
+
+            def compute():
+                with tracing.span("cache.fill", cache=namespace):
+                    value = fn(*args, **kwargs)
+                computed.append(value)
+                if cipher is None:
+                    return value
+                return cipher.encrypt(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+
+            check = should_cache
+            if cipher is not None and should_cache is not None:
+                check = lambda _token: should_cache(computed[0])
+
+            result = backend.get_or_compute(key, compute, ttl, check)
+            record_cache(namespace, not computed)
+            if cipher is None:
+                return result
+            if computed:
+                return computed[0]
+            try:
+                return pickle.loads(cipher.decrypt(result))
+            except Exception:
+                # Written under another key (rotated) or corrupt: drop it and recompute
+                backend.delete(key)
+                return fn(*args, **kwargs)
+
+        wrapper.cache_key = lambda *args, **kwargs: make_key(namespace, args, kwargs)
+        return wrapper
+    return decorator
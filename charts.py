@@ -0,0 +1,85 @@
+import hashlib
+import json
+from typing import Dict, List
+
+import pandas as pd # pyre-ignore[21]
+import plotly.graph_objects as go # pyre-ignore[21]
+import streamlit as st # pyre-ignore[21]
+
+# --- Dashboard Charts ---
+# Plotly figures built straight from the forecast arrays returned by the forecast job queue
+# (lists of {"ds", "yhat", "yhat_lower", "yhat_upper"}), replacing Prophet's Matplotlib
+# plot + st.pyplot rasterization. The figure spec (to_plotly_json) is cached per forecast hash
+# with st.cache_data, so reruns skip re-creating traces and overlays, and every caller gets its
+# own Figure: a cached go.Figure would be one mutable object shared by all sessions.
+
+RISK_THRESHOLD = 0.7  # forecast months whose lower bound falls below 0.7 * mu are flagged
+HORIZON = 6
+
+
+def forecast_hash(history: List[Dict], forecast: List[Dict], mu: float) -> str:
+    return hashlib.sha256(json.dumps([history, forecast, mu], sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def forecast_figure(history: List[Dict], forecast: List[Dict], mu: float) -> go.Figure:
+    """Observed points, forecast line, uncertainty band and red overlays on high-risk horizon months."""
+    return go.Figure(_forecast_spec(forecast_hash(history, forecast, mu), history, forecast, mu))
+
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def _forecast_spec(_key: str, _history: List[Dict], _forecast: List[Dict], _mu: float) -> Dict:
+    # Only the hash is hashed by Streamlit; the underscored arguments are skipped
+    fc = pd.DataFrame(_forecast, columns=["ds", "yhat", "yhat_lower", "yhat_upper"])
+    fc["ds"] = pd.to_datetime(fc["ds"])
+
+    # 1. High-risk months in the horizon become shaded month-wide spans (one shape each, no per-row traces)
+    horizon = fc.tail(HORIZON)
+    risky = horizon[horizon["yhat_lower"] < _mu * RISK_THRESHOLD]
+    shapes = [
+        dict(type="rect", xref="x", yref="paper", x0=start, x1=start + pd.DateOffset(months=1), y0=0, y1=1,
+             fillcolor="red", opacity=0.2, line_width=0, layer="below")
+        for start in risky["ds"]
+    ]
+
+    # 2. Band (upper then lower filled to it), forecast line, observations
+    data = [
+        go.Scatter(x=fc["ds"], y=fc["yhat_upper"], mode="lines", line=dict(width=0), hoverinfo="skip", showlegend=False),
+        go.Scatter(x=fc["ds"], y=fc["yhat_lower"], mode="lines", line=dict(width=0), fill="tonexty",
+                   fillcolor="rgba(0, 114, 178, 0.2)", name="Uncertainty interval"),
+        go.Scatter(x=fc["ds"], y=fc["yhat"], mode="lines", line=dict(color="#0072B2", width=2), name="Forecast"),
+        go.Scatter(x=pd.to_datetime([h["month"] for h in _history]), y=[h["amount"] for h in _history],
+                   mode="markers", marker=dict(color="#e0e0e0", size=6), name="Observed data points")
+    ]
+    if shapes:
+        # Legend entry for the overlays
+        data.append(go.Scatter(x=[None], y=[None], mode="markers", marker=dict(color="rgba(255, 0, 0, 0.4)", size=12, symbol="square"),
+                               name="High Risk Dip"))
+
+    return go.Figure(data=data, layout=go.Layout(
+        shapes=shapes,
+        paper_bgcolor="rgba(0,0,0,0)",
+        plot_bgcolor="rgba(0,0,0,0)",
+        font=dict(color="white"),
+        xaxis=dict(showgrid=True, gridcolor="#2a2a2a"),
+        yaxis=dict(showgrid=True, gridcolor="#2a2a2a", title="Income (KES)"),
+        margin=dict(l=20, r=20, t=30, b=20),
+        height=420,
+        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
+    )).to_plotly_json()
+
+
+def heatmap_figure(matrix: pd.DataFrame) -> go.Figure:
+    """Year x month income heatmap (income_views.build()['heatmap'])."""
+    import plotly.express as px # pyre-ignore[21]
+    fig = px.imshow(matrix,
+                    labels=dict(x="Month", y="Year", color="Inflow (KES)"),
+                    color_continuous_scale="Viridis",
+                    text_auto=".2s")
+    fig.update_layout(
+        paper_bgcolor="rgba(0,0,0,0)",
+        plot_bgcolor="rgba(0,0,0,0)",
+        font=dict(color="white"),
+        margin=dict(l=20, r=20, t=20, b=20),
+        height=300
+    )
+    return fig
@@ -4,10 +4,14 @@ import io
 import json
 import os
 import streamlit as st # pyre-ignore[21]
-from typing import List, Optional, Dict
-from pydantic import BaseModel, Field, validator # pyre-ignore[21]
+from typing import List, Optional, Dict, Union
+from pydantic import BaseModel, Field, field_validator # pyre-ignore[21]
 import google.generativeai as genai # pyre-ignore[21]
 from datetime import datetime
+from llm_scheduler import LLMRequestScheduler, get_scheduler # pyre-ignore[21]
+from tracing import span # pyre-ignore[21]
+import cache_backend # pyre-ignore[21]
+from cache_backend import shared_cache # pyre-ignore[21]
 
 # --- 1. Pydantic Models for Validation ---
 
@@ -17,7 +21,8 @@ class IncomeData(BaseModel):
     amount: float = Field(..., description="Inflow amount (Float)")
     description: str = Field(..., description="Source or Details of inflow")
 
-    @validator('date')
+    @field_validator('date')
+    @classmethod
     def validate_date(cls, v):
         try:
             # Flexible parsing for AI convenience
@@ -35,10 +40,23 @@ class AIInflowResult(BaseModel):
     """Root schema for AI response"""
     inflows: List[IncomeData]
 
+class ExtractionError(RuntimeError):
+    """Gemini could not return usable inflows for a statement (call failed or response invalid)."""
+
 # --- 2. Gemini Vision-Language Extractor ---
 
 class IncomeVisionExtractor:
-    def __init__(self):
+    MODEL_NAME = "models/gemini-2.5-flash"
+
+    def __init__(self, model=None, summary_model=None, scheduler: Optional[LLMRequestScheduler] = None):
+        # All Gemini calls are funnelled through the shared scheduler (rate limit, retry, coalescing).
+        # `model`/`summary_model` can be injected to run against a local fake client.
+        self.scheduler = scheduler or get_scheduler()
+        self.summary_model = summary_model
+        if model is not None:
+            self.model = model
+            return
+
         # Configure using st.secrets as requested
         try:
             api_key = st.secrets["GEMINI_API_KEY"]
@@ -46,7 +64,7 @@ class IncomeVisionExtractor:
             
             # Mission: Strictly extract IncomeData schema using structured output
             self.model = genai.GenerativeModel(
-                model_name="models/gemini-2.5-flash",
+                model_name=self.MODEL_NAME,
                 generation_config={
                     "response_mime_type": "application/json",
                     "response_schema": {
@@ -75,17 +93,21 @@ class IncomeVisionExtractor:
     def extract_inflows(self, file_content: bytes, is_mpesa: bool = True) -> List[Dict]:
         """
         Processes PDF and extracts ONLY inflows using Gemini 2.5 Flash.
+        Raises ExtractionError when the call fails or the response doesn't validate, so an
+        outage is never mistaken for a statement without income (and never cached as one).
         """
         if not self.model:
             raise ValueError("Gemini API Key missing in st.secrets['GEMINI_API_KEY']")
 
         # Extract text for context
         full_texts: List[str] = []
-        with pdfplumber.open(io.BytesIO(file_content)) as pdf:
+        with span("pdf.extract_text", source="mpesa" if is_mpesa else "bank", bytes=len(file_content)) as attrs, \
+                pdfplumber.open(io.BytesIO(file_content)) as pdf:
             for page in pdf.pages:
                 text = page.extract_text()
                 if text:
                     full_texts.append(str(text))
+            attrs["pages"] = len(pdf.pages)
         
         full_text = "\n--PAGE--\n".join(full_texts)
 
@@ -98,22 +120,25 @@ class IncomeVisionExtractor:
         {full_text}"""
 
         try:
-            response = self.model.generate_content(prompt)
-            raw_text = response.text
-            
-            # Extract JSON block
-            if "```json" in raw_text:
-                raw_json = raw_text.split("```json")[1].split("```")[0].strip()
-            else:
-                raw_json = raw_text.strip()
+            with span("gemini.extract", prompt_chars=len(prompt)):
+                raw_text = self.scheduler.submit(
+                    lambda: self.model.generate_content(prompt).text,
+                    key=self.scheduler.make_key(self.MODEL_NAME, "extract", prompt)
+                )
             
-            data = json.loads(raw_json)
-            # Validate with Pydantic
-            validated = AIInflowResult(**data)
-            return [item.dict() for item in validated.inflows]
+            with span("inflows.validate") as attrs:
+                # Extract JSON block
+                if "```json" in raw_text:
+                    raw_json = raw_text.split("```json")[1].split("```")[0].strip()
+                else:
+                    raw_json = raw_text.strip()
+                
+                # Parse and validate in one pass (pydantic-core), no intermediate json.loads
+                validated = AIInflowResult.model_validate_json(raw_json)
+                attrs["rows"] = len(validated.inflows)
+            return [item.model_dump() for item in validated.inflows]
         except Exception as e:
-            st.error(f"AI Vision Error: {e}")
-            return []
+            raise ExtractionError(f"AI Vision Error: {e}") from e
 
     def summarize_data(self, raw_data: List[Dict]) -> str:
         """
@@ -137,9 +162,13 @@ class IncomeVisionExtractor:
         """
         try:
             # Use a slightly different config for text summary (non-JSON)
-            summary_model = genai.GenerativeModel(model_name="models/gemini-2.5-flash")
-            response = summary_model.generate_content(prompt)
-            return response.text
+            if self.summary_model is None:
+                self.summary_model = genai.GenerativeModel(model_name=self.MODEL_NAME)
+            with span("gemini.summary", rows=len(raw_data)):
+                return self.scheduler.submit(
+                    lambda: self.summary_model.generate_content(prompt).text,
+                    key=self.scheduler.make_key(self.MODEL_NAME, "summary", prompt)
+                )
         except Exception as e:
             return f"Error generating summary: {e}"
 
@@ -156,6 +185,10 @@ def process_and_group_inflows(mpesa_content: Optional[bytes] = None, bank_conten
     Groups 'amount' by month (YYYY-MM) and identifies missing months/Zero Income.
     Returns (DataFrame, monthly_inflow_dict, raw_list)
     """
+    return _shared_inflows(mpesa_content, bank_content)
+
+@shared_cache("inflows", should_cache=lambda result: not result[0].empty, sensitive=True)
+def _shared_inflows(mpesa_content: Optional[bytes], bank_content: Optional[bytes]):
     extractor = get_extractor()
     all_inflows = []
 
@@ -167,29 +200,58 @@ def process_and_group_inflows(mpesa_content: Optional[bytes] = None, bank_conten
     if not all_inflows:
         return pd.DataFrame(), {}, []
 
-    df = pd.DataFrame(all_inflows)
-    df['Date'] = pd.to_datetime(df['date'])
-    df['MonthYear'] = df['Date'].dt.strftime('%Y-%m')
-    
-    # Group by Month (YYYY-MM)
-    monthly_inflow = df.groupby('MonthYear')['amount'].sum().to_dict()
-    
-    # Identify Missing Months (Simple range check)
-    if monthly_inflow:
-        min_date = df['Date'].min()
-        max_date = df['Date'].max()
-        full_range = pd.date_range(start=min_date, end=max_date, freq='MS').strftime('%Y-%m').tolist()
+    with span("inflows.group", rows=len(all_inflows)) as attrs:
+        df = pd.DataFrame(all_inflows)
+        df['Date'] = pd.to_datetime(df['date'])
+        df['MonthYear'] = df['Date'].dt.strftime('%Y-%m')
         
-        for m in full_range:
-            if m not in monthly_inflow:
-                monthly_inflow[m] = 0.0 # 100% Dip / Zero Income flagged
-                
-    # Sort for predictability
-    sorted_monthly = dict(sorted(monthly_inflow.items()))
+        # Group by Month (YYYY-MM)
+        monthly_inflow = df.groupby('MonthYear')['amount'].sum().to_dict()
+        
+        # Identify Missing Months (Simple range check)
+        if monthly_inflow:
+            min_date = df['Date'].min()
+            max_date = df['Date'].max()
+            full_range = pd.date_range(start=min_date, end=max_date, freq='MS').strftime('%Y-%m').tolist()
+            
+            for m in full_range:
+                if m not in monthly_inflow:
+                    monthly_inflow[m] = 0.0 # 100% Dip / Zero Income flagged
+                    
+        # Sort for predictability
+        sorted_monthly = dict(sorted(monthly_inflow.items()))
+        attrs["months"] = len(sorted_monthly)
     
     return df, sorted_monthly, all_inflows
 
-def summarize_data(raw_data: List[Dict]) -> str:
-    """Standalone wrapper for UI calls."""
+@st.cache_data(show_spinner=False)
+def summarize_data(raw_data: Union[List[Dict], pd.DataFrame, None]) -> str:
+    """Standalone wrapper for UI calls. Cached per dataset, so reruns don't call Gemini again."""
+    if isinstance(raw_data, pd.DataFrame):
+        raw_data = raw_data.to_dict('records')
+    return _shared_summary(raw_data)
+
+@shared_cache("summary", should_cache=lambda text: not text.startswith(("Error generating summary", "No data available")),
+              sensitive=True)
+def _shared_summary(raw_data: Optional[List[Dict]]) -> str:
     extractor = get_extractor()
     return extractor.summarize_data(raw_data)
+
+# --- Statement cache hygiene ---
+
+def statement_cache_keys(mpesa_content: Optional[bytes] = None, bank_content: Optional[bytes] = None,
+                         df_tx: Optional[pd.DataFrame] = None) -> List[str]:
+    """Shared-cache keys holding results derived from this statement (for the wipe below)."""
+    keys = []
+    if mpesa_content or bank_content:
+        keys.append(_shared_inflows.cache_key(mpesa_content, bank_content))
+    if df_tx is not None:
+        keys.append(_shared_summary.cache_key(df_tx.to_dict('records')))
+    return keys
+
+def forget_statements(keys: List[str]):
+    """Right to be forgotten: drops the shared entries and this process's st.cache_data copies."""
+    cache_backend.forget(keys)
+    # st.cache_data can only be cleared per argument set, and the statement bytes are gone by now
+    process_and_group_inflows.clear()
+    summarize_data.clear()
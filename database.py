@@ -1,13 +1,15 @@
 import os
-from sqlalchemy import create_engine, Column, Integer, String, Float, Boolean, ForeignKey
+from sqlalchemy import create_engine, Column, Integer, String, Float, Boolean, ForeignKey, Index, Text
 from sqlalchemy.orm import declarative_base, sessionmaker, relationship
+from migrations import migrate
+import db_pool
 
 Base = declarative_base()
 
 class User(Base):
     __tablename__ = 'users'
     id = Column(Integer, primary_key=True)
-    name = Column(String)
+    name = Column(String, index=True)
     email = Column(String, unique=True)
     password_hash = Column(String)
     age = Column(Integer)
@@ -20,6 +22,7 @@ class User(Base):
 
 class IncomeHistory(Base):
     __tablename__ = 'income_history'
+    __table_args__ = (Index('ix_income_history_user_month', 'user_id', 'month_index', unique=True),)
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey('users.id'))
     month_index = Column(Integer)  # e.g., 1 to 6 (for the last 6 months)
@@ -27,12 +30,85 @@ class IncomeHistory(Base):
     status = Column(String)  # "Paid" or "Unpaid"
     user = relationship("User", back_populates="incomes")
 
-DB_URL = "sqlite:///./idcs.db"
-engine = create_engine(DB_URL, connect_args={"check_same_thread": False})
+class Transaction(Base):
+    """Individual inflows extracted from statements (raw rows behind IncomeHistory aggregates)."""
+    __tablename__ = 'transactions'
+    __table_args__ = (Index('ix_transactions_user_date', 'user_id', 'date', 'amount'),)
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    date = Column(String, nullable=False)  # ISO YYYY-MM-DD, sorts and range-compares as text
+    amount = Column(Float, nullable=False)
+    description = Column(String)
+
+class UserStats(Base):
+    """Running income statistics per user, maintained by a trigger on income_history (see migrations.py)."""
+    __tablename__ = 'user_stats'
+    user_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    n = Column(Integer, nullable=False)
+    total = Column(Float, nullable=False)
+    sum_sq = Column(Float, nullable=False)
+    mean = Column(Float, nullable=False)
+    m2 = Column(Float, nullable=False)  # Welford sum of squared deviations; sigma = sqrt(m2 / n)
+    dip_count = Column(Integer, nullable=False)
+    paid_count = Column(Integer, nullable=False)
+    unpaid_count = Column(Integer, nullable=False)
+
+class ForecastJob(Base):
+    """Queued Prophet forecasts (see forecast_jobs.py)."""
+    __tablename__ = 'forecast_jobs'
+    __table_args__ = (
+        Index('ix_forecast_jobs_key_status', 'job_key', 'status'),
+        Index('ix_forecast_jobs_status', 'status', 'id'),
+    )
+    id = Column(Integer, primary_key=True)
+    job_key = Column(String, nullable=False)  # sha256 of the payload, for de-duplication
+    status = Column(String, nullable=False)  # pending / running / done / failed
+    payload = Column(Text, nullable=False)
+    result = Column(Text)
+    error = Column(Text)
+    owner = Column(String)  # host:pid of the claiming worker
+    attempts = Column(Integer, nullable=False, default=0)
+    created_at = Column(Float, nullable=False)
+    claimed_at = Column(Float)
+    updated_at = Column(Float, nullable=False)
+
+class ChatSession(Base):
+    """Context uploaded once by the chat widget (see main.py); deleted with the user's profile."""
+    __tablename__ = 'chat_sessions'
+    __table_args__ = (
+        Index('ix_chat_sessions_user', 'user_id'),
+        Index('ix_chat_sessions_expires', 'expires_at'),
+    )
+    id = Column(String, primary_key=True)  # random hex token handed to the browser
+    user_id = Column(Integer, ForeignKey('users.id'))
+    forecast = Column(Text)  # JSON
+    context = Column(Text)
+    created_at = Column(Float, nullable=False)
+    expires_at = Column(Float, nullable=False)  # pushed back by every message
+
+class ChatMessage(Base):
+    """One turn of a chat session; rows are appended, so concurrent messages never overwrite each other."""
+    __tablename__ = 'chat_messages'
+    __table_args__ = (Index('ix_chat_messages_session', 'session_id', 'id'),)
+    id = Column(Integer, primary_key=True)
+    session_id = Column(String, ForeignKey('chat_sessions.id'), nullable=False)
+    role = Column(String, nullable=False)  # user / assistant
+    content = Column(Text, nullable=False)
+    created_at = Column(Float, nullable=False)
+
+DB_URL = f"sqlite:///{db_pool.DB_PATH}"
+# Connections come from db_pool so the API gets the same WAL/busy_timeout pragmas as app.py
+engine = create_engine(DB_URL, creator=db_pool.connect, pool_size=10, max_overflow=20)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 def init_db():
     Base.metadata.create_all(bind=engine)
+    # Bring existing databases up to date (indexes etc.)
+    raw_conn = engine.raw_connection()
+    try:
+        migrate(raw_conn.driver_connection)
+    finally:
+        raw_conn.close()
 
 if __name__ == "__main__":
     init_db()
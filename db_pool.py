@@ -0,0 +1,135 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+
+# --- Shared SQLite Connection Pool ---
+# Used by both the Streamlit app (raw sqlite3 via repository.py) and the FastAPI
+# service (SQLAlchemy engine in database.py, through `connect` as its creator).
+# WAL lets readers proceed while a writer holds the lock; busy_timeout makes
+# writers wait for the lock instead of failing with "database is locked".
+#
+# Streamlit runs every rerun on a new thread, so connections are not tied to threads:
+# transaction()/connection() check one out of a small per-process pool for the block
+# and hand it back, and at most IDCS_DB_POOL_SIZE are ever open.
+
+DB_PATH = os.environ.get("IDCS_DB_PATH", "idcs.db")
+POOL_SIZE = int(os.environ.get("IDCS_DB_POOL_SIZE", "8"))
+POOL_TIMEOUT_SECS = float(os.environ.get("IDCS_DB_POOL_TIMEOUT_SECS", "10"))
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",          # Safe with WAL; fsync at checkpoints only
+    "PRAGMA busy_timeout=5000",           # ms to wait on a locked database
+    "PRAGMA mmap_size=268435456",         # 256 MB memory-mapped reads
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",           # ~16 MB page cache per connection
+)
+
+def apply_pragmas(conn: sqlite3.Connection):
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+
+
+def connect(path: str = None) -> sqlite3.Connection:
+    """Opens a new tuned connection. SQLAlchemy pools these itself."""
+    conn = sqlite3.connect(path or DB_PATH, timeout=10.0, check_same_thread=False, cached_statements=256)
+    apply_pragmas(conn)
+    return conn
+
+
+class ConnectionPool:
+    """At most `size` open connections, reused (most recent first) by whichever thread asks."""
+
+    def __init__(self, size: int = POOL_SIZE, path: Optional[str] = None):
+        self.size = size
+        self.path = path
+        self._idle: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def acquire(self, timeout: float = POOL_TIMEOUT_SECS) -> sqlite3.Connection:
+        """Blocks while all `size` connections are checked out; raises after `timeout`."""
+        if not self._slots.acquire(timeout=timeout):
+            raise sqlite3.OperationalError(
+                f"No free database connection after {timeout:g}s (IDCS_DB_POOL_SIZE={self.size})")
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        if conn is None:
+            try:
+                conn = connect(self.path)
+            except BaseException:
+                self._slots.release()
+                raise
+        return conn
+
+    def release(self, conn: sqlite3.Connection):
+        """Returns a connection; one left mid-transaction is rolled back, a broken one is closed."""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            with self._lock:
+                self._idle.append(conn)
+        except sqlite3.Error:
+            conn.close()
+        finally:
+            self._slots.release()
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """Process-wide pool shared by every Streamlit session and worker thread."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool()
+        return _pool
+
+
+@contextmanager
+def connection() -> Iterator[sqlite3.Connection]:
+    """Pooled connection for the block, without a commit (reads)."""
+    pool = get_pool()
+    conn = pool.acquire()
+    try:
+        yield conn
+    finally:
+        pool.release(conn)
+
+
+@contextmanager
+def transaction() -> Iterator[sqlite3.Connection]:
+    """Pooled connection that commits on success and rolls back on error."""
+    with connection() as conn:
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+
+@contextmanager
+def write_transaction() -> Iterator[sqlite3.Connection]:
+    """
+    Like transaction(), but takes the write lock upfront (BEGIN IMMEDIATE).
+    Use for read-then-write work so a concurrent commit can't invalidate the read snapshot.
+    """
+    with connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
@@ -2,10 +2,15 @@ from prophet import Prophet
 import numpy as np
 import pandas as pd
 
+from metrics import timed
+from tracing import span, traced
+
 class IDCS_Engine:
     def __init__(self):
         pass
 
+    @timed("predict_risk_horizon")
+    @traced("engine.predict_risk_horizon")
     def predict_risk_horizon(self, df_monthly, mu):
         """
         Time-Series Forecasting using Prophet for the next 6 months.
@@ -21,11 +26,13 @@ class IDCS_Engine:
         
         # 2. Model Training
         model = Prophet(yearly_seasonality=True, weekly_seasonality=False, daily_seasonality=False)
-        model.fit(df_prophet[['ds', 'y']])
+        with span("prophet.fit", months=len(df_prophet)):
+            model.fit(df_prophet[['ds', 'y']])
         
         # 3. 6-Month Horizon Forecast
         future = model.make_future_dataframe(periods=6, freq='MS')
-        forecast = model.predict(future)
+        with span("prophet.predict"):
+            forecast = model.predict(future)
         
         # Extract predictions for the future 6 months
         predictions_df = forecast.tail(6).copy()
@@ -56,6 +63,8 @@ class IDCS_Engine:
             
         return predictions, risk_score, (model, forecast)
 
+    @timed("calculate_metrics")
+    @traced("engine.calculate_metrics")
     def calculate_metrics(self, income_history, src_cap, current_income, w_emp=1.0):
         """
         income_history: list of dicts with 'amount' and 'status'
@@ -78,6 +87,14 @@ class IDCS_Engine:
         # Risk & Probability Assessment
         dip_probability = (dip_count / total_months * 100) if total_months > 0 else 0
         
+        result = self._eligibility(mu, sigma, statuses.count("Paid"), statuses.count("Unpaid"),
+                                   src_cap, current_income, w_emp)
+        result.update(self._risk_pattern(dips, total_months, dip_probability))
+        return result
+
+    def _risk_pattern(self, dips, total_months, dip_probability):
+        """Dip-interval pattern detection on the indices of dip months."""
+        dip_count = len(dips)
         pattern_detected = False
         predicted_dip_month = None
         risk_level = "LOW"
@@ -111,10 +128,85 @@ class IDCS_Engine:
         elif dip_probability > 0:
             risk_level = "MEDIUM"
 
-        current_dip_detected = bool(current_income < dip_threshold)
+        return {
+            "dip_probability": float(dip_probability),
+            "risk_level": risk_level,
+            "pattern_detected": pattern_detected,
+            "predicted_dip_month": predicted_dip_month,
+            "next_dip_idx": next_dip_idx
+        }
+
+    @timed("calculate_metrics_batch")
+    @traced("engine.calculate_metrics_batch")
+    def calculate_metrics_batch(self, income_histories, src_caps, current_incomes, w_emps):
+        """
+        Vectorized calculate_metrics for many members at once.
+        income_histories: list of income_history lists (may differ in length);
+        src_caps / current_incomes / w_emps: one value per member.
+        Returns one dict per member with the same fields as calculate_metrics.
+        """
+        n = len(income_histories)
+        if n == 0:
+            return []
+
+        # 1. Pack histories into a padded (members x months) matrix + validity mask
+        lengths = np.fromiter((len(h) for h in income_histories), dtype=np.int64, count=n)
+        width = max(1, int(lengths.max()))
+        amounts = np.zeros((n, width))
+        valid = np.arange(width)[None, :] < lengths[:, None]
+        paid = np.zeros(n, dtype=np.int64)
+        unpaid = np.zeros(n, dtype=np.int64)
+        for i, history in enumerate(income_histories):
+            if history:
+                amounts[i, :len(history)] = [record['amount'] for record in history]
+                statuses = [record['status'] for record in history]
+                paid[i] = statuses.count("Paid")
+                unpaid[i] = statuses.count("Unpaid")
+
+        # 2. Mean / population std per row
+        counts = np.maximum(lengths, 1)
+        has_data = lengths > 0
+        mu = np.where(has_data, np.where(valid, amounts, 0.0).sum(axis=1) / counts, 0.0)
+        sq_dev = np.where(valid, (amounts - mu[:, None]) ** 2, 0.0)
+        sigma = np.where(has_data, np.sqrt(sq_dev.sum(axis=1) / counts), 0.0)
+
+        # 3. Dips, stability, eligibility, payout
+        dip_mask = valid & (amounts < 0.8 * mu[:, None])
+        dip_count = dip_mask.sum(axis=1)
+        dip_probability = np.where(has_data, dip_count / counts * 100, 0.0)
+
+        current = np.asarray(current_incomes, dtype=float)
+        caps = np.asarray(src_caps, dtype=float)
+        w = np.asarray(w_emps, dtype=float)
+
+        dip_detected = current < 0.8 * mu
+        positive = mu > 0
+        s_base = 100 * (1 - sigma / np.where(positive, mu, 1.0)) * w
+        stability = np.where(positive, np.maximum(0, s_base - 5 * unpaid), 0.0)
+        eligible = dip_detected & (paid >= 3) & (stability >= 50)
+        payout = np.where(eligible, np.maximum(0, np.minimum(caps, 0.70 * mu)), 0.0)
+
+        results = []
+        for i in range(n):
+            dips = np.flatnonzero(dip_mask[i]).tolist()
+            result = {
+                "mu": float(mu[i]),
+                "sigma": float(sigma[i]),
+                "stability_score": float(stability[i]),
+                "dip_detected": bool(dip_detected[i]),
+                "eligible": bool(eligible[i]),
+                "payout": float(payout[i]),
+                "paid_months": int(paid[i]),
+                "unpaid_months": int(unpaid[i])
+            }
+            result.update(self._risk_pattern(dips, int(lengths[i]), float(dip_probability[i])))
+            results.append(result)
+        return results
+
+    def _eligibility(self, mu, sigma, paid_months, unpaid_months, src_cap, current_income, w_emp):
+        current_dip_detected = bool(current_income < 0.8 * mu)
 
         # 3. Stability Score (S)
-        unpaid_months = statuses.count("Unpaid")
         p_unpaid = 5 * unpaid_months
         
         if mu > 0:
@@ -124,7 +216,6 @@ class IDCS_Engine:
             stability_score = 0
 
         # Eligibility
-        paid_months = statuses.count("Paid")
         eligible = bool(current_dip_detected and paid_months >= 3 and stability_score >= 50)
 
         # Predicted Compensation (Capped at 70% of Mean income)
@@ -140,14 +231,47 @@ class IDCS_Engine:
             "dip_detected": current_dip_detected,
             "eligible": eligible,
             "payout": float(predicted_compensation),
-            "paid_months": paid_months,
-            "unpaid_months": unpaid_months,
+            "paid_months": int(paid_months),
+            "unpaid_months": int(unpaid_months)
+        }
+
+    @staticmethod
+    def needs_full_history(stats):
+        """Repeated dips may form an interval pattern (up to CRITICAL) that only the month positions reveal."""
+        return bool(stats and stats['n'] and stats['dip_count'] > 1)
+
+    @timed("metrics_from_stats")
+    def metrics_from_stats(self, stats, src_cap, current_income, w_emp=1.0):
+        """
+        Evaluation from a user_stats row (n, mean, m2, dip_count, paid_count, unpaid_count)
+        instead of the full history. Eligibility, score and payout match calculate_metrics;
+        risk_level matches it only when needs_full_history(stats) is False. With repeated dips
+        the interval pattern can't be checked from stats, so risk is reported conservatively as
+        HIGH (the full evaluation may say CRITICAL); callers that must be exact load the history.
+        """
+        n = stats['n'] if stats else 0
+        mu = stats['mean'] if n else 0
+        sigma = np.sqrt(max(0.0, stats['m2']) / n) if n else 0
+        dip_probability = (stats['dip_count'] / n * 100) if n else 0
+
+        risk_level = "LOW"
+        if self.needs_full_history(stats):
+            risk_level = "HIGH"
+        elif dip_probability >= 50:
+            risk_level = "HIGH"
+        elif dip_probability > 0:
+            risk_level = "MEDIUM"
+
+        result = self._eligibility(mu, sigma, stats['paid_count'] if n else 0, stats['unpaid_count'] if n else 0,
+                                   src_cap, current_income, w_emp)
+        result.update({
             "dip_probability": float(dip_probability),
             "risk_level": risk_level,
-            "pattern_detected": pattern_detected,
-            "predicted_dip_month": predicted_dip_month,
-            "next_dip_idx": next_dip_idx
-        }
+            "pattern_detected": False,
+            "predicted_dip_month": None,
+            "next_dip_idx": None
+        })
+        return result
 
 def calculate_custom_premium(mean, dip_probability, age, dependencies, employment_status, risk_score=0):
     """
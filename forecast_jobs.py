@@ -0,0 +1,254 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional
+
+import db_pool
+import tracing
+from metrics import ENGINE_LATENCY, record_cache
+
+# --- Forecast Job Queue ---
+# Prophet fits take seconds, so neither Streamlit reruns nor API requests run them inline.
+# Callers enqueue a job (identical pending/running/recently finished jobs are reused) and poll it.
+# A dispatcher thread claims pending rows from the forecast_jobs table and runs them on a
+# process pool. Jobs are rows in idcs.db, so queued work survives restarts: rows left
+# 'running' by a dead process are put back to 'pending' when a worker starts.
+# A finished result is reused for RESULT_TTL_SECS (after that the same input is forecast
+# again), and finished rows are deleted by the dispatcher after RETENTION_SECS.
+
+PENDING, RUNNING, DONE, FAILED = "pending", "running", "done", "failed"
+STALE_AFTER_SECS = 15 * 60
+MAX_ATTEMPTS = 3
+RESULT_TTL_SECS = float(os.environ.get("IDCS_FORECAST_RESULT_TTL_SECS", str(24 * 3600)))
+RETENTION_SECS = float(os.environ.get("IDCS_FORECAST_RETENTION_SECS", str(7 * 24 * 3600)))
+
+SQL_FIND_ACTIVE = f"""
+SELECT id FROM forecast_jobs
+WHERE job_key = ? AND (status IN ('{PENDING}', '{RUNNING}') OR (status = '{DONE}' AND updated_at > ?))
+ORDER BY id DESC LIMIT 1
+"""
+SQL_INSERT_JOB = "INSERT INTO forecast_jobs (job_key, status, payload, attempts, created_at, updated_at) VALUES (?, ?, ?, 0, ?, ?)"
+SQL_GET_JOB = "SELECT id, status, payload, result, error, attempts, created_at, updated_at FROM forecast_jobs WHERE id = ?"
+SQL_CLAIM_NEXT = f"""
+UPDATE forecast_jobs SET status = '{RUNNING}', owner = ?, attempts = attempts + 1, claimed_at = ?, updated_at = ?
+WHERE id = (SELECT id FROM forecast_jobs WHERE status = '{PENDING}' ORDER BY id LIMIT 1)
+RETURNING id, payload
+"""
+SQL_FINISH_JOB = "UPDATE forecast_jobs SET status = ?, result = ?, error = ?, updated_at = ? WHERE id = ?"
+SQL_RUNNING_JOBS = f"SELECT id, owner, claimed_at, attempts FROM forecast_jobs WHERE status = '{RUNNING}'"
+SQL_REQUEUE_JOB = f"UPDATE forecast_jobs SET status = ?, owner = NULL, updated_at = ? WHERE id = ? AND status = '{RUNNING}'"
+SQL_RETRY_JOB = f"""
+UPDATE forecast_jobs SET status = CASE WHEN attempts < ? THEN '{PENDING}' ELSE '{FAILED}' END,
+    owner = NULL, error = ?, updated_at = ?
+WHERE id = ?
+"""
+SQL_PRUNE_JOBS = f"DELETE FROM forecast_jobs WHERE status IN ('{DONE}', '{FAILED}') AND updated_at < ?"
+
+
+def job_key(payload: Dict) -> str:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def make_payload(history: List[Dict], mu: Optional[float] = None) -> Dict:
+    """history: [{'month': 'YYYY-MM', 'amount': float}, ...]; mu defaults to the mean monthly amount."""
+    rows = [{"month": str(h["month"])[:7], "amount": float(h["amount"])} for h in history]
+    if mu is None:
+        mu = sum(r["amount"] for r in rows) / len(rows) if rows else 0.0
+    return {"history": rows, "mu": float(mu)}
+
+
+def run_forecast(payload: Dict, job_id: Optional[int] = None) -> Dict:
+    """
+    Executed in a worker process. Returns JSON-safe predictions plus the forecast arrays for charts.
+    Spans are traced as "forecast-<job_id>" (the enqueueing span carries the same job_id).
+    """
+    import pandas as pd # pyre-ignore[21]
+    from engine import IDCS_Engine # pyre-ignore[21]
+
+    with tracing.trace_context(f"forecast-{job_id}" if job_id is not None else None):
+        df_monthly = pd.DataFrame(payload["history"], columns=["month", "amount"]).rename(columns={"amount": "Total Income"})
+        start = time.perf_counter()
+        predictions, risk_score, prophet_md = IDCS_Engine().predict_risk_horizon(df_monthly, payload["mu"])
+        elapsed = time.perf_counter() - start
+
+    forecast = []
+    if prophet_md:
+        _, fc = prophet_md
+        forecast = [
+            {"ds": ds.strftime("%Y-%m-%d"), "yhat": float(yhat), "yhat_lower": float(lo), "yhat_upper": float(hi)}
+            for ds, yhat, lo, hi in zip(fc["ds"], fc["yhat"], fc["yhat_lower"], fc["yhat_upper"])
+        ]
+    # The worker's own metrics registry is never scraped; the parent records `elapsed` (see _finish)
+    return {"predictions": predictions, "risk_score": float(risk_score), "forecast": forecast, "elapsed": elapsed}
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class ForecastJobQueue:
+    def __init__(self, max_workers: int = 2, poll_interval: float = 1.0):
+        self.max_workers = max_workers
+        self.poll_interval = poll_interval
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._slots = threading.BoundedSemaphore(max_workers)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_broken = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # -- Producer side --
+
+    def enqueue(self, history: List[Dict], mu: Optional[float] = None) -> int:
+        """Returns the id of a new job, or of an identical one that is pending, running or recently done."""
+        payload = make_payload(history, mu)
+        key = job_key(payload)
+        now = time.time()
+        # The duplicate check and insert happen under the write lock
+        with tracing.span("forecast.enqueue", months=len(payload["history"])) as attrs, \
+                db_pool.write_transaction() as conn:
+            row = conn.execute(SQL_FIND_ACTIVE, (key, now - RESULT_TTL_SECS)).fetchone()
+            job_id = row[0] if row else conn.execute(
+                SQL_INSERT_JOB, (key, PENDING, json.dumps(payload), now, now)).lastrowid
+            attrs.update(job_id=job_id, reused=row is not None)
+        record_cache("forecast_jobs", row is not None)
+        self._wakeup.set()
+        return job_id
+
+    def get(self, job_id: int) -> Optional[Dict]:
+        with db_pool.connection() as conn:
+            row = conn.execute(SQL_GET_JOB, (int(job_id),)).fetchone()
+        if row is None:
+            return None
+        job_id, status, _payload, result, error, attempts, created_at, updated_at = row
+        return {
+            "job_id": job_id,
+            "status": status,
+            "result": json.loads(result) if result else None,
+            "error": error,
+            "attempts": attempts,
+            "created_at": created_at,
+            "updated_at": updated_at
+        }
+
+    # -- Worker side --
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self.recover()
+        self.prune()
+        # spawn: workers start clean instead of forking a threaded uvicorn/Streamlit process
+        self._pool = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+        self._thread = threading.Thread(target=self._dispatch_loop, name="forecast-dispatcher", daemon=True)
+        self._thread.start()
+
+    def stop(self, wait: bool = True):
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait, cancel_futures=True)
+            self._pool = None
+
+    def recover(self):
+        """Requeue jobs left 'running' by a process that died (same host) or that went stale."""
+        host = socket.gethostname()
+        now = time.time()
+        with db_pool.transaction() as conn:
+            for job_id, owner, claimed_at, attempts in conn.execute(SQL_RUNNING_JOBS).fetchall():
+                owner_host, _, owner_pid = (owner or "").rpartition(":")
+                dead = owner_host == host and owner_pid.isdigit() and not _pid_alive(int(owner_pid))
+                stale = claimed_at is not None and now - claimed_at > STALE_AFTER_SECS
+                if dead or stale:
+                    status = PENDING if attempts < MAX_ATTEMPTS else FAILED
+                    conn.execute(SQL_REQUEUE_JOB, (status, now, job_id))
+
+    def prune(self) -> int:
+        """Deletes finished jobs untouched for RETENTION_SECS. Returns the number removed."""
+        with db_pool.transaction() as conn:
+            return conn.execute(SQL_PRUNE_JOBS, (time.time() - RETENTION_SECS,)).rowcount
+
+    def _claim(self):
+        now = time.time()
+        with db_pool.transaction() as conn:
+            return conn.execute(SQL_CLAIM_NEXT, (self.owner, now, now)).fetchone()
+
+    def _retry(self, job_id: int, error: BaseException):
+        """Back to pending after an infrastructure failure; failed once MAX_ATTEMPTS claims are used up."""
+        with db_pool.transaction() as conn:
+            conn.execute(SQL_RETRY_JOB, (MAX_ATTEMPTS, f"{type(error).__name__}: {error}", time.time(), job_id))
+
+    def _finish(self, job_id: int, future):
+        try:
+            error = future.exception()
+            if isinstance(error, BrokenProcessPool):
+                # A worker died (maybe running another job), not necessarily because of this one
+                self._pool_broken.set()
+                self._retry(job_id, error)
+                return
+            if error is None:
+                result = future.result()
+                ENGINE_LATENCY.observe(result.pop("elapsed"), "predict_risk_horizon")
+                values = (DONE, json.dumps(result), None)
+            else:
+                values = (FAILED, None, f"{type(error).__name__}: {error}")
+            with db_pool.transaction() as conn:
+                conn.execute(SQL_FINISH_JOB, values + (time.time(), job_id))
+        finally:
+            self._slots.release()
+            self._wakeup.set()
+
+    def _restart_pool(self):
+        self._pool_broken.clear()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self._pool = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def _dispatch_loop(self):
+        last_recover = time.time()
+        while not self._stop.is_set():
+            if time.time() - last_recover > STALE_AFTER_SECS / 2:
+                self.recover()
+                self.prune()
+                last_recover = time.time()
+
+            if not self._slots.acquire(timeout=self.poll_interval):
+                continue
+            try:
+                claimed = self._claim()
+            except Exception:
+                claimed = None
+            if claimed is None:
+                self._slots.release()
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+
+            job_id, payload = claimed
+            if self._pool_broken.is_set():
+                self._restart_pool()
+            try:
+                future = self._pool.submit(run_forecast, json.loads(payload), job_id)
+            except Exception as e:
+                # e.g. BrokenProcessPool after a worker crash: the job never ran, so requeue it
+                # (its claim still counts towards MAX_ATTEMPTS) and start a fresh pool
+                self._retry(job_id, e)
+                self._slots.release()
+                self._restart_pool()
+                continue
+            future.add_done_callback(lambda f, job_id=job_id: self._finish(job_id, f))
@@ -0,0 +1,177 @@
+import argparse
+import csv
+import sqlite3
+import sys
+import time
+from itertools import islice
+from typing import Dict, Iterator, List
+
+import db_pool
+from database import init_db
+from migrations import drop_bulk_load_objects, restore_bulk_load_objects
+from repository import DEFAULT_SRC_CAP, DEFAULT_TAX_BRACKET
+
+# --- Bulk Portfolio Import ---
+# Loads partner member books into idcs.db. Input is one row per member-month:
+#
+#   name, age, employment_type, month_index, income_amount, status[, email]
+#
+# Rows are streamed (never fully loaded), written one batch per transaction with
+# executemany, and members are resolved through an in-memory name -> id map.
+#
+#   python import_portfolio.py members.csv --batch-size 20000 --defer-indexes
+#
+# Re-running an import is safe: each member-month is upserted on the unique
+# (user_id, month_index) index, so corrected files overwrite rather than duplicate.
+# A blank income_amount is stored as NULL; rows without a usable name or
+# month_index (or with a non-numeric amount) are skipped and counted, as are the
+# rows of a new member that can't be created (e.g. an email another member uses).
+#
+# --defer-indexes drops the name index and the user_stats triggers for the load
+# and rebuilds them (plus all stats) once at the end, which is much faster for large books.
+
+REQUIRED_COLUMNS = ("name", "month_index", "income_amount", "status")
+SQLITE_MAX_PARAMS = 900
+
+SQL_INSERT_MEMBER = "INSERT INTO users (name, email, age, employment_type, src_cap, src_tax_bracket, premium, deferred_period) VALUES (?, ?, ?, ?, ?, ?, 0.0, 30)"
+SQL_UPSERT_INCOME = """INSERT INTO income_history (user_id, month_index, income_amount, status) VALUES (?, ?, ?, ?)
+    ON CONFLICT(user_id, month_index) DO UPDATE SET income_amount = excluded.income_amount, status = excluded.status"""
+
+
+def read_csv(path: str) -> Iterator[Dict]:
+    with open(path, newline="", encoding="utf-8") as f:
+        yield from csv.DictReader(f)
+
+
+def read_parquet(path: str, batch_size: int) -> Iterator[Dict]:
+    try:
+        import pyarrow.parquet as pq # pyre-ignore[21]
+    except ImportError:
+        sys.exit("Parquet input needs pyarrow: pip install pyarrow")
+    for record_batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size):
+        yield from record_batch.to_pylist()
+
+
+def _int_or_none(value):
+    return int(float(value)) if value not in (None, "") else None
+
+
+def _float_or_none(value):
+    return float(value) if value not in (None, "") else None
+
+
+def _income_row(r: Dict):
+    """(name, month_index, income_amount, status), or None if the row can't be stored."""
+    if not r["name"]:
+        return None
+    try:
+        month_index = int(float(r["month_index"]))
+        amount = _float_or_none(r["income_amount"])
+    except (TypeError, ValueError):
+        return None
+    return r["name"], month_index, amount, r["status"] or None
+
+
+def load_name_map(conn: sqlite3.Connection, names: List[str]) -> Dict[str, int]:
+    """Existing ids for `names` (first match wins, like the API's `.first()`)."""
+    found: Dict[str, int] = {}
+    for i in range(0, len(names), SQLITE_MAX_PARAMS):
+        chunk = names[i:i + SQLITE_MAX_PARAMS]
+        placeholders = ",".join("?" * len(chunk))
+        for uid, name in conn.execute(
+                f"SELECT MIN(id), name FROM users WHERE name IN ({placeholders}) GROUP BY name", chunk):
+            found[name] = uid
+    return found
+
+
+def import_batch(conn: sqlite3.Connection, rows: List[Dict], user_ids: Dict[str, int], preloaded: bool) -> int:
+    """Writes one batch of member-month rows in a single transaction. Returns the number of rows skipped."""
+    parsed = [(r, _income_row(r)) for r in rows]
+    valid = [(r, income) for r, income in parsed if income is not None]
+    with conn:
+        # In file order, so of two new members sharing an email the first one is created
+        missing = list(dict.fromkeys(r["name"] for r, _ in valid if r["name"] not in user_ids))
+        if missing and not preloaded:
+            user_ids.update(load_name_map(conn, missing))
+            missing = [n for n in missing if n not in user_ids]
+
+        if missing:
+            first_row = {}
+            for r, _ in valid:
+                first_row.setdefault(r["name"], r)
+            for name in missing:
+                r = first_row[name]
+                try:
+                    cursor = conn.execute(SQL_INSERT_MEMBER, (
+                        name, r.get("email") or None, _int_or_none(r.get("age")), r.get("employment_type") or None,
+                        DEFAULT_SRC_CAP, DEFAULT_TAX_BRACKET
+                    ))
+                except sqlite3.IntegrityError:
+                    # Duplicate email: only this statement is rolled back, the batch carries on without the member
+                    continue
+                user_ids[name] = cursor.lastrowid
+
+        stored = [income for _, income in valid if income[0] in user_ids]
+        conn.executemany(SQL_UPSERT_INCOME, [
+            (user_ids[name], month_index, amount, status)
+            for name, month_index, amount, status in stored
+        ])
+    return len(rows) - len(stored)
+
+
+def run_import(path: str, fmt: str, batch_size: int, defer_indexes: bool) -> Dict[str, float]:
+    init_db()
+    conn = db_pool.connect()
+    started = time.perf_counter()
+    rows_done = 0
+    skipped = 0
+
+    source = read_parquet(path, batch_size) if fmt == "parquet" else read_csv(path)
+    user_ids: Dict[str, int] = {}
+    try:
+        if defer_indexes:
+            with conn:
+                drop_bulk_load_objects(conn)
+            # Without ix_users_name, resolve every name from one upfront scan
+            user_ids = {name: uid for uid, name in conn.execute("SELECT MIN(id), name FROM users GROUP BY name")}
+
+        while True:
+            batch = list(islice(source, batch_size))
+            if not batch:
+                break
+            for col in REQUIRED_COLUMNS:
+                if col not in batch[0]:
+                    raise ValueError(f"Input is missing required column '{col}'")
+            skipped += import_batch(conn, batch, user_ids, preloaded=defer_indexes)
+            rows_done += len(batch)
+            elapsed = time.perf_counter() - started
+            print(f"  {rows_done:,} rows | {len(user_ids):,} members | {skipped:,} skipped | "
+                  f"{rows_done / elapsed:,.0f} rows/s", flush=True)
+    finally:
+        if defer_indexes:
+            print("Rebuilding indexes and user stats...", flush=True)
+            with conn:
+                restore_bulk_load_objects(conn)
+        conn.close()
+
+    return {"rows": rows_done, "members": len(user_ids), "skipped": skipped, "seconds": time.perf_counter() - started}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-import members and income histories into idcs.db")
+    parser.add_argument("path", help="CSV or Parquet file, one row per member-month")
+    parser.add_argument("--format", choices=["csv", "parquet"], help="Defaults to the file extension")
+    parser.add_argument("--batch-size", type=int, default=10000, help="Rows per transaction")
+    parser.add_argument("--defer-indexes", action="store_true",
+                        help="Drop the name index and the stats triggers during the load, rebuild at the end")
+    args = parser.parse_args()
+
+    fmt = args.format or ("parquet" if args.path.lower().endswith((".parquet", ".pq")) else "csv")
+    print(f"Importing {args.path} ({fmt}) into {db_pool.DB_PATH}...")
+    summary = run_import(args.path, fmt, args.batch_size, args.defer_indexes)
+    print(f"Done: {summary['rows']:,} rows for {summary['members']:,} members in {summary['seconds']:.1f}s"
+          f" ({summary['skipped']:,} unusable rows or rows of rejected members skipped).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+from typing import Dict
+
+import numpy as np # pyre-ignore[21]
+import pandas as pd # pyre-ignore[21]
+
+# --- Income History Views ---
+# Everything the dashboard shows about a statement's monthly history, built once per dataset
+# (at ingest) with vectorized pandas ops and kept in the session store next to the
+# transactions. Reruns read these instead of regrouping, strptime-ing and pivoting again.
+#
+#   monthly_inflow  {YYYY-MM: total}, months missing inside the span as 0.0
+#   history_table   Month / Inflow (KES) / Status rows for the Income History table
+#   heatmap         Year x Jan..Dec matrix of monthly totals (only months that occur)
+#   monthly         MonthGroup / Total Income / Variance from Average (months with inflows)
+#   mu              mean of monthly['Total Income']
+#   variance_trace  "YYYY-MM (Var: n), ..." for the AI assistant context
+
+MONTH_NAMES = np.array(['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'])
+
+
+def build(df_tx: pd.DataFrame) -> Dict:
+    """df_tx: one row per transaction with 'date' and 'amount' columns."""
+    months = pd.to_datetime(df_tx['date']).dt.to_period('M')
+    totals = df_tx['amount'].astype(float).groupby(months).sum().sort_index()
+
+    # 1. Gap-filled monthly series (same semantics as process_and_group_inflows / repository.monthly_totals)
+    filled = totals.reindex(pd.period_range(totals.index.min(), totals.index.max(), freq='M'), fill_value=0.0)
+    labels = filled.index.strftime('%Y-%m')
+
+    # 2. Income History table, formatted once
+    history_table = pd.DataFrame({
+        "Month": labels,
+        "Inflow (KES)": [f"{amt:,.2f}" for amt in filled.to_numpy()],
+        "Status": np.where(filled.to_numpy() > 0, "Stable", "🚨 DIP")
+    })
+
+    # 3. Year x month heatmap
+    heat = pd.DataFrame({
+        "Year": filled.index.year.astype(str),
+        "MonthName": MONTH_NAMES[filled.index.month - 1],
+        "Amount": filled.to_numpy()
+    })
+    heatmap = heat.pivot(index="Year", columns="MonthName", values="Amount").fillna(0)
+    heatmap = heatmap[[m for m in MONTH_NAMES if m in heatmap.columns]]
+
+    # 4. Variance table over months that had inflows
+    mu = float(totals.mean())
+    monthly = pd.DataFrame({
+        "MonthGroup": totals.index.strftime('%Y-%m'),
+        "Total Income": totals.to_numpy(),
+    })
+    monthly['Variance from Average'] = monthly['Total Income'] - mu
+    variance_trace = ", ".join(
+        f"{month} (Var: {var:,.0f})" for month, var in zip(monthly['MonthGroup'], monthly['Variance from Average'])
+    )
+
+    return {
+        "monthly_inflow": dict(zip(labels, filled.to_numpy().tolist())),
+        "history_table": history_table,
+        "heatmap": heatmap,
+        "monthly": monthly,
+        "mu": mu,
+        "variance_trace": variance_trace,
+    }
@@ -0,0 +1,188 @@
+import hashlib
+import http.client
+import random
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional
+
+from metrics import record_cache
+
+# --- Shared Gemini Request Scheduler ---
+# Every Gemini call in the process goes through one scheduler so that:
+#   1. At most `max_concurrency` requests are on the wire at once.
+#   2. Requests are paced by a token bucket (`rate_per_sec`, `burst`).
+#   3. Transient failures are retried with jittered exponential backoff.
+#   4. Identical in-flight requests share a single call and result.
+# The scheduler only sees a callable, so tests can drive it with a fake client.
+
+
+class RetryableError(Exception):
+    """Raised by callers to force a retry regardless of the exception filter."""
+
+
+# Failures without an HTTP status that are worth retrying: the request never got a complete answer
+TRANSIENT_ERRORS: tuple = (ConnectionError, TimeoutError, http.client.IncompleteRead)
+try:
+    import requests # pyre-ignore[21]
+    TRANSIENT_ERRORS += (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                         requests.exceptions.ChunkedEncodingError)
+except ImportError:
+    pass
+# grpc.StatusCode names for errors raised straight from the transport (their value is a tuple)
+TRANSIENT_GRPC_STATUSES = {"UNAVAILABLE", "DEADLINE_EXCEEDED", "RESOURCE_EXHAUSTED", "INTERNAL"}
+
+
+class TokenBucket:
+    """Thread-safe token bucket. `acquire()` blocks until a token is available."""
+
+    def __init__(self, rate_per_sec: float, burst: int, clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.rate = float(rate_per_sec)
+        self.capacity = float(max(1, burst))
+        self.tokens = self.capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = self._clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            self._sleep(wait)
+
+
+def default_is_retryable(exc: Exception) -> bool:
+    """
+    Retry on rate limits, timeouts and server-side errors.
+    google.api_core exceptions expose an HTTP `code`; anything without one is only
+    retried if it is a network or timeout error (TRANSIENT_ERRORS). Bugs, bad
+    arguments and auth problems fail on the first attempt.
+    """
+    if isinstance(exc, RetryableError):
+        return True
+    code = getattr(exc, "code", None)
+    if callable(code):
+        try:
+            code = code()
+        except Exception:
+            code = None
+    if getattr(code, "name", None) in TRANSIENT_GRPC_STATUSES:
+        return True
+    code = getattr(code, "value", code)
+    if isinstance(code, int):
+        return code == 429 or code == 408 or code >= 500
+    return isinstance(exc, TRANSIENT_ERRORS)
+
+
+class LLMRequestScheduler:
+    def __init__(self, max_concurrency: int = 4, rate_per_sec: float = 2.0, burst: int = 4,
+                 max_retries: int = 4, base_delay: float = 1.0, max_delay: float = 30.0,
+                 is_retryable: Callable[[Exception], bool] = default_is_retryable,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.is_retryable = is_retryable
+        self._sleep = sleep
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._bucket = TokenBucket(rate_per_sec, burst, sleep=sleep)
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "retries": 0, "coalesced": 0, "failures": 0}
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        """Stable key for coalescing: hash of the model name + prompt (or any parts)."""
+        digest = hashlib.sha256()
+        for part in parts:
+            data = part if isinstance(part, bytes) else str(part).encode("utf-8")
+            digest.update(data)
+            digest.update(b"\x00")
+        return digest.hexdigest()
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff: uniform(0, min(max_delay, base * 2^attempt))."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def submit(self, fn: Callable[[], Any], key: Optional[str] = None) -> Any:
+        """
+        Runs `fn()` under the concurrency limit and rate limit, retrying transient errors.
+        Callers passing the same `key` while a call is in flight wait for and share its result
+        (or its final exception).
+        """
+        if key is None:
+            return self._run(fn)
+
+        with self._lock:
+            pending = self._inflight.get(key)
+            if pending is None:
+                owner = True
+                pending = Future()
+                self._inflight[key] = pending
+            else:
+                owner = False
+                self.stats["coalesced"] += 1
+        record_cache("llm_inflight", not owner)
+
+        if not owner:
+            return pending.result()
+
+        try:
+            result = self._run(fn)
+        except BaseException as e:
+            pending.set_exception(e)
+            raise
+        else:
+            pending.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def _count(self, stat: str):
+        # Concurrent callers share stats; += on a dict entry is not atomic
+        with self._lock:
+            self.stats[stat] += 1
+
+    def _run(self, fn: Callable[[], Any]) -> Any:
+        attempt = 0
+        while True:
+            self._bucket.acquire()
+            with self._slots:
+                self._count("calls")
+                try:
+                    return fn()
+                except Exception as e:
+                    if attempt >= self.max_retries or not self.is_retryable(e):
+                        self._count("failures")
+                        raise
+            # Back off outside the concurrency slot so other requests can proceed
+            self._count("retries")
+            self._sleep(self.backoff(attempt))
+            attempt += 1
+
+
+_scheduler: Optional[LLMRequestScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> LLMRequestScheduler:
+    """Process-wide scheduler shared by every Streamlit session."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = LLMRequestScheduler()
+        return _scheduler
@@ -0,0 +1,353 @@
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import httpx # pyre-ignore[21]
+
+# --- Load Testing Harness ---
+# Finds the concurrency limits of the API (/user, /evaluate, /chat, /chat/sessions, ...) and of the
+# Streamlit evaluation path (repository lookups + IDCS_Engine.calculate_metrics, run
+# in-process on worker threads the way Streamlit script threads run it).
+#
+# Virtual users are added linearly over --ramp seconds up to --concurrency and each loops
+# over the weighted --mix until --duration ends. Results are written to loadtest_results/
+# so runs before and after a change can be compared:
+#
+#   python loadtest.py --spawn-server --mix evaluate=3,user=1,chat=1 --concurrency 64 --duration 60
+#   python loadtest.py --spawn-server --mix chat_session=1 --concurrency 32
+#   python loadtest.py --mix ui_evaluate=1 --concurrency 16 --label before-cache
+#   python loadtest.py --compare loadtest_results/a.json loadtest_results/b.json
+
+RESULTS_DIR = "loadtest_results"
+EMPLOYMENT_TYPES = ["Public Full-Time", "Private Contract", "Self-Employed/Jua Kali", "Unemployed", "SRC_Teacher"]
+INCOME_PATTERNS = ("stable", "volatile", "seasonal", "dipping")
+
+# --- 1. Synthetic profiles ---
+
+
+def make_history(rng: random.Random, months: int, pattern: str) -> List[Dict]:
+    base = rng.uniform(15000, 120000)
+    history = []
+    for m in range(months):
+        if pattern == "stable":
+            amount = base * rng.uniform(0.95, 1.05)
+        elif pattern == "volatile":
+            amount = base * rng.uniform(0.3, 1.7)
+        elif pattern == "seasonal":
+            amount = base * (1 + 0.4 * math.sin(2 * math.pi * m / 12)) * rng.uniform(0.9, 1.1)
+        else:
+            amount = base * (0.2 if rng.random() < 0.25 else rng.uniform(0.9, 1.1))
+        status = "Unpaid" if rng.random() < 0.1 else "Paid"
+        history.append({"amount": round(amount, 2), "status": status})
+    return history
+
+
+def make_profile(rng: random.Random, user_pool: int) -> Dict:
+    """Names are drawn from a fixed pool so runs mix first-time members with returning ones."""
+    history = make_history(rng, rng.randint(3, 24), rng.choice(INCOME_PATTERNS))
+    return {
+        "name": f"loadtest-member-{rng.randrange(user_pool)}",
+        "age": rng.randint(19, 65),
+        "employment_type": rng.choice(EMPLOYMENT_TYPES),
+        "current_income": round(history[-1]["amount"] * rng.uniform(0.5, 1.1), 2),
+        "income_history": history,
+        "premium": round(rng.uniform(300, 3000), 2),
+        "deferred_period": rng.choice([7, 14, 30, 60])
+    }
+
+
+# --- 2. Scenarios: async callables returning None or raising on failure ---
+
+
+def _check(response: httpx.Response):
+    if response.status_code >= 400:
+        raise RuntimeError(f"HTTP {response.status_code}")
+
+
+async def scenario_user(client, profile):
+    _check(await client.post("/user", json={k: profile[k] for k in ("name", "age", "employment_type")}))
+
+
+async def scenario_evaluate(client, profile):
+    _check(await client.post("/evaluate", json=profile))
+
+
+async def scenario_v2_evaluate(client, profile):
+    _check(await client.post("/v2/evaluate", json=profile))
+
+
+async def scenario_chat(client, profile):
+    _check(await client.post("/chat", json={
+        "system_prompt": f"User Profile: Employment Status: {profile['employment_type']}.",
+        "messages": [{"role": "user", "content": "Which income protection plan fits me?"}]
+    }))
+
+
+CHAT_SESSION_TURNS = 2
+
+
+def _forecast(profile) -> List[Dict]:
+    """A six-month forecast path like the dashboard uploads, centred on the profile's mean income."""
+    amounts = [h["amount"] for h in profile["income_history"]]
+    mu = sum(amounts) / len(amounts)
+    spread = max(amounts) - min(amounts)
+    return [{"ds": f"2026-{m:02d}-01", "yhat": mu, "yhat_lower": mu - spread / 2, "yhat_upper": mu + spread / 2}
+            for m in range(1, 7)]
+
+
+async def scenario_chat_session(client, profile):
+    """One widget conversation: create a session, stream CHAT_SESSION_TURNS replies, delete it."""
+    response = await client.post("/chat/sessions", json={
+        "forecast": _forecast(profile),
+        "context": f"Employment Status: {profile['employment_type']}. Current income: {profile['current_income']}."
+    })
+    _check(response)
+    session_id = response.json()["session_id"]
+    for turn in range(CHAT_SESSION_TURNS):
+        async with client.stream("POST", f"/chat/sessions/{session_id}/messages",
+                                 json={"content": f"Question {turn + 1}: which plan fits me?"}) as stream:
+            _check(stream)
+            done = False
+            async for line in stream.aiter_lines():
+                done = done or line == "event: done"
+            if not done:
+                raise RuntimeError("Reply stream ended without a done event")
+    _check(await client.delete(f"/chat/sessions/{session_id}"))
+
+
+def _ui_evaluate_sync(profile):
+    """Mirrors app.py's 'Evaluate Claim' block: DB upsert through repository, then scoring."""
+    import db_pool # pyre-ignore[21]
+    import repository # pyre-ignore[21]
+    from engine import IDCS_Engine # pyre-ignore[21]
+
+    with db_pool.transaction() as conn:
+        db_user = repository.find_user_by_name(conn, profile["name"])
+        if db_user is None:
+            user_id = repository.create_user(conn, profile["name"], profile["age"], profile["employment_type"])
+            repository.add_income_history(conn, user_id, profile["income_history"])
+        else:
+            user_id = db_user["id"]
+        repository.update_premium(conn, user_id, profile["premium"], profile["deferred_period"])
+
+    w_emp = 1.1 if profile["employment_type"] == "SRC_Teacher" else 1.0
+    IDCS_Engine().calculate_metrics(
+        income_history=profile["income_history"],
+        src_cap=50000.0,
+        current_income=profile["current_income"],
+        w_emp=w_emp
+    )
+
+
+async def scenario_ui_evaluate(_client, profile):
+    await asyncio.to_thread(_ui_evaluate_sync, profile)
+
+
+SCENARIOS = {
+    "user": scenario_user,
+    "evaluate": scenario_evaluate,
+    "v2_evaluate": scenario_v2_evaluate,
+    "chat": scenario_chat,
+    "chat_session": scenario_chat_session,
+    "ui_evaluate": scenario_ui_evaluate
+}
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f"Unknown scenario '{name}' (choose from {', '.join(SCENARIOS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+# --- 3. Runner ---
+
+
+def wait_until_up(base_url: str, timeout: float = 30.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(base_url + "/").status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"API at {base_url} did not come up within {timeout:.0f}s")
+
+
+async def run_load(base_url: str, mix: Dict[str, float], concurrency: int, ramp: float, duration: float,
+                   user_pool: int, seed: int, timeout: float) -> Dict:
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, Counter] = defaultdict(Counter)
+    per_second: Counter = Counter()
+    names, weights = list(mix), list(mix.values())
+    started = time.perf_counter()
+    deadline = started + duration
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        async def virtual_user(vu: int):
+            rng = random.Random(seed * 100003 + vu)
+            # Linear ramp: virtual user i starts at ramp * i / concurrency
+            await asyncio.sleep(ramp * vu / max(1, concurrency))
+            while time.perf_counter() < deadline:
+                name = rng.choices(names, weights)[0]
+                profile = make_profile(rng, user_pool)
+                t0 = time.perf_counter()
+                try:
+                    await SCENARIOS[name](client, profile)
+                except Exception as e:
+                    errors[name][f"{type(e).__name__}: {e}"[:120]] += 1
+                t1 = time.perf_counter()
+                latencies[name].append(t1 - t0)
+                per_second[int(t1 - started)] += 1
+
+        await asyncio.gather(*(virtual_user(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    return {"elapsed": elapsed, "scenarios": {name: summarize(latencies[name], errors[name], elapsed) for name in names},
+            "total": summarize([x for v in latencies.values() for x in v],
+                               sum(errors.values(), Counter()), elapsed),
+            "throughput_per_second": [per_second[s] for s in range(int(elapsed) + 1)]}
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def summarize(latencies: List[float], errors: Counter, elapsed: float) -> Dict:
+    values = sorted(latencies)
+    n = len(values)
+    failed = sum(errors.values())
+    return {
+        "requests": n,
+        "errors": failed,
+        "error_rate": failed / n if n else 0.0,
+        "rps": n / elapsed if elapsed else 0.0,
+        "p50_ms": _percentile(values, 0.50) * 1000,
+        "p90_ms": _percentile(values, 0.90) * 1000,
+        "p95_ms": _percentile(values, 0.95) * 1000,
+        "p99_ms": _percentile(values, 0.99) * 1000,
+        "max_ms": (values[-1] if values else 0.0) * 1000,
+        "error_kinds": dict(errors.most_common(5))
+    }
+
+
+# --- 4. Reporting ---
+
+COLUMNS = ("requests", "rps", "p50_ms", "p95_ms", "p99_ms", "max_ms", "error_rate")
+
+
+def print_report(result: Dict):
+    print(f"\n{'scenario':<14}" + "".join(f"{c:>12}" for c in COLUMNS))
+    rows = list(result["scenarios"].items()) + [("TOTAL", result["total"])]
+    for name, s in rows:
+        print(f"{name:<14}" + "".join(
+            f"{s[c]:>12.2%}" if c == "error_rate" else f"{s[c]:>12.1f}" if isinstance(s[c], float) else f"{s[c]:>12}"
+            for c in COLUMNS))
+        for kind, count in s["error_kinds"].items():
+            print(f"{'':<14}  {count} x {kind}")
+
+
+def compare(path_a: str, path_b: str):
+    with open(path_a) as f:
+        a = json.load(f)
+    with open(path_b) as f:
+        b = json.load(f)
+    print(f"A: {path_a} ({a['config'].get('label') or '-'})\nB: {path_b} ({b['config'].get('label') or '-'})")
+    print(f"\n{'scenario':<14}{'metric':<12}{'A':>12}{'B':>12}{'change':>10}")
+    for name in list(a["result"]["scenarios"]) + ["TOTAL"]:
+        sa = a["result"]["total"] if name == "TOTAL" else a["result"]["scenarios"].get(name)
+        sb = b["result"]["total"] if name == "TOTAL" else b["result"]["scenarios"].get(name)
+        if not sa or not sb:
+            continue
+        for metric in ("rps", "p50_ms", "p95_ms", "p99_ms", "error_rate"):
+            change = f"{(sb[metric] - sa[metric]) / sa[metric]:+.1%}" if sa[metric] else "n/a"
+            print(f"{name:<14}{metric:<12}{sa[metric]:>12.2f}{sb[metric]:>12.2f}{change:>10}")
+
+
+def save(result: Dict, config: Dict, out_dir: str) -> str:
+    os.makedirs(out_dir, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    label = f"-{config['label']}" if config.get("label") else ""
+    path = os.path.join(out_dir, f"{stamp}{label}.json")
+    with open(path, "w") as f:
+        json.dump({"config": config, "result": result}, f, indent=2)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the IDCS API and Streamlit evaluation path")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("evaluate=3,user=1,chat=1"),
+                        help=f"Weighted scenarios, e.g. evaluate=3,chat=1 (available: {', '.join(SCENARIOS)})")
+    parser.add_argument("--concurrency", type=int, default=32, help="Virtual users at full load")
+    parser.add_argument("--ramp", type=float, default=10.0, help="Seconds to reach full concurrency")
+    parser.add_argument("--duration", type=float, default=60.0, help="Total seconds, including the ramp")
+    parser.add_argument("--user-pool", type=int, default=5000, help="Distinct synthetic member names")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--label", default="", help="Tag stored with the results (e.g. before-cache)")
+    parser.add_argument("--out", default=RESULTS_DIR)
+    parser.add_argument("--spawn-server", action="store_true",
+                        help="Start uvicorn on a throwaway database instead of using --base-url's server")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers with --spawn-server")
+    parser.add_argument("--compare", nargs=2, metavar=("A.json", "B.json"), help="Compare two saved runs and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    config = {k: v for k, v in vars(args).items() if k not in ("compare", "out")}
+    server: Optional[subprocess.Popen] = None
+    tmp = None
+    if args.spawn_server:
+        tmp = tempfile.TemporaryDirectory()
+        # The in-process ui_evaluate scenario uses the same throwaway database
+        os.environ["IDCS_DB_PATH"] = os.path.join(tmp.name, "loadtest.db")
+        port = httpx.URL(args.base_url).port or 8000
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--workers", str(args.workers),
+             "--log-level", "warning"],
+            env=dict(os.environ)
+        )
+    try:
+        if any(name != "ui_evaluate" for name in args.mix):
+            wait_until_up(args.base_url, timeout=60.0)
+        if "ui_evaluate" in args.mix:
+            from database import init_db # pyre-ignore[21]
+            init_db()
+        print(f"Running {args.mix} at {args.concurrency} virtual users "
+              f"(ramp {args.ramp:.0f}s, duration {args.duration:.0f}s)...")
+        result = asyncio.run(run_load(args.base_url, args.mix, args.concurrency, args.ramp, args.duration,
+                                      args.user_pool, args.seed, args.timeout))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+        if tmp is not None:
+            tmp.cleanup()
+
+    print_report(result)
+    print(f"\nSaved {save(result, config, args.out)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,37 @@
-from fastapi import FastAPI, HTTPException, Depends
+import json
+import os
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Optional, Union
+from fastapi import FastAPI, HTTPException, Depends, Query
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from database import SessionLocal, User, IncomeHistory, init_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import SessionLocal, User, IncomeHistory, UserStats, init_db, engine as sync_engine
+from async_db import async_engine, get_async_db, read_transaction, write_transaction
+from forecast_jobs import ForecastJobQueue
 from engine import IDCS_Engine
+import db_pool
+import repository
+import metrics
+import tracing
+import profiling
 
-app = FastAPI(title="Income Dip Compensation System API")
+forecast_queue = ForecastJobQueue()
+
+@asynccontextmanager
+async def lifespan(_app):
+    # Prophet runs on the queue's process pool, never on request threads
+    forecast_queue.start()
+    metrics.start_exporter()
+    yield
+    forecast_queue.stop()
+
+app = FastAPI(title="Income Dip Compensation System API", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -15,6 +41,14 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Instrumentation wraps everything else, so timings cover CORS handling and streamed response bodies.
+# Profiling sits innermost of the three so its records carry the trace id set by TracingMiddleware.
+app.add_middleware(profiling.ProfilingMiddleware)
+app.add_middleware(metrics.PrometheusMiddleware)
+app.add_middleware(tracing.TracingMiddleware)
+metrics.instrument_sqlalchemy(sync_engine, "sync")
+metrics.instrument_sqlalchemy(async_engine.sync_engine, "async")
+
 # Initialize DB on startup
 init_db()
 
@@ -44,17 +78,117 @@ class EvaluationRequest(BaseModel):
     premium: float = 0.0
     deferred_period: int = 30
 
+class BatchEvaluationRequest(BaseModel):
+    # Items are validated one by one so a malformed member fails alone, not the whole batch
+    items: list[dict]
+
+MAX_BATCH_ITEMS = 10000
+
+class MonthlyIncome(BaseModel):
+    month: str  # YYYY-MM
+    amount: float
+
+class ForecastRequest(BaseModel):
+    history: list[MonthlyIncome]
+    mu: Optional[float] = None  # defaults to the mean monthly amount
+
 class ChatRequest(BaseModel):
     system_prompt: str
     messages: list
 
+class ChatSessionRequest(BaseModel):
+    forecast: Optional[Union[list, dict]] = None  # the dashboard's predicted income path
+    context: str = ""                              # claim / calibration summary shown on the page
+    user_id: Optional[int] = None                  # links the session to the profile that wipes it
+
+class ChatMessageRequest(BaseModel):
+    content: str
+
+# --- Response models ---
+# Declaring these lets FastAPI serialize straight to JSON bytes in pydantic-core instead of
+# jsonable_encoder + json.dumps. Responses are validated with from_attributes, so ORM users
+# and SQLAlchemy result rows are passed through as-is rather than copied into dicts.
+
+class UserSummary(BaseModel):
+    id: int
+    name: str
+    employment_type: Optional[str] = None
+    src_cap: Optional[float] = None
+
+class HistoryMonth(BaseModel):
+    # income_history columns are nullable; NULLs pass through as null like the untyped responses did
+    amount: Optional[float] = None
+    status: Optional[str] = None
+    month: Optional[int] = None
+
+class UserResponse(BaseModel):
+    user_id: int
+    name: str
+    history: list[HistoryMonth]
+    is_new: bool
+
+class Evaluation(BaseModel):
+    mu: float
+    sigma: float
+    stability_score: float
+    dip_detected: bool
+    eligible: bool
+    payout: float
+    paid_months: int
+    unpaid_months: int
+    dip_probability: float
+    risk_level: str
+    pattern_detected: bool
+    predicted_dip_month: Optional[str] = None
+    next_dip_idx: Optional[int] = None
+
+class EvaluationResponse(BaseModel):
+    user: UserSummary
+    evaluation: Evaluation
+    income_history: list[IncomeData]
+
+class BatchItemResult(BaseModel):
+    index: int
+    user: UserSummary
+    evaluation: Evaluation
+
+class BatchItemError(BaseModel):
+    index: int
+    error: list
+
+class BatchEvaluationResponse(BaseModel):
+    results: list[Union[BatchItemResult, BatchItemError]]
+    succeeded: int
+    failed: int
+
 engine = IDCS_Engine()
 
+def _history_query(user_id: int):
+    """Month rows labelled like HistoryMonth, so they serialize without building dicts or ORM objects."""
+    return (
+        select(IncomeHistory.income_amount.label("amount"), IncomeHistory.status,
+               IncomeHistory.month_index.label("month"))
+        .where(IncomeHistory.user_id == user_id)
+        .order_by(IncomeHistory.month_index)
+    )
+
+def _stored_history(rows):
+    """_history_query rows -> calculate_metrics input; NULL amounts count as 0, as in user_stats."""
+    return [{"amount": r.amount if r.amount is not None else 0.0, "status": r.status} for r in rows]
+
+def _stats_dict(stats):
+    """UserStats row -> dict for IDCS_Engine.metrics_from_stats"""
+    return {c: getattr(stats, c) for c in ("n", "mean", "m2", "dip_count", "paid_count", "unpaid_count")} if stats else None
+
 @app.get("/")
 def read_root():
     return {"status": "online", "message": "Welcome to the IDCS API"}
 
-@app.post("/user")
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    return Response(metrics.render_latest(), media_type=metrics.CONTENT_TYPE)
+
+@app.post("/user", response_model=UserResponse)
 def get_or_create_user(req: UserRequest, db: Session = Depends(get_db)):
     user = db.query(User).filter(User.name == req.name).first()
     is_new = False
@@ -72,80 +206,444 @@ def get_or_create_user(req: UserRequest, db: Session = Depends(get_db)):
         db.refresh(user)
         is_new = True
 
-    incomes = db.query(IncomeHistory).filter(IncomeHistory.user_id == user.id).order_by(IncomeHistory.month_index).all()
-    history = [{"amount": inc.income_amount, "status": inc.status, "month": inc.month_index} for inc in incomes]
-    
     return {
         "user_id": user.id,
         "name": user.name,
-        "history": history,
+        "history": db.execute(_history_query(user.id)).all(),
         "is_new": is_new
     }
 
-@app.post("/evaluate")
+@app.post("/evaluate", response_model=EvaluationResponse)
 def evaluate_claim(req: EvaluationRequest, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.name == req.name).first()
+    with tracing.span("evaluate.persist"):
+        user = db.query(User).filter(User.name == req.name).first()
     
-    # Auto-create user if not found
-    if not user:
-        user = User(
-            name=req.name,
-            age=req.age,
-            employment_type=req.employment_type,
-            src_tax_bracket="Bracket 3",
-            src_cap=50000.0
-        )
-        db.add(user)
+        # Auto-create user if not found
+        if not user:
+            user = User(
+                name=req.name,
+                age=req.age,
+                employment_type=req.employment_type,
+                src_tax_bracket="Bracket 3",
+                src_cap=50000.0
+            )
+            db.add(user)
+            db.commit()
+            db.refresh(user)
+        
+            # If new user and they provided history (from CSV), store it
+            if req.income_history:
+                for idx, inc in enumerate(req.income_history):
+                    db_inc = IncomeHistory(
+                        user_id=user.id,
+                        month_index=idx+1,
+                        income_amount=inc.amount,
+                        status=inc.status
+                    )
+                    db.add(db_inc)
+                db.commit()
+
+        # Update existing user profile with calculated premium and deferred period
+        user.premium = req.premium
+        user.deferred_period = req.deferred_period
         db.commit()
         db.refresh(user)
-        
-        # If new user and they provided history (from CSV), store it
-        if req.income_history:
-            for idx, inc in enumerate(req.income_history):
-                db_inc = IncomeHistory(
-                    user_id=user.id,
-                    month_index=idx+1,
-                    income_amount=inc.amount,
-                    status=inc.status
+
+
+    # Use exact history provided in st.session_state (CSV)
+    income_history_data = [
+        {"amount": inc.amount, "status": inc.status}
+        for inc in req.income_history
+    ]
+
+    w_emp = 1.1 if user.employment_type == "SRC_Teacher" else 1.0
+
+    if income_history_data:
+        result = engine.calculate_metrics(
+            income_history=income_history_data,
+            src_cap=user.src_cap,
+            current_income=req.current_income,
+            w_emp=w_emp
+        )
+    else:
+        # No history sent: evaluate against the stored, precomputed stats instead of rescanning rows,
+        # unless repeated dips need the month positions for pattern detection
+        stats = _stats_dict(db.get(UserStats, user.id))
+        if engine.needs_full_history(stats):
+            result = engine.calculate_metrics(
+                income_history=_stored_history(db.execute(_history_query(user.id)).all()),
+                src_cap=user.src_cap,
+                current_income=req.current_income,
+                w_emp=w_emp
+            )
+        else:
+            result = engine.metrics_from_stats(
+                stats=stats,
+                src_cap=user.src_cap,
+                current_income=req.current_income,
+                w_emp=w_emp
+            )
+
+    return {
+        "user": user,
+        "evaluation": result,
+        "income_history": req.income_history
+    }
+
+@app.post("/evaluate/batch", response_model=BatchEvaluationResponse)
+def evaluate_batch(req: BatchEvaluationRequest, db: Session = Depends(get_db)):
+    if len(req.items) > MAX_BATCH_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_ITEMS} items per batch")
+
+    results: list = [None] * len(req.items)
+    parsed = {}
+    for idx, item in enumerate(req.items):
+        try:
+            parsed[idx] = EvaluationRequest(**item)
+        except ValidationError as e:
+            results[idx] = {"index": idx, "error": e.errors(include_url=False, include_context=False)}
+
+    # 1. Resolve every member with one IN query (first match per name, like /evaluate)
+    names = list({r.name for r in parsed.values()})
+    users = {}
+    if names:
+        for user in db.query(User).filter(User.name.in_(names)).order_by(User.id):
+            users.setdefault(user.name, user)
+
+    # 2. Upsert: create unknown members (with their history), update premium/deferred period
+    new_users = []
+    for idx, r in parsed.items():
+        if r.name not in users:
+            user = User(name=r.name, age=r.age, employment_type=r.employment_type,
+                        src_tax_bracket="Bracket 3", src_cap=50000.0)
+            users[r.name] = user
+            new_users.append((user, r))
+    if new_users:
+        db.add_all([user for user, _ in new_users])
+        db.flush()
+        db.add_all([
+            IncomeHistory(user_id=user.id, month_index=m+1, income_amount=inc.amount, status=inc.status)
+            for user, r in new_users
+            for m, inc in enumerate(r.income_history)
+        ])
+    for r in parsed.values():
+        users[r.name].premium = r.premium
+        users[r.name].deferred_period = r.deferred_period
+    db.flush()
+
+    # 3. Score: members with history go through the vectorized engine, the rest use stored stats
+    with_history = [idx for idx, r in parsed.items() if r.income_history]
+    without_history = [idx for idx, r in parsed.items() if not r.income_history]
+
+    def w_emp(user):
+        return 1.1 if user.employment_type == "SRC_Teacher" else 1.0
+
+    evaluations = dict(zip(with_history, engine.calculate_metrics_batch(
+        income_histories=[[{"amount": inc.amount, "status": inc.status} for inc in parsed[idx].income_history]
+                          for idx in with_history],
+        src_caps=[users[parsed[idx].name].src_cap for idx in with_history],
+        current_incomes=[parsed[idx].current_income for idx in with_history],
+        w_emps=[w_emp(users[parsed[idx].name]) for idx in with_history]
+    )))
+    if without_history:
+        ids = list({users[parsed[idx].name].id for idx in without_history})
+        stats = {s.user_id: s for s in db.query(UserStats).filter(UserStats.user_id.in_(ids))}
+        for idx in without_history:
+            user = users[parsed[idx].name]
+            user_stats = _stats_dict(stats.get(user.id))
+            if engine.needs_full_history(user_stats):
+                evaluations[idx] = engine.calculate_metrics(
+                    income_history=_stored_history(db.execute(_history_query(user.id)).all()),
+                    src_cap=user.src_cap,
+                    current_income=parsed[idx].current_income,
+                    w_emp=w_emp(user)
+                )
+            else:
+                evaluations[idx] = engine.metrics_from_stats(
+                    stats=user_stats,
+                    src_cap=user.src_cap,
+                    current_income=parsed[idx].current_income,
+                    w_emp=w_emp(user)
                 )
-                db.add(db_inc)
-            db.commit()
 
-    # Update existing user profile with calculated premium and deferred period
-    user.premium = req.premium
-    user.deferred_period = req.deferred_period
+    for idx, r in parsed.items():
+        user = users[r.name]
+        results[idx] = {
+            "index": idx,
+            "user": {
+                "id": user.id,
+                "name": user.name,
+                "employment_type": user.employment_type,
+                "src_cap": user.src_cap
+            },
+            "evaluation": evaluations[idx]
+        }
+
+    # Single commit for the whole batch (results are built first: commit expires the ORM objects)
     db.commit()
-    db.refresh(user)
 
+    return {
+        "results": results,
+        "succeeded": len(parsed),
+        "failed": len(req.items) - len(parsed)
+    }
 
-    # Use exact history provided in st.session_state (CSV)
+def _portfolio_chunks(cursor: int, chunk_size: int, current_income: Optional[float]):
+    """
+    Scores the book in id order, one chunk of users at a time (keyset pagination, so memory
+    stays bounded by chunk_size). Each line carries the user id as `cursor`; a client that
+    disconnects resumes with ?cursor=<last cursor received>.
+    """
+    db = SessionLocal()
+    scored = 0
+    try:
+        while True:
+            users = db.execute(
+                select(User.id, User.name, User.employment_type, User.src_cap)
+                .where(User.id > cursor).order_by(User.id).limit(chunk_size)
+            ).all()
+            if not users:
+                break
+
+            histories = {u.id: [] for u in users}
+            with tracing.span("portfolio.load_histories", users=len(users)):
+                for user_id, amount, status in db.execute(
+                    select(IncomeHistory.user_id, IncomeHistory.income_amount, IncomeHistory.status)
+                    .where(IncomeHistory.user_id.in_(list(histories)))
+                    .order_by(IncomeHistory.user_id, IncomeHistory.month_index)
+                ):
+                    histories[user_id].append({"amount": amount, "status": status})
+
+            # Without an explicit current income, the latest recorded month stands in for it
+            evaluations = engine.calculate_metrics_batch(
+                income_histories=[histories[u.id] for u in users],
+                src_caps=[u.src_cap if u.src_cap is not None else 50000.0 for u in users],
+                current_incomes=[
+                    current_income if current_income is not None
+                    else (histories[u.id][-1]["amount"] if histories[u.id] else 0.0)
+                    for u in users
+                ],
+                w_emps=[1.1 if u.employment_type == "SRC_Teacher" else 1.0 for u in users]
+            )
+            db.rollback()  # end the read transaction between chunks so writers are never starved
+
+            lines = [
+                json.dumps({"cursor": u.id, "user_id": u.id, "name": u.name, "evaluation": ev})
+                for u, ev in zip(users, evaluations)
+            ]
+            yield "\n".join(lines) + "\n"
+            cursor = users[-1].id
+            scored += len(users)
+    finally:
+        db.close()
+
+    yield json.dumps({"done": True, "cursor": cursor, "count": scored}) + "\n"
+
+@app.get("/portfolio/evaluate/stream")
+def stream_portfolio_evaluation(
+    cursor: int = Query(0, ge=0, description="Resume after this user id"),
+    chunk_size: int = Query(500, ge=1, le=5000),
+    current_income: Optional[float] = Query(None, description="Evaluate every member against this income")
+):
+    return StreamingResponse(
+        _portfolio_chunks(cursor, chunk_size, current_income),
+        media_type="application/x-ndjson"
+    )
+
+# --- Async (v2) endpoints: same contracts as /user and /evaluate, one transaction per request ---
+
+@app.post("/v2/user", response_model=UserResponse)
+async def get_or_create_user_async(req: UserRequest, db: AsyncSession = Depends(get_async_db)):
+    is_new = False
+    # Existing users are a plain read; only the create path takes the write lock
+    async with read_transaction(db):
+        user = (await db.execute(select(User).where(User.name == req.name).limit(1))).scalar_one_or_none()
+        if user:
+            rows = (await db.execute(_history_query(user.id))).all()
+
+    if not user:
+        async with write_transaction(db):
+            # Re-check under the lock: a concurrent request may have created it
+            user = (await db.execute(select(User).where(User.name == req.name).limit(1))).scalar_one_or_none()
+            if not user:
+                user = User(
+                    name=req.name,
+                    age=req.age,
+                    employment_type=req.employment_type,
+                    src_tax_bracket="Bracket 3",
+                    src_cap=50000.0
+                )
+                db.add(user)
+                await db.flush()
+                is_new = True
+
+            rows = (await db.execute(_history_query(user.id))).all()
+
+    return {
+        "user_id": user.id,
+        "name": user.name,
+        "history": rows,
+        "is_new": is_new
+    }
+
+@app.post("/v2/evaluate", response_model=EvaluationResponse)
+async def evaluate_claim_async(req: EvaluationRequest, db: AsyncSession = Depends(get_async_db)):
     income_history_data = [
         {"amount": inc.amount, "status": inc.status}
         for inc in req.income_history
     ]
 
+    # User creation, history and premium update are committed together
+    with tracing.span("evaluate.persist"):
+        async with write_transaction(db):
+            user = (await db.execute(select(User).where(User.name == req.name).limit(1))).scalar_one_or_none()
+            if not user:
+                user = User(
+                    name=req.name,
+                    age=req.age,
+                    employment_type=req.employment_type,
+                    src_tax_bracket="Bracket 3",
+                    src_cap=50000.0
+                )
+                db.add(user)
+                await db.flush()
+                db.add_all([
+                    IncomeHistory(user_id=user.id, month_index=idx+1, income_amount=inc.amount, status=inc.status)
+                    for idx, inc in enumerate(req.income_history)
+                ])
+
+            user.premium = req.premium
+            user.deferred_period = req.deferred_period
+
+            stats = None
+            stored_history = None
+            if not income_history_data:
+                stats = _stats_dict(await db.get(UserStats, user.id))
+                if engine.needs_full_history(stats):
+                    stored_history = _stored_history((await db.execute(_history_query(user.id))).all())
+
     w_emp = 1.1 if user.employment_type == "SRC_Teacher" else 1.0
 
-    result = engine.calculate_metrics(
-        income_history=income_history_data,
-        src_cap=user.src_cap,
-        current_income=req.current_income,
-        w_emp=w_emp
-    )
+    if income_history_data or stored_history:
+        result = engine.calculate_metrics(
+            income_history=income_history_data or stored_history,
+            src_cap=user.src_cap,
+            current_income=req.current_income,
+            w_emp=w_emp
+        )
+    else:
+        result = engine.metrics_from_stats(
+            stats=stats,
+            src_cap=user.src_cap,
+            current_income=req.current_income,
+            w_emp=w_emp
+        )
 
     return {
-        "user": {
-            "id": user.id,
-            "name": user.name,
-            "employment_type": user.employment_type,
-            "src_cap": user.src_cap
-        },
+        "user": user,
         "evaluation": result,
-        "income_history": income_history_data
+        "income_history": req.income_history
     }
 
+@app.post("/forecast", status_code=202)
+def enqueue_forecast(req: ForecastRequest):
+    if not req.history:
+        raise HTTPException(status_code=422, detail="history must contain at least one month")
+    job_id = forecast_queue.enqueue([m.model_dump() for m in req.history], req.mu)
+    job = forecast_queue.get(job_id)
+    return {"job_id": job_id, "status": job["status"]}
+
+@app.get("/forecast/{job_id}")
+def get_forecast(job_id: int):
+    job = forecast_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown forecast job")
+    return job
+
+LOCAL_BROKER_REPLY = "Jambo! I am the IDCS Smart Broker responding locally. Based on your inputs and M-Pesa data, I recommend Britam Family Income Protection with an 88% match because your history indicates high volatility that this plan specifically covers with inflation-adjusted monthly payouts.\\n\\n[Analyze Income] -> [Identify Risk Category] -> [Match Scheme]"
+
 @app.post("/chat")
 def chat_endpoint(req: ChatRequest):
-    return {
-        "content": "Jambo! I am the IDCS Smart Broker responding locally. Based on your inputs and M-Pesa data, I recommend Britam Family Income Protection with an 88% match because your history indicates high volatility that this plan specifically covers with inflation-adjusted monthly payouts.\\n\\n[Analyze Income] -> [Identify Risk Category] -> [Match Scheme]"
-    }
+    return {"content": LOCAL_BROKER_REPLY}
+
+# --- Chat sessions: context is uploaded once, messages carry only the session id ---
+# Sessions hold personal data (profile summary, forecast), so they live in idcs.db next to the
+# user's other records: every uvicorn worker sees them and "Wipe My Profile" deletes them with
+# the user. Each turn is its own row appended in a write transaction, so concurrent messages to
+# one session can't drop each other's turns. Each message refreshes the TTL.
+
+CHAT_SESSION_TTL_SECS = float(os.environ.get("IDCS_CHAT_SESSION_TTL_SECS", str(2 * 3600)))
+CHAT_HISTORY_TURNS = 20  # most recent messages kept with the session
+
+def _chat_session(session_id: str) -> dict:
+    with db_pool.connection() as conn:
+        session = repository.get_chat_session(conn, session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired chat session")
+    return session
+
+def _forecast_insight(forecast) -> str:
+    """The deepest dip in the session's forecast: the month whose lower bound falls furthest below the mean path."""
+    try:
+        rows = [(str(r["ds"])[:7], float(r["yhat"]), float(r["yhat_lower"])) for r in forecast]
+        baseline = sum(yhat for _, yhat, _ in rows) / len(rows)
+        month, _, lower = min(rows, key=lambda r: r[2])
+    except (TypeError, KeyError, ValueError, ZeroDivisionError):
+        return ""
+    drop = 100 * (1 - lower / baseline) if baseline > 0 else 0.0
+    if drop <= 0:
+        return "I've analyzed your patterns. Your forecast shows no month falling below its expected path. "
+    label = datetime.strptime(month, "%Y-%m").strftime("%B %Y") if len(month) == 7 else month
+    return f"I've analyzed your patterns. Your income could dip up to {drop:.0f}% below its expected level in {label}. "
+
+def _reply_chunks(session: dict) -> list:
+    """The local broker's reply for this session's forecast, split into the word-sized pieces a model would stream."""
+    forecast = json.loads(session["forecast"]) if session["forecast"] else None
+    words = (_forecast_insight(forecast) + LOCAL_BROKER_REPLY).split(" ")
+    return [word + " " for word in words[:-1]] + words[-1:]
+
+def _sse(data: dict, event: Optional[str] = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+def _stream_reply(session_id: str, session: dict):
+    # Spans can't stay open across yields (each chunk runs in its own context), so only the save is traced
+    reply = []
+    for chunk in _reply_chunks(session):
+        reply.append(chunk)
+        yield _sse({"delta": chunk})
+
+    with tracing.span("chat.save_session"), db_pool.write_transaction() as conn:
+        turns = repository.add_chat_message(conn, session_id, "assistant", "".join(reply),
+                                            CHAT_SESSION_TTL_SECS, CHAT_HISTORY_TURNS)
+    yield _sse({"session_id": session_id, "turns": turns or 0}, event="done")
+
+@app.post("/chat/sessions", status_code=201)
+def create_chat_session(req: ChatSessionRequest):
+    session_id = uuid.uuid4().hex
+    with db_pool.write_transaction() as conn:
+        repository.create_chat_session(conn, session_id, req.user_id,
+                                       json.dumps(req.forecast) if req.forecast is not None else None,
+                                       req.context, CHAT_SESSION_TTL_SECS)
+    return {"session_id": session_id, "expires_in": CHAT_SESSION_TTL_SECS}
+
+@app.post("/chat/sessions/{session_id}/messages")
+def send_chat_message(session_id: str, req: ChatMessageRequest):
+    """Streams the reply as server-sent events: `data: {"delta": ...}` chunks, then `event: done`."""
+    with db_pool.write_transaction() as conn:
+        turns = repository.add_chat_message(conn, session_id, "user", req.content,
+                                            CHAT_SESSION_TTL_SECS, CHAT_HISTORY_TURNS)
+    if turns is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired chat session")
+    session = _chat_session(session_id)
+    return StreamingResponse(
+        _stream_reply(session_id, session),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.delete("/chat/sessions/{session_id}", status_code=204)
+def delete_chat_session(session_id: str):
+    with db_pool.write_transaction() as conn:
+        repository.delete_chat_session(conn, session_id)
+    return Response(status_code=204)
@@ -0,0 +1,304 @@
+import functools
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# --- Prometheus Instrumentation ---
+# Minimal in-process metrics with the Prometheus text exposition format, served by
+# main.py at /metrics. No client library needed: each metric is a dict of label tuples
+# guarded by one lock, so an observation costs a perf_counter, a bisect and a few adds.
+#
+# Values live in the process that records them. Under `uvicorn --workers N` a scrape lands on
+# one worker, so with IDCS_METRICS_DIR set (supervisor.py sets it for N > 1) every worker
+# writes a snapshot there every FLUSH_SECS and /metrics serves the sum over live workers.
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+DB_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+METRICS_DIR = os.environ.get("IDCS_METRICS_DIR", "")
+FLUSH_SECS = 5.0
+
+_registry: List["_Metric"] = []
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def samples(self, values: Optional[Dict] = None) -> Iterable[str]:
+        raise NotImplementedError
+
+    def snapshot(self) -> Dict:
+        """labels -> value copy, safe to read without the lock."""
+        raise NotImplementedError
+
+    @staticmethod
+    def merge(total, value):
+        return total + value
+
+    def render(self, values: Optional[Dict] = None) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples(values))
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def get(self, *labels: str) -> float:
+        return self._values.get(labels, 0.0)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+    def samples(self, values=None):
+        if values is None:
+            values = self.snapshot()
+        return [f"{self.name}{_labels(self.labelnames, k)} {v}" for k, v in values.items()]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1.0):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels: str, value: float):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts (+Inf last), sum, count]
+        self._values: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, *labels: str):
+        idx = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][idx] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def time(self, *labels: str):
+        return _Timer(self, labels)
+
+    def snapshot(self):
+        with self._lock:
+            return {k: [list(v[0]), v[1], v[2]] for k, v in self._values.items()}
+
+    @staticmethod
+    def merge(total, value):
+        return [[a + b for a, b in zip(total[0], value[0])], total[1] + value[1], total[2] + value[2]]
+
+    def samples(self, values=None):
+        if values is None:
+            values = self.snapshot()
+        out = []
+        for labels, (counts, total, count) in values.items():
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound!r}"'
+                out.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            out.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {total}")
+            out.append(f"{self.name}_count{_labels(self.labelnames, labels)} {count}")
+        return out
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram: Histogram, labels: Tuple):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+
+
+def render_latest() -> str:
+    if not METRICS_DIR:
+        return "\n".join(m.render() for m in _registry) + "\n"
+    flush()
+    totals: Dict[str, Dict] = {m.name: {} for m in _registry}
+    by_name = {m.name: m for m in _registry}
+    for snapshot in _read_snapshots():
+        for name, rows in snapshot.items():
+            metric = by_name.get(name)
+            if metric is None:
+                continue
+            merged = totals[name]
+            for labels, value in rows:
+                key = tuple(labels)
+                merged[key] = metric.merge(merged[key], value) if key in merged else value
+    return "\n".join(m.render(totals[m.name]) for m in _registry) + "\n"
+
+
+# --- Cross-worker aggregation (IDCS_METRICS_DIR) ---
+
+def flush():
+    """Writes this process's values to METRICS_DIR/<pid>.json (atomically)."""
+    snapshot = {m.name: [[list(k), v] for k, v in m.snapshot().items()] for m in _registry}
+    path = os.path.join(METRICS_DIR, f"{os.getpid()}.json")
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(snapshot, f)
+    os.replace(tmp, path)
+
+
+def _read_snapshots() -> Iterable[Dict]:
+    for entry in os.scandir(METRICS_DIR):
+        if not entry.name.endswith(".json"):
+            continue
+        pid = int(entry.name[:-5]) if entry.name[:-5].isdigit() else None
+        if pid is not None and pid != os.getpid():
+            try:
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                # Worker is gone (restarted); its counters go with it, as they would in-process
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    pass
+                continue
+            except PermissionError:
+                pass
+        try:
+            with open(entry.path, encoding="utf-8") as f:
+                yield json.load(f)
+        except (OSError, ValueError):
+            continue
+
+
+def start_exporter():
+    """Starts this worker's snapshot thread when IDCS_METRICS_DIR is set (API processes only)."""
+    if not METRICS_DIR:
+        return
+    os.makedirs(METRICS_DIR, exist_ok=True)
+
+    def loop():
+        while True:
+            try:
+                flush()
+            except OSError:
+                pass
+            time.sleep(FLUSH_SECS)
+
+    threading.Thread(target=loop, name="idcs-metrics-export", daemon=True).start()
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# --- Application metrics ---
+
+HTTP_LATENCY = Histogram("idcs_http_request_duration_seconds", "API request latency by route", ("method", "route", "status"))
+HTTP_IN_FLIGHT = Gauge("idcs_http_requests_in_flight", "API requests currently being served", ("method",))
+DB_LATENCY = Histogram("idcs_db_query_duration_seconds", "Database statement latency", ("engine", "operation"), buckets=DB_BUCKETS)
+ENGINE_LATENCY = Histogram("idcs_engine_duration_seconds", "IDCS_Engine function latency", ("function",))
+CACHE_REQUESTS = Counter("idcs_cache_requests_total", "Cache / de-duplication lookups", ("cache", "result"))
+
+
+def timed(function_name: str) -> Callable:
+    """Decorator recording the wrapped function's latency in ENGINE_LATENCY."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                ENGINE_LATENCY.observe(time.perf_counter() - start, function_name)
+        return wrapper
+    return decorator
+
+
+def record_cache(cache: str, hit: bool):
+    CACHE_REQUESTS.inc(cache, "hit" if hit else "miss")
+
+
+def instrument_sqlalchemy(sa_engine, engine_label: str):
+    """Times every statement on a (sync) SQLAlchemy engine; pass async_engine.sync_engine for async."""
+    from sqlalchemy import event
+
+    @event.listens_for(sa_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("_idcs_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(sa_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("_idcs_query_start")
+        if starts:
+            operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+            DB_LATENCY.observe(time.perf_counter() - starts.pop(), engine_label, operation)
+
+
+class PrometheusMiddleware:
+    """Pure ASGI middleware: per-route latency histogram and in-flight gauge."""
+
+    def __init__(self, app, skip_paths: Sequence[str] = ("/metrics",)):
+        self.app = app
+        self.skip_paths = set(skip_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.skip_paths:
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        # The route template is only known after routing, so in-flight requests are counted per method
+        HTTP_IN_FLIGHT.inc(scope["method"])
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_FLIGHT.dec(scope["method"])
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            HTTP_LATENCY.observe(time.perf_counter() - start, scope["method"], path, str(status["code"]))
@@ -0,0 +1,222 @@
+import sqlite3
+
+# --- Schema Migrations ---
+# SQLAlchemy's create_all only creates missing tables; it never alters an existing idcs.db.
+# Each migration below runs once, tracked with SQLite's PRAGMA user_version.
+# Index names match the ones declared on the models so fresh and migrated DBs are identical.
+
+# Recomputes user_stats from scratch (backfill, and after loads that bypass the trigger)
+_RECOMPUTE_USER_STATS = """
+INSERT OR REPLACE INTO user_stats (user_id, n, total, sum_sq, mean, m2, dip_count, paid_count, unpaid_count)
+SELECT a.user_id, a.n, a.total, a.sum_sq, a.mean,
+       MAX(0.0, a.sum_sq - a.n * a.mean * a.mean),
+       (SELECT COUNT(*) FROM income_history h
+        WHERE h.user_id = a.user_id AND COALESCE(h.income_amount, 0) < 0.8 * a.mean),
+       a.paid_count, a.unpaid_count
+FROM (
+    SELECT user_id, COUNT(*) AS n, SUM(COALESCE(income_amount, 0)) AS total,
+           SUM(COALESCE(income_amount, 0) * COALESCE(income_amount, 0)) AS sum_sq,
+           AVG(COALESCE(income_amount, 0)) AS mean,
+           COALESCE(SUM(status = 'Paid'), 0) AS paid_count, COALESCE(SUM(status = 'Unpaid'), 0) AS unpaid_count
+    FROM income_history WHERE {where} GROUP BY user_id
+) a
+"""
+REBUILD_USER_STATS = _RECOMPUTE_USER_STATS.format(where="user_id IS NOT NULL")
+
+INDEX_USERS_NAME = "CREATE INDEX IF NOT EXISTS ix_users_name ON users (name)"
+INDEX_INCOME_USER_MONTH = "CREATE INDEX IF NOT EXISTS ix_income_history_user_month ON income_history (user_id, month_index)"
+# One row per member-month since version 6, so re-imports upsert instead of duplicating
+UNIQUE_INCOME_USER_MONTH = "CREATE UNIQUE INDEX IF NOT EXISTS ix_income_history_user_month ON income_history (user_id, month_index)"
+
+# Welford update in the same transaction as every income_history insert,
+# whichever path (app.py, API, bulk import) performs it.
+# In an UPDATE, column references are pre-update values, so `mean` below is the old mean.
+# `status = 'Paid'` is NULL for a NULL status, hence the COALESCEs on the NOT NULL counters.
+STATS_TRIGGER = """CREATE TRIGGER IF NOT EXISTS trg_income_history_stats AFTER INSERT ON income_history
+    BEGIN
+        INSERT INTO user_stats (user_id, n, total, sum_sq, mean, m2, dip_count, paid_count, unpaid_count)
+        VALUES (NEW.user_id, 1, COALESCE(NEW.income_amount, 0), COALESCE(NEW.income_amount, 0) * COALESCE(NEW.income_amount, 0),
+                COALESCE(NEW.income_amount, 0), 0.0, 0, COALESCE(NEW.status = 'Paid', 0), COALESCE(NEW.status = 'Unpaid', 0))
+        ON CONFLICT(user_id) DO UPDATE SET
+            n = n + 1,
+            total = total + excluded.total,
+            sum_sq = sum_sq + excluded.sum_sq,
+            mean = mean + (excluded.mean - mean) / (n + 1),
+            m2 = m2 + (excluded.mean - mean) * (excluded.mean - (mean + (excluded.mean - mean) / (n + 1))),
+            paid_count = COALESCE(paid_count, 0) + COALESCE(excluded.paid_count, 0),
+            unpaid_count = COALESCE(unpaid_count, 0) + COALESCE(excluded.unpaid_count, 0);
+        -- Dips are relative to the moving mean (< 0.8 * mu), so they are recounted over
+        -- this user's rows only (ix_income_history_user_month prefix), never the table.
+        UPDATE user_stats SET dip_count = (
+            SELECT COUNT(*) FROM income_history
+            WHERE user_id = NEW.user_id AND COALESCE(income_amount, 0) < 0.8 * user_stats.mean
+        ) WHERE user_id = NEW.user_id;
+    END"""
+
+# A changed month (e.g. an import upsert) can't be folded into the running sums, so the
+# user's row is recomputed from their months alone (ix_income_history_user_month prefix).
+# DELETE first: an outer statement's conflict policy overrides the inner OR REPLACE.
+STATS_UPDATE_TRIGGER = """CREATE TRIGGER IF NOT EXISTS trg_income_history_stats_update
+    AFTER UPDATE OF income_amount, status ON income_history
+    WHEN NEW.income_amount IS NOT OLD.income_amount OR NEW.status IS NOT OLD.status
+    BEGIN
+        DELETE FROM user_stats WHERE user_id = NEW.user_id;""" + _RECOMPUTE_USER_STATS.format(where="user_id = NEW.user_id") + """;
+    END"""
+
+# Objects a bulk load may drop and rebuild once at the end (see import_portfolio.py).
+# The unique (user_id, month_index) index stays: it is the importer's ON CONFLICT target.
+BULK_LOAD_OBJECTS = [
+    ("index", "ix_users_name", INDEX_USERS_NAME),
+    ("trigger", "trg_income_history_stats", STATS_TRIGGER),
+    ("trigger", "trg_income_history_stats_update", STATS_UPDATE_TRIGGER),
+]
+
+MIGRATIONS = [
+    (1, "user lookup indexes", [
+        # users.email is already covered by the UNIQUE constraint's autoindex
+        INDEX_USERS_NAME,
+        INDEX_INCOME_USER_MONTH,
+    ]),
+    (2, "raw transactions table", [
+        """CREATE TABLE IF NOT EXISTS transactions (
+            id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            date VARCHAR NOT NULL,
+            amount FLOAT NOT NULL,
+            description VARCHAR,
+            PRIMARY KEY (id),
+            FOREIGN KEY(user_id) REFERENCES users (id)
+        )""",
+        # Covering index: range scans and monthly sums never touch the table itself
+        "CREATE INDEX IF NOT EXISTS ix_transactions_user_date ON transactions (user_id, date, amount)",
+    ]),
+    (3, "materialized user stats", [
+        """CREATE TABLE IF NOT EXISTS user_stats (
+            user_id INTEGER NOT NULL,
+            n INTEGER NOT NULL,
+            total FLOAT NOT NULL,
+            sum_sq FLOAT NOT NULL,
+            mean FLOAT NOT NULL,
+            m2 FLOAT NOT NULL,
+            dip_count INTEGER NOT NULL,
+            paid_count INTEGER NOT NULL,
+            unpaid_count INTEGER NOT NULL,
+            PRIMARY KEY (user_id),
+            FOREIGN KEY(user_id) REFERENCES users (id)
+        )""",
+        STATS_TRIGGER,
+        REBUILD_USER_STATS,
+    ]),
+    (4, "forecast job queue", [
+        """CREATE TABLE IF NOT EXISTS forecast_jobs (
+            id INTEGER NOT NULL,
+            job_key VARCHAR NOT NULL,
+            status VARCHAR NOT NULL,
+            payload TEXT NOT NULL,
+            result TEXT,
+            error TEXT,
+            owner VARCHAR,
+            attempts INTEGER NOT NULL,
+            created_at FLOAT NOT NULL,
+            claimed_at FLOAT,
+            updated_at FLOAT NOT NULL,
+            PRIMARY KEY (id)
+        )""",
+        "CREATE INDEX IF NOT EXISTS ix_forecast_jobs_key_status ON forecast_jobs (job_key, status)",
+        "CREATE INDEX IF NOT EXISTS ix_forecast_jobs_status ON forecast_jobs (status, id)",
+    ]),
+    (5, "NULL-safe user stats trigger", [
+        # Version 3's trigger failed every insert with a NULL status (NOT NULL paid_count)
+        "DROP TRIGGER IF EXISTS trg_income_history_stats",
+        STATS_TRIGGER,
+        "DELETE FROM user_stats",
+        REBUILD_USER_STATS,
+    ]),
+    (6, "one income row per member-month", [
+        # Earlier re-imports appended duplicate months; the most recently written row wins
+        """DELETE FROM income_history
+           WHERE user_id IS NOT NULL AND month_index IS NOT NULL AND id NOT IN (
+               SELECT MAX(id) FROM income_history
+               WHERE user_id IS NOT NULL AND month_index IS NOT NULL
+               GROUP BY user_id, month_index)""",
+        "DROP INDEX IF EXISTS ix_income_history_user_month",
+        UNIQUE_INCOME_USER_MONTH,
+        STATS_UPDATE_TRIGGER,
+        "DELETE FROM user_stats",
+        REBUILD_USER_STATS,
+    ]),
+    (7, "chat sessions", [
+        # Personal context for the chat widget lives with the rest of the user's records, so the
+        # profile wipe deletes it, rather than in the shared (unencrypted) result cache
+        """CREATE TABLE IF NOT EXISTS chat_sessions (
+            id VARCHAR NOT NULL,
+            user_id INTEGER,
+            forecast TEXT,
+            context TEXT,
+            created_at FLOAT NOT NULL,
+            expires_at FLOAT NOT NULL,
+            PRIMARY KEY (id),
+            FOREIGN KEY(user_id) REFERENCES users (id)
+        )""",
+        "CREATE INDEX IF NOT EXISTS ix_chat_sessions_user ON chat_sessions (user_id)",
+        "CREATE INDEX IF NOT EXISTS ix_chat_sessions_expires ON chat_sessions (expires_at)",
+        """CREATE TABLE IF NOT EXISTS chat_messages (
+            id INTEGER NOT NULL,
+            session_id VARCHAR NOT NULL,
+            role VARCHAR NOT NULL,
+            content TEXT NOT NULL,
+            created_at FLOAT NOT NULL,
+            PRIMARY KEY (id),
+            FOREIGN KEY(session_id) REFERENCES chat_sessions (id)
+        )""",
+        "CREATE INDEX IF NOT EXISTS ix_chat_messages_session ON chat_messages (session_id, id)",
+    ]),
+]
+
+
+def rebuild_user_stats(conn: sqlite3.Connection):
+    conn.execute("DELETE FROM user_stats")
+    conn.execute(REBUILD_USER_STATS)
+
+
+def drop_bulk_load_objects(conn: sqlite3.Connection):
+    for kind, name, _ in BULK_LOAD_OBJECTS:
+        conn.execute(f"DROP {kind.upper()} IF EXISTS {name}")
+
+
+def restore_bulk_load_objects(conn: sqlite3.Connection):
+    """Recreates dropped indexes/trigger and recomputes the stats the trigger would have kept."""
+    for _, _, sql in BULK_LOAD_OBJECTS:
+        conn.execute(sql)
+    rebuild_user_stats(conn)
+
+
+def current_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """Applies pending migrations in order. Returns the resulting schema version."""
+    if conn.in_transaction:
+        conn.commit()
+    version = current_version(conn)
+    for target, description, statements in MIGRATIONS:
+        if target <= version:
+            continue
+        try:
+            conn.execute("BEGIN")
+            for sql in statements:
+                conn.execute(sql)
+            # PRAGMA cannot be parameterized; target is an int from MIGRATIONS
+            conn.execute(f"PRAGMA user_version = {int(target)}")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        version = target
+    return version
+
+
+if __name__ == "__main__":
+    with sqlite3.connect("idcs.db", isolation_level=None) as conn:
+        print(f"Schema at version {migrate(conn)}.")
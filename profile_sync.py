@@ -0,0 +1,134 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional
+
+import pandas as pd # pyre-ignore[21]
+
+import db_pool # pyre-ignore[21]
+import repository # pyre-ignore[21]
+import tracing # pyre-ignore[21]
+
+# --- Background Profile Prefetch ---
+# The sidebar starts loading a profile as soon as a Full Name is entered, on a small worker
+# pool, so "Refresh Data" usually finds the user, income history and statement transactions
+# already in memory. Each load publishes a progress event as each stage really completes:
+#
+#   {"step": "connected"}                          pooled connection checked out
+#   {"step": "profile", "found": bool}             users lookup finished
+#   {"step": "datasets", "history": n, "transactions": n}
+#   {"step": "error", "message": "..."}
+#
+# The prefetch is read-only: creating a missing user stays with the explicit sync. Results are
+# kept for PREFETCH_TTL_SECS and dropped with invalidate(name) whenever the app writes that
+# user's history, transactions or profile. The explicit Refresh asks for fresh=True, which only
+# joins a load that is still running and never serves a finished one (other processes, e.g.
+# the API, may have written since). A fetch is shared by every session that asks for the
+# name, so callers copy fetch.transactions before keeping it.
+
+MAX_WORKERS = int(os.environ.get("IDCS_PROFILE_SYNC_WORKERS", "2"))
+PREFETCH_TTL_SECS = float(os.environ.get("IDCS_PROFILE_PREFETCH_TTL_SECS", "60"))
+MAX_PREFETCHES = 256
+
+
+class ProfileFetch:
+    """One background load of a user's profile; events() replays and then follows its progress."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.created_at = time.monotonic()
+        self.user: Optional[Dict] = None
+        self.history: List[Dict] = []
+        self.transactions: Optional[pd.DataFrame] = None
+        self.error: Optional[str] = None
+        self.done = False
+        self._events: List[Dict] = []
+        self._cond = threading.Condition()
+
+    def publish(self, step: str, **data):
+        with self._cond:
+            self._events.append(dict(step=step, **data))
+            if step in ("datasets", "error"):
+                self.done = True
+            self._cond.notify_all()
+
+    def events(self, timeout: float = 30.0) -> Iterator[Dict]:
+        """Yields every event in order, blocking until the next one arrives; ends after the last."""
+        deadline = time.monotonic() + timeout
+        seen = 0
+        while True:
+            with self._cond:
+                while seen == len(self._events):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError(f"Profile load for '{self.name}' did not finish in {timeout:.0f}s")
+                    self._cond.wait(remaining)
+                pending = self._events[seen:]
+                seen = len(self._events)
+            for event in pending:
+                yield event
+                if event["step"] in ("datasets", "error"):
+                    return
+
+    def expired(self) -> bool:
+        return time.monotonic() - self.created_at > PREFETCH_TTL_SECS
+
+
+def _load(fetch: ProfileFetch, trace_id: Optional[str]):
+    with tracing.trace_context(trace_id), tracing.span("profile.prefetch"):
+        try:
+            with db_pool.transaction() as conn:
+                fetch.publish("connected")
+                fetch.user = repository.find_user_by_name(conn, fetch.name)
+                fetch.publish("profile", found=fetch.user is not None)
+                if fetch.user is not None:
+                    fetch.history = repository.get_income_history(conn, fetch.user['id'])
+                    rows = repository.get_transactions(conn, fetch.user['id'])
+                    fetch.transactions = pd.DataFrame(rows) if rows else None
+            fetch.publish("datasets", history=len(fetch.history),
+                          transactions=0 if fetch.transactions is None else len(fetch.transactions))
+        except Exception as e:
+            fetch.error = str(e)
+            fetch.publish("error", message=fetch.error)
+
+
+class ProfileSync:
+    def __init__(self, max_workers: int = MAX_WORKERS):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="idcs-profile-sync")
+        self._fetches: Dict[str, ProfileFetch] = {}
+        self._lock = threading.Lock()
+
+    def prefetch(self, name: str, fresh: bool = False) -> ProfileFetch:
+        """
+        Returns the running or fresh load for name, starting one if needed. Never blocks.
+        fresh=True ignores finished loads, however recent.
+        """
+        with self._lock:
+            fetch = self._fetches.get(name)
+            if fetch is not None and not (fetch.done and (fresh or fetch.error or fetch.expired())):
+                return fetch
+            if len(self._fetches) >= MAX_PREFETCHES:
+                for key in [k for k, f in self._fetches.items() if f.done]:
+                    del self._fetches[key]
+            fetch = self._fetches[name] = ProfileFetch(name)
+        self._pool.submit(_load, fetch, tracing.current_trace_id())
+        return fetch
+
+    def invalidate(self, name: Optional[str]):
+        """Forgets any prefetched data for name (call after writing that user's records)."""
+        with self._lock:
+            self._fetches.pop(name, None)
+
+
+_sync: Optional[ProfileSync] = None
+_sync_lock = threading.Lock()
+
+
+def get_sync() -> ProfileSync:
+    """Process-wide prefetcher shared by every Streamlit session."""
+    global _sync
+    with _sync_lock:
+        if _sync is None:
+            _sync = ProfileSync()
+        return _sync
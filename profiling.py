@@ -0,0 +1,317 @@
+import argparse
+import hmac
+import html
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Iterator, List, Optional
+from urllib.parse import parse_qs
+
+# --- Opt-in Sampling Profiler ---
+# Captures where a Streamlit rerun or an API request spends its time by sampling stacks
+# (sys._current_frames) from a helper thread every IDCS_PROFILE_INTERVAL_MS. Stacks are
+# folded ("module:function;module:function" -> samples) and appended, one JSON object per
+# profile, to IDCS_PROFILE_LOG together with the tracing correlation id:
+#
+#   {"ts": ..., "trace_id": "...", "label": "POST /evaluate", "pid": 4242, "duration_ms": 812.5,
+#    "interval_ms": 5.0, "samples": 160, "stacks": {"main:evaluate_claim;engine:calculate_metrics": 41, ...}}
+#
+# Turning it on:
+#   IDCS_PROFILE=1            every rerun/request is profiled (staging, reproductions)
+#   IDCS_PROFILE_TOKEN=<t>    only runs opened with ?profile=<t> are profiled (production)
+# With neither set nothing is sampled and the hooks are a single flag check.
+#
+#   python profiling.py top --trace <trace_id>            # hotspot table (self / total samples)
+#   python profiling.py flame --trace <id> -o flame.svg   # flame graph
+#   python profiling.py folded --trace <id>               # folded stacks for speedscope/flamegraph.pl
+#
+# Streamlit runs each session's script in its own thread, so a rerun profile only samples that
+# thread and ends when the thread finishes. Sync API endpoints run on a threadpool, so request
+# profiles sample every busy thread in the worker; concurrent requests in the same worker mix in.
+
+ALWAYS = os.environ.get("IDCS_PROFILE", "0") == "1"
+TOKEN = os.environ.get("IDCS_PROFILE_TOKEN", "")
+ENABLED = ALWAYS or bool(TOKEN)
+PROFILE_LOG = os.environ.get("IDCS_PROFILE_LOG", "profiles.jsonl")
+INTERVAL_SECS = float(os.environ.get("IDCS_PROFILE_INTERVAL_MS", "5")) / 1000
+MAX_SECS = float(os.environ.get("IDCS_PROFILE_MAX_SECS", "120"))
+
+# Leaf frames of threads that are parked rather than working
+IDLE_LEAVES = {
+    "threading:wait", "threading:_wait_for_tstate_lock", "selectors:select", "queue:get",
+    "concurrent.futures.thread:_worker", "asyncio.base_events:_run_once", "socket:accept",
+}
+
+_fd: Optional[int] = None
+_active: Dict[int, "Sampler"] = {}  # target thread id -> running sampler
+_active_lock = threading.Lock()
+
+
+def requested(token: Optional[str] = None) -> bool:
+    """Whether this run should be profiled: always-on mode, or the admin token was supplied."""
+    if ALWAYS:
+        return True
+    return bool(TOKEN and token and hmac.compare_digest(str(token), TOKEN))
+
+
+def _frame_name(frame) -> str:
+    return f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}"
+
+
+def _fold(frame) -> List[str]:
+    stack = []
+    while frame is not None:
+        stack.append(_frame_name(frame))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+class Sampler(threading.Thread):
+    """Samples one thread (or every busy thread when thread_id is None) until stopped."""
+
+    def __init__(self, trace_id: Optional[str], label: str, thread_id: Optional[int] = None,
+                 interval: float = INTERVAL_SECS):
+        super().__init__(name="idcs-profiler", daemon=True)
+        self.trace_id = trace_id
+        self.label = label
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop_event = threading.Event()
+        self._t0 = time.perf_counter()
+        self._ts = time.time()
+        self._written = False
+        self._write_lock = threading.Lock()
+
+    def run(self):
+        me = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        deadline = self._t0 + MAX_SECS
+        while not self._stop_event.wait(self.interval):
+            frames = sys._current_frames()
+            if self.thread_id is not None:
+                frame = frames.get(self.thread_id)
+                if frame is None:
+                    break  # the profiled thread has finished (e.g. the Streamlit rerun is over)
+                self.stacks[";".join(_fold(frame))] += 1
+            else:
+                for tid, frame in frames.items():
+                    if tid == me or _frame_name(frame) in IDLE_LEAVES:
+                        continue
+                    if tid not in names:
+                        names = {t.ident: t.name for t in threading.enumerate()}
+                    self.stacks[";".join([f"thread:{names.get(tid, tid)}"] + _fold(frame))] += 1
+            self.samples += 1
+            if time.perf_counter() > deadline:
+                break
+        self._write()
+
+    def stop(self):
+        self._stop_event.set()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join(timeout=1.0)
+        self._write()
+
+    def _write(self):
+        with self._write_lock:
+            if self._written:
+                return
+            self._written = True
+        with _active_lock:
+            if self.thread_id is not None and _active.get(self.thread_id) is self:
+                del _active[self.thread_id]
+        if not self.stacks:
+            return
+        _append({
+            "ts": round(self._ts, 3),
+            "trace_id": self.trace_id,
+            "label": self.label,
+            "pid": os.getpid(),
+            "duration_ms": round((time.perf_counter() - self._t0) * 1000, 1),
+            "interval_ms": self.interval * 1000,
+            "samples": self.samples,
+            "stacks": dict(self.stacks)
+        })
+
+
+def _append(record: Dict):
+    global _fd
+    try:
+        if _fd is None:
+            _fd = os.open(PROFILE_LOG, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        os.write(_fd, (json.dumps(record) + "\n").encode("utf-8"))
+    except OSError:
+        pass
+
+
+def profile_thread(trace_id: Optional[str], label: str, thread_id: Optional[int] = None) -> Sampler:
+    """
+    Starts sampling a thread (default: the caller's) until it exits or a new profile is started
+    on it. Suits code without an end hook, such as a Streamlit script run.
+    """
+    thread_id = thread_id or threading.get_ident()
+    sampler = Sampler(trace_id, label, thread_id)
+    with _active_lock:
+        previous = _active.get(thread_id)
+        _active[thread_id] = sampler
+    if previous is not None:
+        previous.stop()
+    sampler.start()
+    return sampler
+
+
+class ProfilingMiddleware:
+    """Pure ASGI middleware: profiles requests when enabled. Sits inside TracingMiddleware for the trace id."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if not ENABLED or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = parse_qs(scope.get("query_string", b"").decode("latin-1")).get("profile", [None])[0]
+        if not requested(token):
+            await self.app(scope, receive, send)
+            return
+
+        from tracing import current_trace_id # pyre-ignore[21]
+        sampler = Sampler(current_trace_id(), f"{scope['method']} {scope['path']}")
+        sampler.start()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            route = scope.get("route")
+            if route is not None:
+                sampler.label = f"{scope['method']} {getattr(route, 'path', scope['path'])}"
+            sampler.stop()
+
+
+# --- Profile viewer CLI ---
+
+def read_profiles(path: str, trace_id: Optional[str] = None, label: Optional[str] = None) -> Iterator[Dict]:
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if trace_id and record.get("trace_id") != trace_id:
+                continue
+            if label and label not in record.get("label", ""):
+                continue
+            yield record
+
+
+def merge_stacks(records: List[Dict]) -> Counter:
+    merged: Counter = Counter()
+    for record in records:
+        merged.update(record["stacks"])
+    return merged
+
+
+def top_table(stacks: Counter, limit: int):
+    self_samples: Counter = Counter()
+    total_samples: Counter = Counter()
+    total = sum(stacks.values()) or 1
+    for folded, count in stacks.items():
+        frames = folded.split(";")
+        self_samples[frames[-1]] += count
+        for name in set(frames):
+            total_samples[name] += count
+
+    print(f"{'function':<70} {'self %':>8} {'total %':>8} {'samples':>8}")
+    for name, count in self_samples.most_common(limit):
+        print(f"{name[:70]:<70} {100 * count / total:>7.1f}% {100 * total_samples[name] / total:>7.1f}% {count:>8}")
+
+
+def flame_svg(stacks: Counter, title: str, width: int = 1200, row: int = 17) -> str:
+    """Self-contained SVG flame graph (root at the bottom, hover for names and sample counts)."""
+    tree: Dict = {"n": 0, "c": {}}
+
+    def child(node, name):
+        if name not in node["c"]:
+            node["c"][name] = {"n": 0, "c": {}}
+        return node["c"][name]
+
+    depth = 0
+    for folded, count in stacks.items():
+        node = tree
+        node["n"] += count
+        frames = folded.split(";")
+        depth = max(depth, len(frames))
+        for name in frames:
+            node = child(node, name)
+            node["n"] += count
+
+    total = tree["n"] or 1
+    height = (depth + 2) * row
+    rects: List[str] = []
+
+    def draw(node, x: float, level: int):
+        for name, sub in sorted(node["c"].items()):
+            w = width * sub["n"] / total
+            if w >= 0.5:
+                y = height - (level + 2) * row
+                hue = 20 + (hash(name.split(":")[0]) % 40)
+                rects.append(
+                    f'<g><title>{html.escape(name)} ({sub["n"]} samples, {100 * sub["n"] / total:.1f}%)</title>'
+                    f'<rect x="{x:.1f}" y="{y}" width="{w:.1f}" height="{row - 1}" fill="hsl({hue},85%,60%)"/>'
+                    f'<text x="{x + 3:.1f}" y="{y + row - 5}" font-size="11">'
+                    f'{html.escape(name[:int(w / 7)]) if w > 60 else ""}</text></g>'
+                )
+                draw(sub, x, level + 1)
+            x += w
+
+    draw(tree, 0.0, 0)
+    return (f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" font-family="monospace">'
+            f'<text x="4" y="14" font-size="13">{html.escape(title)} ({total} samples)</text>'
+            + "".join(rects) + "</svg>")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect IDCS sampling profiles")
+    parser.add_argument("--log", default=PROFILE_LOG, help="Profile log to read")
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name, help_text in (("top", "Hotspot table"), ("flame", "Write an SVG flame graph"), ("folded", "Print folded stacks")):
+        p = sub.add_parser(name, help=help_text)
+        p.add_argument("--trace", help="Only profiles with this trace id")
+        p.add_argument("--label", help="Only profiles whose label contains this (e.g. '/evaluate')")
+        p.add_argument("--last", type=int, help="Only the N most recent matching profiles")
+        if name == "top":
+            p.add_argument("-n", "--limit", type=int, default=25)
+        if name == "flame":
+            p.add_argument("-o", "--output", default="flame.svg")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.log):
+        print(f"No profile log at {args.log} (run with IDCS_PROFILE=1 or IDCS_PROFILE_TOKEN set)")
+        return
+    records = list(read_profiles(args.log, args.trace, args.label))
+    if args.last:
+        records = records[-args.last:]
+    if not records:
+        print("No matching profiles")
+        return
+    stacks = merge_stacks(records)
+
+    if args.command == "top":
+        print(f"{len(records)} profile(s), {sum(r['duration_ms'] for r in records) / 1000:.2f} s wall, {sum(stacks.values())} samples")
+        top_table(stacks, args.limit)
+    elif args.command == "flame":
+        title = args.trace or args.label or "all profiles"
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(flame_svg(stacks, title))
+        print(f"Wrote {args.output}")
+    else:
+        for folded, count in stacks.most_common():
+            print(f"{folded} {count}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+import sqlite3
+import time
+from datetime import date, datetime
+from itertools import islice
+from typing import Dict, Iterable, List, Optional
+
+# --- User & Income History Repository ---
+# All SQL lives here as module-level constants with `?` placeholders.
+# sqlite3 keeps a per-connection LRU of compiled statements keyed by the SQL text
+# (`cached_statements`), so reusing the exact same string means each statement is
+# prepared once per connection and only re-bound on later calls.
+# Lookups hit ix_users_name / the email autoindex / ix_income_history_user_month.
+
+USER_COLUMNS = "id, name, email, age, employment_type, src_tax_bracket, src_cap, premium, deferred_period"
+
+SQL_USER_BY_NAME = f"SELECT {USER_COLUMNS} FROM users WHERE name = ? LIMIT 1"
+SQL_USER_BY_EMAIL = f"SELECT {USER_COLUMNS} FROM users WHERE email = ? LIMIT 1"
+SQL_PASSWORD_HASH = "SELECT password_hash FROM users WHERE email = ? LIMIT 1"
+SQL_INSERT_USER = "INSERT INTO users (name, age, employment_type, src_cap, src_tax_bracket) VALUES (?, ?, ?, ?, ?)"
+SQL_REGISTER_USER = "INSERT INTO users (email, password_hash, name) VALUES (?, ?, ?)"
+SQL_UPDATE_PREMIUM = "UPDATE users SET premium = ?, deferred_period = ? WHERE id = ?"
+SQL_INCOME_HISTORY = "SELECT income_amount AS amount, status, month_index AS month FROM income_history WHERE user_id = ? ORDER BY month_index"
+SQL_INSERT_INCOME = "INSERT INTO income_history (user_id, month_index, income_amount, status) VALUES (?, ?, ?, ?)"
+SQL_DELETE_INCOME = "DELETE FROM income_history WHERE user_id = ?"
+SQL_DELETE_USER = "DELETE FROM users WHERE id = ?"
+
+SQL_INSERT_TRANSACTION = "INSERT INTO transactions (user_id, date, amount, description) VALUES (?, ?, ?, ?)"
+SQL_TRANSACTIONS_RANGE = "SELECT date, amount, description FROM transactions WHERE user_id = ? AND date >= ? AND date <= ? ORDER BY date"
+SQL_MONTHLY_TOTALS = "SELECT substr(date, 1, 7) AS month, SUM(amount) AS amount FROM transactions WHERE user_id = ? AND date >= ? AND date <= ? GROUP BY month ORDER BY month"
+SQL_DELETE_TRANSACTIONS_RANGE = "DELETE FROM transactions WHERE user_id = ? AND date >= ? AND date <= ?"
+SQL_DELETE_TRANSACTIONS = "DELETE FROM transactions WHERE user_id = ?"
+
+SQL_USER_STATS = "SELECT n, total, sum_sq, mean, m2, dip_count, paid_count, unpaid_count FROM user_stats WHERE user_id = ?"
+SQL_DELETE_STATS = "DELETE FROM user_stats WHERE user_id = ?"
+
+SQL_INSERT_CHAT_SESSION = "INSERT INTO chat_sessions (id, user_id, forecast, context, created_at, expires_at) VALUES (?, ?, ?, ?, ?, ?)"
+SQL_CHAT_SESSION = "SELECT id, user_id, forecast, context, created_at, expires_at FROM chat_sessions WHERE id = ? AND expires_at > ?"
+SQL_TOUCH_CHAT_SESSION = "UPDATE chat_sessions SET expires_at = ? WHERE id = ? AND expires_at > ?"
+SQL_INSERT_CHAT_MESSAGE = "INSERT INTO chat_messages (session_id, role, content, created_at) VALUES (?, ?, ?, ?)"
+SQL_TRIM_CHAT_MESSAGES = """DELETE FROM chat_messages WHERE session_id = ? AND id NOT IN (
+    SELECT id FROM chat_messages WHERE session_id = ? ORDER BY id DESC LIMIT ?)"""
+SQL_CHAT_MESSAGES = "SELECT role, content FROM chat_messages WHERE session_id = ? ORDER BY id"
+SQL_COUNT_CHAT_MESSAGES = "SELECT COUNT(*) FROM chat_messages WHERE session_id = ?"
+SQL_DELETE_CHAT_MESSAGES = "DELETE FROM chat_messages WHERE session_id = ?"
+SQL_DELETE_CHAT_SESSION = "DELETE FROM chat_sessions WHERE id = ?"
+SQL_DELETE_EXPIRED_CHAT_MESSAGES = "DELETE FROM chat_messages WHERE session_id IN (SELECT id FROM chat_sessions WHERE expires_at <= ?)"
+SQL_DELETE_EXPIRED_CHAT_SESSIONS = "DELETE FROM chat_sessions WHERE expires_at <= ?"
+SQL_DELETE_USER_CHAT_MESSAGES = "DELETE FROM chat_messages WHERE session_id IN (SELECT id FROM chat_sessions WHERE user_id = ?)"
+SQL_DELETE_USER_CHAT_SESSIONS = "DELETE FROM chat_sessions WHERE user_id = ?"
+SQL_USER_EXISTS = "SELECT 1 FROM users WHERE id = ?"
+
+# Open-ended bounds for ISO date text comparisons
+MIN_DATE = "0000-00-00"
+MAX_DATE = "9999-99-99"
+TRANSACTION_BATCH_SIZE = 5000
+
+DEFAULT_SRC_CAP = 50000.0
+DEFAULT_TAX_BRACKET = "Bracket 3"
+
+
+def _rows(cursor: sqlite3.Cursor) -> List[Dict]:
+    cols = [c[0] for c in cursor.description]
+    return [dict(zip(cols, row)) for row in cursor.fetchall()]
+
+
+def _one(cursor: sqlite3.Cursor) -> Optional[Dict]:
+    rows = _rows(cursor)
+    return rows[0] if rows else None
+
+
+def find_user_by_name(conn: sqlite3.Connection, name: str) -> Optional[Dict]:
+    return _one(conn.execute(SQL_USER_BY_NAME, (name,)))
+
+
+def find_user_by_email(conn: sqlite3.Connection, email: str) -> Optional[Dict]:
+    return _one(conn.execute(SQL_USER_BY_EMAIL, (email,)))
+
+
+def get_password_hash(conn: sqlite3.Connection, email: str):
+    row = conn.execute(SQL_PASSWORD_HASH, (email,)).fetchone()
+    return row[0] if row else None
+
+
+def create_user(conn: sqlite3.Connection, name: str, age: Optional[int], employment_type: Optional[str],
+                src_cap: float = DEFAULT_SRC_CAP, src_tax_bracket: str = DEFAULT_TAX_BRACKET) -> int:
+    cursor = conn.execute(SQL_INSERT_USER, (name, age, employment_type, src_cap, src_tax_bracket))
+    return cursor.lastrowid
+
+
+def register_user(conn: sqlite3.Connection, email: str, password_hash: bytes, name: str) -> int:
+    cursor = conn.execute(SQL_REGISTER_USER, (email, password_hash, name))
+    return cursor.lastrowid
+
+
+def update_premium(conn: sqlite3.Connection, user_id: int, premium: float, deferred_period: int):
+    conn.execute(SQL_UPDATE_PREMIUM, (float(premium), int(deferred_period), int(user_id)))
+
+
+def get_income_history(conn: sqlite3.Connection, user_id: int) -> List[Dict]:
+    return _rows(conn.execute(SQL_INCOME_HISTORY, (int(user_id),)))
+
+
+def add_income_history(conn: sqlite3.Connection, user_id: int, history: List[Dict]):
+    """history: list of dicts with 'amount' and 'status', stored as months 1..N"""
+    conn.executemany(SQL_INSERT_INCOME, [
+        (int(user_id), idx + 1, float(inc['amount']), inc['status'])
+        for idx, inc in enumerate(history)
+    ])
+
+
+def _iso_date(value) -> str:
+    if isinstance(value, (date, datetime)):
+        return value.strftime("%Y-%m-%d")
+    return str(value)[:10]
+
+
+def bulk_insert_transactions(conn: sqlite3.Connection, user_id: int, rows: Iterable[Dict],
+                             batch_size: int = TRANSACTION_BATCH_SIZE) -> int:
+    """
+    Inserts transaction dicts ('date', 'amount', 'description') with one executemany per batch.
+    Runs inside the caller's transaction; returns the number of rows written.
+    """
+    uid = int(user_id)
+    params = (
+        (uid, _iso_date(r['date']), float(r['amount']), r.get('description'))
+        for r in rows
+    )
+    written = 0
+    while True:
+        batch = list(islice(params, batch_size))
+        if not batch:
+            return written
+        conn.executemany(SQL_INSERT_TRANSACTION, batch)
+        written += len(batch)
+
+
+def replace_transactions(conn: sqlite3.Connection, user_id: int, rows: List[Dict]) -> int:
+    """Re-uploading a statement replaces the rows in the date span it covers instead of duplicating them."""
+    if not rows:
+        return 0
+    dates = [_iso_date(r['date']) for r in rows]
+    conn.execute(SQL_DELETE_TRANSACTIONS_RANGE, (int(user_id), min(dates), max(dates)))
+    return bulk_insert_transactions(conn, user_id, rows)
+
+
+def get_transactions(conn: sqlite3.Connection, user_id: int, start=None, end=None) -> List[Dict]:
+    """Transactions in [start, end] (inclusive, ISO dates or date objects), oldest first."""
+    lo = _iso_date(start) if start else MIN_DATE
+    hi = _iso_date(end) if end else MAX_DATE
+    return _rows(conn.execute(SQL_TRANSACTIONS_RANGE, (int(user_id), lo, hi)))
+
+
+def monthly_totals(conn: sqlite3.Connection, user_id: int, start=None, end=None, fill_gaps: bool = True) -> Dict[str, float]:
+    """
+    {YYYY-MM: total inflow}, sorted by month. With fill_gaps, months without any
+    inflow inside the covered span are reported as 0.0 (same as process_and_group_inflows).
+    """
+    lo = _iso_date(start) if start else MIN_DATE
+    hi = _iso_date(end) if end else MAX_DATE
+    totals = {m: float(a) for m, a in conn.execute(SQL_MONTHLY_TOTALS, (int(user_id), lo, hi))}
+    if not fill_gaps or not totals:
+        return totals
+
+    first, last = min(totals), max(totals)
+    year, month = int(first[:4]), int(first[5:7])
+    filled = {}
+    while True:
+        key = f"{year:04d}-{month:02d}"
+        filled[key] = totals.get(key, 0.0)
+        if key >= last:
+            return filled
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def get_user_stats(conn: sqlite3.Connection, user_id: int) -> Optional[Dict]:
+    """Precomputed history stats (kept current by the income_history trigger)."""
+    return _one(conn.execute(SQL_USER_STATS, (int(user_id),)))
+
+
+# --- Chat sessions ---
+
+def create_chat_session(conn: sqlite3.Connection, session_id: str, user_id: Optional[int],
+                        forecast_json: Optional[str], context: str, ttl: float):
+    """Stores a session (linked to user_id if that user exists) and drops expired ones."""
+    now = time.time()
+    conn.execute(SQL_DELETE_EXPIRED_CHAT_MESSAGES, (now,))
+    conn.execute(SQL_DELETE_EXPIRED_CHAT_SESSIONS, (now,))
+    if user_id is not None and conn.execute(SQL_USER_EXISTS, (int(user_id),)).fetchone() is None:
+        user_id = None
+    conn.execute(SQL_INSERT_CHAT_SESSION, (session_id, user_id, forecast_json, context, now, now + ttl))
+
+
+def get_chat_session(conn: sqlite3.Connection, session_id: str) -> Optional[Dict]:
+    """The unexpired session with its messages (oldest first), or None."""
+    session = _one(conn.execute(SQL_CHAT_SESSION, (session_id, time.time())))
+    if session is not None:
+        session["messages"] = _rows(conn.execute(SQL_CHAT_MESSAGES, (session_id,)))
+    return session
+
+
+def add_chat_message(conn: sqlite3.Connection, session_id: str, role: str, content: str,
+                     ttl: float, keep: int) -> Optional[int]:
+    """
+    Appends one turn, keeps the newest `keep` and extends the session's TTL. Returns the
+    number of stored turns, or None if the session is unknown or expired.
+    """
+    now = time.time()
+    if conn.execute(SQL_TOUCH_CHAT_SESSION, (now + ttl, session_id, now)).rowcount == 0:
+        return None
+    conn.execute(SQL_INSERT_CHAT_MESSAGE, (session_id, role, content, now))
+    conn.execute(SQL_TRIM_CHAT_MESSAGES, (session_id, session_id, int(keep)))
+    return conn.execute(SQL_COUNT_CHAT_MESSAGES, (session_id,)).fetchone()[0]
+
+
+def delete_chat_session(conn: sqlite3.Connection, session_id: str):
+    conn.execute(SQL_DELETE_CHAT_MESSAGES, (session_id,))
+    conn.execute(SQL_DELETE_CHAT_SESSION, (session_id,))
+
+
+def delete_user(conn: sqlite3.Connection, user_id: int):
+    conn.execute(SQL_DELETE_USER_CHAT_MESSAGES, (int(user_id),))
+    conn.execute(SQL_DELETE_USER_CHAT_SESSIONS, (int(user_id),))
+    conn.execute(SQL_DELETE_STATS, (int(user_id),))
+    conn.execute(SQL_DELETE_TRANSACTIONS, (int(user_id),))
+    conn.execute(SQL_DELETE_INCOME, (int(user_id),))
+    conn.execute(SQL_DELETE_USER, (int(user_id),))
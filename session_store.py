@@ -0,0 +1,254 @@
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+import pandas as pd # pyre-ignore[21]
+
+# --- Per-Session Data Store ---
+# Holds one columnar copy (a DataFrame) of each dataset a Streamlit session works with,
+# instead of lists of dicts plus overlapping DataFrames in st.session_state. Anything
+# derived from a dataset (monthly totals, analysis frames) is a view: built on first
+# access, memoized next to the dataset and dropped whenever the dataset is replaced.
+#
+# Memory is capped twice:
+#   1. Per session: a put that would take a session past IDCS_SESSION_MAX_MB raises SessionQuotaError.
+#   2. Globally: past IDCS_SESSION_STORE_MAX_MB, the least recently used other sessions are evicted.
+#      With IDCS_SESSION_SPILL=1 they are spilled to IDCS_SESSION_SPILL_DIR instead (views dropped,
+#      datasets pickled and encrypted with a key that only lives in this process's memory, so
+#      statement data never sits readable on disk) and reloaded on next access.
+# Sessions untouched for IDCS_SESSION_TTL_SECS are evicted, in memory and on disk.
+
+SESSION_MAX_BYTES = int(float(os.environ.get("IDCS_SESSION_MAX_MB", "64")) * 1024 * 1024)
+STORE_MAX_BYTES = int(float(os.environ.get("IDCS_SESSION_STORE_MAX_MB", "1024")) * 1024 * 1024)
+SPILL_ENABLED = os.environ.get("IDCS_SESSION_SPILL", "0") == "1"
+SPILL_DIR = os.environ.get("IDCS_SESSION_SPILL_DIR", os.path.join(tempfile.gettempdir(), "idcs-sessions"))
+TTL_SECS = float(os.environ.get("IDCS_SESSION_TTL_SECS", str(6 * 3600)))
+
+
+class SessionQuotaError(ValueError):
+    """A dataset would take its session past the per-session memory cap."""
+
+
+def nbytes(obj: Any) -> int:
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(index=True, deep=True).sum())
+    try:
+        return len(pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return 0
+
+
+class _Session:
+    __slots__ = ("datasets", "views", "nbytes", "last_access", "spill_path")
+
+    def __init__(self):
+        self.datasets: Dict[str, pd.DataFrame] = {}
+        self.views: Dict[tuple, Any] = {}
+        self.nbytes = 0
+        self.last_access = time.monotonic()
+        self.spill_path: Optional[str] = None
+
+    def resident(self) -> bool:
+        return self.spill_path is None
+
+
+class SessionStore:
+    def __init__(self, session_max_bytes: int = SESSION_MAX_BYTES, store_max_bytes: int = STORE_MAX_BYTES,
+                 spill_dir: Optional[str] = SPILL_DIR if SPILL_ENABLED else None, ttl_secs: float = TTL_SECS):
+        self.session_max_bytes = session_max_bytes
+        self.store_max_bytes = store_max_bytes
+        self.spill_dir = spill_dir
+        self.ttl_secs = ttl_secs
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()  # least recently used first
+        self._resident_bytes = 0
+        self._last_sweep = 0.0
+        self._lock = threading.RLock()
+        self._cipher = None
+        if spill_dir:
+            from cryptography.fernet import Fernet # pyre-ignore[21]
+            self._cipher = Fernet(Fernet.generate_key())
+            os.makedirs(spill_dir, mode=0o700, exist_ok=True)
+            self._sweep_spill_dir()
+
+    # --- Datasets & views ---
+
+    def put(self, session_id: str, name: str, df: pd.DataFrame):
+        """Stores (or replaces) a dataset. Views derived from it are invalidated."""
+        size = nbytes(df)
+        with self._lock:
+            session = self._touch(session_id, create=True)
+            old = session.datasets.get(name)
+            stale = [k for k in session.views if k[0] == name]
+            freed = (nbytes(old) if old is not None else 0) + sum(nbytes(session.views[k]) for k in stale)
+            if session.nbytes - freed + size > self.session_max_bytes:
+                raise SessionQuotaError(
+                    f"Dataset '{name}' needs {size / 1e6:.1f} MB; the session limit is {self.session_max_bytes / 1e6:.0f} MB"
+                )
+            for k in stale:
+                del session.views[k]
+            session.datasets[name] = df
+            self._resize(session, size - freed)
+            self._enforce_global(keep=session_id)
+
+    def get(self, session_id: str, name: str) -> Optional[pd.DataFrame]:
+        with self._lock:
+            session = self._touch(session_id)
+            return session.datasets.get(name) if session else None
+
+    def view(self, session_id: str, name: str, view: str, build: Callable[[pd.DataFrame], Any]) -> Any:
+        """
+        `build(dataset)` memoized per (dataset, view). Returns None when the dataset is absent.
+        Views count against the session cap; one that does not fit is returned without being kept.
+        """
+        with self._lock:
+            session = self._touch(session_id)
+            if session is None or name not in session.datasets:
+                return None
+            key = (name, view)
+            if key in session.views:
+                return session.views[key]
+            df = session.datasets[name]
+
+        # Build outside the lock; other sessions keep working meanwhile
+        result = build(df)
+        size = nbytes(result)
+        with self._lock:
+            # Only keep it if the dataset was not replaced while building
+            current = self._sessions.get(session_id) is session and session.datasets.get(name) is df
+            if current and session.resident() and session.nbytes + size <= self.session_max_bytes:
+                session.views[key] = result
+                self._resize(session, size)
+                self._enforce_global(keep=session_id)
+        return result
+
+    def has(self, session_id: str, name: str) -> bool:
+        return self.get(session_id, name) is not None
+
+    def drop(self, session_id: str, name: Optional[str] = None):
+        """Removes one dataset (and its views), or the whole session when name is None."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return
+            if name is None:
+                self._evict(session_id)
+                return
+            session = self._touch(session_id)
+            if session.datasets.pop(name, None) is not None:
+                for k in [k for k in session.views if k[0] == name]:
+                    del session.views[k]
+                self._resize(session, self._measure(session) - session.nbytes)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "resident_sessions": sum(1 for s in self._sessions.values() if s.resident()),
+                "resident_bytes": self._resident_bytes,
+            }
+
+    # --- Bookkeeping ---
+
+    def _measure(self, session: _Session) -> int:
+        return sum(nbytes(v) for v in session.datasets.values()) + sum(nbytes(v) for v in session.views.values())
+
+    def _resize(self, session: _Session, delta: int):
+        session.nbytes += delta
+        self._resident_bytes += delta
+
+    def _touch(self, session_id: str, create: bool = False) -> Optional[_Session]:
+        self._expire()
+        session = self._sessions.get(session_id)
+        if session is None:
+            if not create:
+                return None
+            session = self._sessions[session_id] = _Session()
+        self._sessions.move_to_end(session_id)
+        session.last_access = time.monotonic()
+        if not session.resident():
+            self._reload(session_id, session)
+        return session
+
+    def _sweep_spill_dir(self):
+        """Spill files left behind by a previous process (unreadable without its key) are deleted once they outlive the TTL."""
+        cutoff = time.time() - self.ttl_secs
+        for entry in os.scandir(self.spill_dir):
+            try:
+                if entry.name.endswith(".pkl") and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+            except OSError:
+                pass
+
+    def _expire(self):
+        now = time.monotonic()
+        if now - self._last_sweep < 30:
+            return
+        self._last_sweep = now
+        cutoff = now - self.ttl_secs
+        for session_id in [sid for sid, s in self._sessions.items() if s.last_access < cutoff]:
+            self._evict(session_id)
+
+    def _enforce_global(self, keep: str):
+        # Least recently used first; the session being written is never pushed out
+        for session_id in list(self._sessions):
+            if self._resident_bytes <= self.store_max_bytes:
+                return
+            session = self._sessions[session_id]
+            if session_id == keep or not session.resident():
+                continue
+            if not (self.spill_dir and self._spill(session_id, session)):
+                self._evict(session_id)
+
+    def _spill(self, session_id: str, session: _Session) -> bool:
+        path = os.path.join(self.spill_dir, f"{session_id}.pkl")
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "wb") as f:
+                f.write(self._cipher.encrypt(pickle.dumps(session.datasets, protocol=pickle.HIGHEST_PROTOCOL)))
+        except OSError:
+            return False
+        self._resident_bytes -= session.nbytes
+        session.datasets, session.views, session.nbytes = {}, {}, 0
+        session.spill_path = path
+        return True
+
+    def _reload(self, session_id: str, session: _Session):
+        try:
+            with open(session.spill_path, "rb") as f:
+                session.datasets = pickle.loads(self._cipher.decrypt(f.read()))
+        except Exception:
+            session.datasets = {}  # spill file lost: the session starts over
+        self._remove_spill(session)
+        self._resize(session, self._measure(session))
+        self._enforce_global(keep=session_id)
+
+    def _remove_spill(self, session: _Session):
+        if session.spill_path:
+            try:
+                os.remove(session.spill_path)
+            except OSError:
+                pass
+            session.spill_path = None
+
+    def _evict(self, session_id: str):
+        session = self._sessions.pop(session_id)
+        if session.resident():
+            self._resident_bytes -= session.nbytes
+        self._remove_spill(session)
+
+
+_store: Optional[SessionStore] = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> SessionStore:
+    """Process-wide store shared by every Streamlit session."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = SessionStore()
+        return _store
@@ -0,0 +1,256 @@
+import argparse
+import logging
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from logging.handlers import RotatingFileHandler
+from typing import List, Optional
+
+# --- Production Process Supervisor ---
+# Runs the services for deployments and for run.py (the dev launcher, one API worker):
+#   1. The API runs as uvicorn with N worker processes and no --reload.
+#   2. Child stdout/stderr is drained continuously by a thread per child into rotating
+#      logs, so a full pipe buffer can never stall a server.
+#   3. Streamlit is only started once the API answers its health check.
+#   4. Children that exit or fail repeated health checks are restarted with backoff.
+#   5. SIGTERM/SIGINT stops the UI first, then the API, each with a grace period.
+# Every child runs in its own session, so signals only ever reach processes we started.
+# With more than one API worker, IDCS_METRICS_DIR (default <log-dir>/metrics) lets /metrics
+# report totals over all workers instead of whichever worker answered the scrape.
+#
+#   python supervisor.py --api-workers 4 --log-dir logs
+
+logger = logging.getLogger("idcs.supervisor")
+
+
+def _http_ok(url: str, timeout: float = 2.0) -> bool:
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as resp:
+            return resp.status == 200
+    except (urllib.error.URLError, OSError):
+        return False
+
+
+def _file_logger(name: str, path: str, max_bytes: int, backups: int) -> logging.Logger:
+    child_logger = logging.getLogger(f"idcs.child.{name}")
+    child_logger.setLevel(logging.INFO)
+    child_logger.propagate = False
+    handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8")
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    child_logger.addHandler(handler)
+    return child_logger
+
+
+class Child:
+    """One supervised server process plus the thread draining its output."""
+
+    MIN_BACKOFF, MAX_BACKOFF = 1.0, 60.0
+    STABLE_AFTER_SECS = 60.0
+
+    def __init__(self, name: str, cmd: List[str], health_url: str, log: logging.Logger,
+                 env: dict, startup_timeout: float = 60.0):
+        self.name = name
+        self.cmd = cmd
+        self.health_url = health_url
+        self.log = log
+        self.env = env
+        self.startup_timeout = startup_timeout
+        self.proc: Optional[subprocess.Popen] = None
+        self.started_at = 0.0
+        self.backoff = self.MIN_BACKOFF
+        self.restart_at: Optional[float] = None
+        self.failed_checks = 0
+
+    def start(self):
+        self.proc = subprocess.Popen(
+            self.cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            stdin=subprocess.DEVNULL,
+            env=self.env,
+            start_new_session=True
+        )
+        self.started_at = time.monotonic()
+        self.restart_at = None
+        self.failed_checks = 0
+        threading.Thread(target=self._drain, args=(self.proc,), name=f"drain-{self.name}", daemon=True).start()
+        logger.info("%s started (pid %s): %s", self.name, self.proc.pid, " ".join(self.cmd))
+
+    def _drain(self, proc: subprocess.Popen):
+        for raw in iter(proc.stdout.readline, b""):
+            self.log.info(raw.decode("utf-8", errors="replace").rstrip("\n"))
+        proc.stdout.close()
+
+    def wait_healthy(self, stop: threading.Event) -> bool:
+        deadline = time.monotonic() + self.startup_timeout
+        while time.monotonic() < deadline and not stop.is_set():
+            if self.proc.poll() is not None:
+                return False
+            if _http_ok(self.health_url):
+                logger.info("%s healthy at %s", self.name, self.health_url)
+                return True
+            stop.wait(0.5)
+        return False
+
+    def alive(self) -> bool:
+        return self.proc is not None and self.proc.poll() is None
+
+    def reap_group(self):
+        """Kills whatever is left of a dead child's session (e.g. uvicorn workers still holding the port)."""
+        try:
+            os.killpg(self.proc.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    def schedule_restart(self, reason: str):
+        # Backoff grows while the child keeps dying quickly and resets once it has stayed up
+        if time.monotonic() - self.started_at > self.STABLE_AFTER_SECS:
+            self.backoff = self.MIN_BACKOFF
+        self.restart_at = time.monotonic() + self.backoff
+        logger.warning("%s %s; restarting in %.0fs", self.name, reason, self.backoff)
+        self.backoff = min(self.MAX_BACKOFF, self.backoff * 2)
+
+    def stop(self, grace: float):
+        if not self.alive():
+            return
+        logger.info("%s stopping (pid %s)", self.name, self.proc.pid)
+        try:
+            os.killpg(self.proc.pid, signal.SIGTERM)
+            self.proc.wait(timeout=grace)
+        except subprocess.TimeoutExpired:
+            logger.warning("%s did not exit within %.0fs; killing", self.name, grace)
+            os.killpg(self.proc.pid, signal.SIGKILL)
+            self.proc.wait()
+        except ProcessLookupError:
+            pass
+
+
+class Supervisor:
+    def __init__(self, children: List[Child], health_interval: float = 10.0, max_failed_checks: int = 3,
+                 grace: float = 20.0):
+        self.children = children  # in startup order
+        self.health_interval = health_interval
+        self.max_failed_checks = max_failed_checks
+        self.grace = grace
+        self.stop_event = threading.Event()
+
+    def _handle_signal(self, signum, _frame):
+        logger.info("Received %s; shutting down", signal.Signals(signum).name)
+        self.stop_event.set()
+
+    def run(self) -> int:
+        signal.signal(signal.SIGTERM, self._handle_signal)
+        signal.signal(signal.SIGINT, self._handle_signal)
+        try:
+            # Startup ordering: each child must pass its health check before the next starts
+            for child in self.children:
+                child.start()
+                if not child.wait_healthy(self.stop_event):
+                    if self.stop_event.is_set():
+                        return 0
+                    logger.error("%s failed to become healthy; aborting startup", child.name)
+                    return 1
+            logger.info("All services up")
+            self._monitor()
+            return 0
+        finally:
+            for child in reversed(self.children):
+                child.stop(self.grace)
+            logger.info("Shutdown complete")
+
+    def _monitor(self):
+        last_check = time.monotonic()
+        while not self.stop_event.wait(1.0):
+            now = time.monotonic()
+            check_health = now - last_check >= self.health_interval
+            if check_health:
+                last_check = now
+
+            for child in self.children:
+                if child.restart_at is not None:
+                    if now >= child.restart_at:
+                        child.start()
+                    continue
+                if not child.alive():
+                    child.reap_group()
+                    child.schedule_restart(f"exited with code {child.proc.returncode}")
+                    continue
+                if check_health and now - child.started_at > child.startup_timeout:
+                    if _http_ok(child.health_url):
+                        child.failed_checks = 0
+                    else:
+                        child.failed_checks += 1
+                        if child.failed_checks >= self.max_failed_checks:
+                            child.stop(self.grace)
+                            child.schedule_restart(f"failed {child.failed_checks} health checks")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the IDCS API and dashboard under supervision")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--api-port", type=int, default=8000)
+    parser.add_argument("--api-workers", type=int, default=max(2, os.cpu_count() or 1))
+    parser.add_argument("--ui-port", type=int, default=8503)
+    parser.add_argument("--no-ui", action="store_true", help="Only run the API")
+    parser.add_argument("--log-dir", default="logs")
+    parser.add_argument("--log-max-bytes", type=int, default=10 * 1024 * 1024)
+    parser.add_argument("--log-backups", type=int, default=5)
+    parser.add_argument("--health-interval", type=float, default=10.0)
+    parser.add_argument("--grace", type=float, default=20.0, help="Seconds to wait for a clean exit before SIGKILL")
+    args = parser.parse_args()
+
+    os.makedirs(args.log_dir, exist_ok=True)
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(message)s",
+        handlers=[
+            logging.StreamHandler(sys.stdout),
+            RotatingFileHandler(os.path.join(args.log_dir, "supervisor.log"),
+                                maxBytes=args.log_max_bytes, backupCount=args.log_backups, encoding="utf-8")
+        ]
+    )
+
+    env = dict(os.environ, PYTHONUNBUFFERED="1")
+    if args.api_workers > 1 and not env.get("IDCS_METRICS_DIR"):
+        # Each uvicorn worker has its own registry; they share snapshots so /metrics shows the sum
+        env["IDCS_METRICS_DIR"] = os.path.join(args.log_dir, "metrics")
+    if env.get("IDCS_METRICS_DIR"):
+        os.makedirs(env["IDCS_METRICS_DIR"], exist_ok=True)
+        for entry in os.scandir(env["IDCS_METRICS_DIR"]):
+            if entry.name.endswith(".json"):
+                os.remove(entry.path)  # snapshots of a previous run
+    local = "127.0.0.1" if args.host in ("0.0.0.0", "::") else args.host
+
+    def child_log(name):
+        return _file_logger(name, os.path.join(args.log_dir, f"{name}.log"), args.log_max_bytes, args.log_backups)
+
+    children = [Child(
+        "api",
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", args.host, "--port", str(args.api_port),
+         "--workers", str(args.api_workers)],
+        f"http://{local}:{args.api_port}/",
+        child_log("api"),
+        env
+    )]
+    if not args.no_ui:
+        children.append(Child(
+            "streamlit",
+            [sys.executable, "-m", "streamlit", "run", "app.py", "--server.address", args.host,
+             "--server.port", str(args.ui_port), "--server.headless", "true",
+             "--server.fileWatcherType", "none", "--server.runOnSave", "false"],
+            f"http://{local}:{args.ui_port}/_stcore/health",
+            child_log("streamlit"),
+            env,
+            startup_timeout=120.0
+        ))
+
+    sys.exit(Supervisor(children, args.health_interval, grace=args.grace).run())
+
+
+if __name__ == "__main__":
+    main()
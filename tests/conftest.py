@@ -0,0 +1,31 @@
+import os
+import tempfile
+
+import pytest
+
+# db_pool, cache_backend and session_store read their paths at import time, so point them
+# away from the checked-in idcs.db before any test module imports them.
+_TMP = tempfile.mkdtemp(prefix="idcs-tests-")
+os.environ["IDCS_DB_PATH"] = os.path.join(_TMP, "idcs.db")
+os.environ["IDCS_SESSION_SPILL_DIR"] = os.path.join(_TMP, "sessions")
+os.environ.pop("IDCS_CACHE_PATH", None)
+os.environ.pop("IDCS_CACHE_KEY", None)
+
+
+@pytest.fixture
+def db_conn(tmp_path):
+    """A fresh, fully migrated database (models + migrations) on its own file."""
+    from sqlalchemy import create_engine # pyre-ignore[21]
+
+    import db_pool # pyre-ignore[21]
+    from database import Base # pyre-ignore[21]
+    from migrations import migrate # pyre-ignore[21]
+
+    path = str(tmp_path / "idcs.db")
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    engine.dispose()
+    conn = db_pool.connect(path)
+    migrate(conn)
+    yield conn
+    conn.close()
@@ -0,0 +1,127 @@
+import pytest
+from fastapi.testclient import TestClient # pyre-ignore[21]
+
+import db_pool # pyre-ignore[21]
+import main # pyre-ignore[21]
+import repository # pyre-ignore[21]
+from engine import IDCS_Engine # pyre-ignore[21]
+
+ENGINE = IDCS_Engine()
+
+
+def month(amount, status="Paid"):
+    return {"amount": amount, "status": status}
+
+
+HISTORIES = [
+    [],
+    [month(42000.0)],
+    [month(0.0, "Unpaid")],
+    [month(50000.0), month(20000.0, "Unpaid")],
+    # Dips every third month: an interval pattern
+    [month(a) for a in (50000, 50000, 20000, 50000, 50000, 20000, 50000, 50000)],
+    [month(50000.0), month(51000.0, "Pending"), month(49000.0), month(30000.0, "Unpaid"), month(50500.0)],
+    [month(0.0) for _ in range(4)],
+]
+
+
+def assert_same_metrics(batch, single):
+    assert batch.keys() == single.keys()
+    for field, value in single.items():
+        if isinstance(value, float):
+            assert batch[field] == pytest.approx(value), field
+        else:
+            assert batch[field] == value, field
+
+
+# --- Engine: vectorized vs per-member ---
+
+@pytest.mark.parametrize("current_income, w_emp", [(10000.0, 1.0), (60000.0, 1.1)])
+def test_batch_matches_calculate_metrics(current_income, w_emp):
+    n = len(HISTORIES)
+    batch = ENGINE.calculate_metrics_batch(HISTORIES, [40000.0] * n, [current_income] * n, [w_emp] * n)
+    assert len(batch) == n
+    for history, result in zip(HISTORIES, batch):
+        assert_same_metrics(result, ENGINE.calculate_metrics(history, 40000.0, current_income, w_emp))
+
+
+@pytest.mark.parametrize("history", [[], [month(42000.0)]], ids=["empty", "single-month"])
+def test_batch_of_one_short_history(history):
+    [result] = ENGINE.calculate_metrics_batch([history], [40000.0], [1000.0], [1.0])
+    assert_same_metrics(result, ENGINE.calculate_metrics(history, 40000.0, 1000.0))
+
+
+def test_empty_batch():
+    assert ENGINE.calculate_metrics_batch([], [], [], []) == []
+
+
+# --- /evaluate/batch ---
+
+@pytest.fixture(scope="module")
+def client():
+    # No `with`: the lifespan (forecast worker pool, metrics exporter) isn't needed here
+    return TestClient(main.app)
+
+
+def stored_amounts(user_id):
+    with db_pool.connection() as conn:
+        return [m["amount"] for m in repository.get_income_history(conn, user_id)]
+
+
+def item(name, history, **overrides):
+    body = {"name": name, "age": 30, "employment_type": "Gig", "current_income": 10000.0,
+            "income_history": history}
+    body.update(overrides)
+    return body
+
+
+def test_invalid_item_fails_alone(client):
+    history = [month(50000.0), month(50500.0), month(49500.0)]
+    response = client.post("/evaluate/batch", json={"items": [
+        item("batch-valid-a", history),
+        item("batch-invalid", history, age="not a number"),
+        {"name": "batch-missing-fields"},
+        item("batch-valid-b", history),
+    ]})
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["succeeded"], body["failed"]) == (2, 2)
+    results = body["results"]
+    assert [r["index"] for r in results] == [0, 1, 2, 3]
+    assert "error" in results[1] and "error" in results[2]
+    assert {e["loc"][0] for e in results[2]["error"]} >= {"age", "employment_type", "current_income"}
+
+    # The valid members were committed despite the failures
+    for r, expected in ((results[0], history), (results[3], history)):
+        assert r["evaluation"]["eligible"]
+        assert stored_amounts(r["user"]["id"]) == [m["amount"] for m in expected]
+
+
+def test_duplicate_new_name_creates_one_member(client):
+    first = [month(50000.0), month(50000.0), month(50000.0)]
+    second = [month(20000.0, "Unpaid")]
+    response = client.post("/evaluate/batch", json={"items": [
+        item("batch-duplicate", first, premium=100.0),
+        item("batch-duplicate", second, premium=250.0),
+    ]})
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["succeeded"], body["failed"]) == (2, 0)
+    a, b = body["results"]
+    assert a["user"]["id"] == b["user"]["id"]
+
+    # Each item is scored on its own history; the member is stored once, with the first history
+    assert a["evaluation"]["paid_months"] == 3
+    assert b["evaluation"]["unpaid_months"] == 1
+    assert stored_amounts(a["user"]["id"]) == [50000.0] * 3
+
+    # Without a history the stored member is scored from user_stats
+    again = client.post("/evaluate/batch", json={"items": [item("batch-duplicate", [])]}).json()
+    assert again["results"][0]["user"]["id"] == a["user"]["id"]
+    assert again["results"][0]["evaluation"]["mu"] == pytest.approx(50000.0)
+
+
+def test_oversized_batch_is_rejected(client, monkeypatch):
+    monkeypatch.setattr(main, "MAX_BATCH_ITEMS", 1)
+    response = client.post("/evaluate/batch", json={"items": [item("batch-x", []), item("batch-y", [])]})
+    assert response.status_code == 413
@@ -0,0 +1,162 @@
+import os
+import stat
+import threading
+import time
+
+import pytest
+from cryptography.fernet import Fernet # pyre-ignore[21]
+
+import cache_backend # pyre-ignore[21]
+from cache_backend import FileCache, SQLiteCache, shared_cache # pyre-ignore[21]
+
+
+@pytest.fixture(params=["sqlite", "file"])
+def backend(request, tmp_path):
+    if request.param == "sqlite":
+        cache = SQLiteCache(str(tmp_path / "cache.db"), lease_secs=0.3)
+    else:
+        cache = FileCache(str(tmp_path / "cache"), lease_secs=0.3)
+    cache.poll_interval = 0.01
+    return cache
+
+
+@pytest.fixture
+def shared(monkeypatch, tmp_path):
+    """Points shared_cache at a fresh SQLite backend with no IDCS_CACHE_KEY."""
+    cache = SQLiteCache(str(tmp_path / "shared.db"))
+    cache.poll_interval = 0.01
+    monkeypatch.setattr(cache_backend, "_backend", cache)
+    monkeypatch.setattr(cache_backend, "CACHE_KEY", "")
+    monkeypatch.setattr(cache_backend, "_cipher", None)
+    return cache
+
+
+def use_key(monkeypatch, key):
+    monkeypatch.setattr(cache_backend, "CACHE_KEY", key.decode("utf-8"))
+    monkeypatch.setattr(cache_backend, "_cipher", None)
+
+
+class Counter:
+    def __init__(self, value="value", delay=0.0):
+        self.calls = 0
+        self.value = value
+        self.delay = delay
+
+    def __call__(self, *args, **kwargs):
+        self.calls += 1
+        time.sleep(self.delay)
+        return self.value
+
+
+# --- Backends ---
+
+def test_set_get_delete_and_expiry(backend):
+    assert backend.get("k") == (False, None)
+    backend.set("k", {"rows": [1, 2]}, ttl=60)
+    assert backend.get("k") == (True, {"rows": [1, 2]})
+    backend.delete("k")
+    assert backend.get("k") == (False, None)
+
+    backend.set("k", "stale", ttl=-1)
+    assert backend.get("k") == (False, None)
+
+
+def test_concurrent_misses_fill_once(backend):
+    compute = Counter(delay=0.1)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(backend.get_or_compute("k", compute, ttl=60)))
+               for _ in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(5)
+    assert results == ["value"] * 5
+    assert compute.calls == 1
+
+
+def test_dead_holders_lease_expires(backend):
+    # A holder that never releases (its process died): the next caller takes over after lease_secs
+    assert backend._acquire("k")
+    time.sleep(0.15)
+    compute = Counter()
+    start = time.monotonic()
+    assert backend.get_or_compute("k", compute, ttl=60) == "value"
+    assert time.monotonic() - start >= 0.1
+    assert compute.calls == 1
+    assert backend.get("k") == (True, "value")
+
+
+def test_should_cache_rejects_value(backend):
+    compute = Counter(value=None)
+    for _ in range(2):
+        assert backend.get_or_compute("k", compute, ttl=60, should_cache=lambda v: v is not None) is None
+    assert compute.calls == 2
+    assert backend.get("k") == (False, None)
+
+
+def test_files_are_private(tmp_path):
+    SQLiteCache(str(tmp_path / "cache.db"))
+    assert stat.S_IMODE(os.stat(tmp_path / "cache.db").st_mode) == 0o600
+
+    cache = FileCache(str(tmp_path / "cache"))
+    cache.set("k", 1, ttl=60)
+    assert stat.S_IMODE(os.stat(tmp_path / "cache").st_mode) & 0o077 == 0
+    assert stat.S_IMODE(os.stat(cache._path("k", ".pkl")).st_mode) == 0o600
+
+
+# --- shared_cache ---
+
+def test_shared_cache_reuses_and_forgets(shared):
+    fn = Counter()
+    cached = shared_cache("test-ns")(fn)
+    assert cached("a", n=1) == cached("a", n=1) == "value"
+    assert fn.calls == 1
+    assert shared.get(cached.cache_key("a", n=1)) == (True, "value")
+
+    cache_backend.forget([cached.cache_key("a", n=1)])
+    assert shared.get(cached.cache_key("a", n=1)) == (False, None)
+    cached("a", n=1)
+    assert fn.calls == 2
+
+
+def test_shared_cache_should_cache(shared):
+    fn = Counter(value="")
+    cached = shared_cache("test-ns", should_cache=bool)(fn)
+    cached("a")
+    cached("a")
+    assert fn.calls == 2
+
+
+def test_sensitive_not_shared_without_key(shared):
+    fn = Counter(value="statement rows")
+    cached = shared_cache("test-sensitive", sensitive=True)(fn)
+    cached(b"pdf")
+    cached(b"pdf")
+    assert fn.calls == 2
+    assert shared.get(cached.cache_key(b"pdf")) == (False, None)
+
+
+def test_sensitive_encrypted_at_rest(shared, monkeypatch):
+    use_key(monkeypatch, Fernet.generate_key())
+    fn = Counter(value="statement rows")
+    cached = shared_cache("test-sensitive", sensitive=True, should_cache=bool)(fn)
+    assert cached(b"pdf") == cached(b"pdf") == "statement rows"
+    assert fn.calls == 1
+
+    hit, token = shared.get(cached.cache_key(b"pdf"))
+    assert hit and isinstance(token, bytes)
+    assert b"statement rows" not in token
+
+    # Another key (rotation) can't decrypt the entry: it is dropped and recomputed
+    use_key(monkeypatch, Fernet.generate_key())
+    assert cached(b"pdf") == "statement rows"
+    assert fn.calls == 2
+    assert shared.get(cached.cache_key(b"pdf")) == (False, None)
+
+
+def test_sensitive_should_cache_sees_plain_value(shared, monkeypatch):
+    use_key(monkeypatch, Fernet.generate_key())
+    fn = Counter(value="")
+    cached = shared_cache("test-sensitive", sensitive=True, should_cache=bool)(fn)
+    cached(b"pdf")
+    assert shared.get(cached.cache_key(b"pdf")) == (False, None)
@@ -0,0 +1,117 @@
+import csv
+import uuid
+
+import pytest
+
+import db_pool # pyre-ignore[21]
+import repository # pyre-ignore[21]
+from import_portfolio import import_batch, run_import # pyre-ignore[21]
+from migrations import BULK_LOAD_OBJECTS # pyre-ignore[21]
+
+COLUMNS = ["name", "email", "age", "employment_type", "month_index", "income_amount", "status"]
+
+
+def write_csv(path, rows, columns=COLUMNS):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=columns, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(rows)
+    return str(path)
+
+
+def member_rows(name, amounts, email="", status="Paid"):
+    return [{"name": name, "email": email, "age": "34", "employment_type": "Gig", "month_index": str(m),
+             "income_amount": amount, "status": status} for m, amount in enumerate(amounts, 1)]
+
+
+def unique(name):
+    # run_import writes to the session's shared test database
+    return f"{name}-{uuid.uuid4().hex[:8]}"
+
+
+def stored(name):
+    with db_pool.transaction() as conn:
+        user = repository.find_user_by_name(conn, name)
+        return (repository.get_income_history(conn, user["id"]),
+                repository.get_user_stats(conn, user["id"]))
+
+
+def bulk_load_objects():
+    with db_pool.transaction() as conn:
+        names = {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type IN ('index', 'trigger')")}
+    return {name for _, name, _ in BULK_LOAD_OBJECTS} & names
+
+
+# --- run_import ---
+
+def test_rerun_upserts_instead_of_duplicating(tmp_path):
+    name = unique("Wanjiru")
+    path = write_csv(tmp_path / "book.csv", member_rows(name, ["30000", "32000", "31000"]))
+    assert run_import(path, "csv", batch_size=2, defer_indexes=False)["skipped"] == 0
+
+    corrected = member_rows(name, ["30000", "12000", "31000", "33000"])
+    run_import(write_csv(tmp_path / "corrected.csv", corrected), "csv", batch_size=2, defer_indexes=False)
+    history, stats = stored(name)
+    assert [m["amount"] for m in history] == [30000.0, 12000.0, 31000.0, 33000.0]
+    assert stats["n"] == 4
+    assert stats["mean"] == pytest.approx(26500.0)
+    assert stats["dip_count"] == 1
+
+
+def test_blank_amount_is_null_and_unusable_rows_skipped(tmp_path):
+    name = unique("Otieno")
+    rows = member_rows(name, ["25000", "", "27000"], status="")
+    rows += [dict(rows[0], name=""), dict(rows[0], month_index="x"), dict(rows[0], month_index="9", income_amount="n/a")]
+    summary = run_import(write_csv(tmp_path / "book.csv", rows), "csv", batch_size=100, defer_indexes=False)
+    assert summary["skipped"] == 3
+
+    history, stats = stored(name)
+    assert [(m["amount"], m["status"]) for m in history] == [(25000.0, None), (None, None), (27000.0, None)]
+    # NULL counts as 0 in user_stats, as in the API's evaluation input
+    assert stats["n"] == 3 and stats["total"] == pytest.approx(52000.0)
+    assert stats["paid_count"] == stats["unpaid_count"] == 0
+
+
+def test_defer_indexes_restores_triggers_and_stats(tmp_path):
+    names = [unique("Achieng"), unique("Kamau")]
+    rows = member_rows(names[0], ["40000", "41000", "10000"]) + member_rows(names[1], ["20000", ""])
+    all_objects = bulk_load_objects()
+    assert all_objects == {name for _, name, _ in BULK_LOAD_OBJECTS}
+
+    run_import(write_csv(tmp_path / "book.csv", rows), "csv", batch_size=2, defer_indexes=True)
+    assert bulk_load_objects() == all_objects
+    _, stats = stored(names[0])
+    assert (stats["n"], stats["dip_count"], stats["paid_count"]) == (3, 1, 3)
+    assert stats["mean"] == pytest.approx(30333.333333)
+    _, stats = stored(names[1])
+    assert (stats["n"], stats["total"]) == (2, 20000.0)
+
+    # The restored insert trigger keeps stats current again
+    with db_pool.transaction() as conn:
+        user_id = repository.find_user_by_name(conn, names[1])["id"]
+        conn.execute(repository.SQL_INSERT_INCOME, (user_id, 3, 22000.0, "Paid"))
+    assert stored(names[1])[1]["n"] == 3
+
+
+def test_defer_indexes_restores_after_failed_load(tmp_path):
+    path = write_csv(tmp_path / "bad.csv", [{"name": unique("Njeri"), "month_index": "1"}], columns=["name", "month_index"])
+    with pytest.raises(ValueError, match="income_amount"):
+        run_import(path, "csv", batch_size=10, defer_indexes=True)
+    assert bulk_load_objects() == {name for _, name, _ in BULK_LOAD_OBJECTS}
+
+
+# --- Duplicate emails ---
+
+def test_duplicate_email_skips_member_not_batch(db_conn):
+    repository.register_user(db_conn, "taken@example.com", b"hash", "Existing Member")
+    db_conn.commit()
+    rows = (member_rows("Clash With Existing", ["1000", "2000"], email="taken@example.com")
+            + member_rows("First Sharer", ["3000"], email="shared@example.com")
+            + member_rows("Second Sharer", ["4000", "5000"], email="shared@example.com")
+            + member_rows("No Email", ["6000"]))
+    user_ids = {}
+    assert import_batch(db_conn, rows, user_ids, preloaded=False) == 4
+    assert set(user_ids) == {"First Sharer", "No Email"}
+    assert [m["amount"] for m in repository.get_income_history(db_conn, user_ids["First Sharer"])] == [3000.0]
+    assert repository.find_user_by_name(db_conn, "Second Sharer") is None
+    assert not db_conn.in_transaction
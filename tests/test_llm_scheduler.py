@@ -0,0 +1,166 @@
+import io
+import threading
+import time
+
+import pytest
+
+from data_handler import ExtractionError, IncomeVisionExtractor # pyre-ignore[21]
+from llm_scheduler import LLMRequestScheduler, RetryableError, default_is_retryable # pyre-ignore[21]
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeModel:
+    """Stands in for genai.GenerativeModel: replays `outcomes` (exceptions are raised) and counts calls."""
+
+    def __init__(self, *outcomes, gate=None):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+        self.gate = gate
+
+    def generate_content(self, prompt):
+        self.calls += 1
+        if self.gate is not None:
+            self.gate.wait(5)
+        outcome = self.outcomes[min(self.calls, len(self.outcomes)) - 1]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return FakeResponse(outcome)
+
+
+class HTTPError(Exception):
+    def __init__(self, code):
+        super().__init__(f"HTTP {code}")
+        self.code = code
+
+
+def make_scheduler(**kwargs):
+    return LLMRequestScheduler(rate_per_sec=0, sleep=lambda _: None, **kwargs)
+
+
+def minimal_pdf(text: str) -> bytes:
+    stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode()
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R"
+        b" /Resources << /Font << /F1 5 0 R >> >> >>",
+        b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+    xref = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for offset in offsets:
+        out.write(b"%010d 00000 n \n" % offset)
+    out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+    return out.getvalue()
+
+
+STATEMENT = minimal_pdf("01/02/2025 Received from ACME 5000.00")
+INFLOWS_JSON = '{"inflows": [{"date": "01/02/2025", "amount": 5000, "description": "ACME"}]}'
+
+
+# --- Retry filter ---
+
+@pytest.mark.parametrize("exc", [
+    ConnectionResetError(), TimeoutError(), RetryableError(), HTTPError(429), HTTPError(503),
+])
+def test_transient_errors_are_retried(exc):
+    assert default_is_retryable(exc)
+
+
+@pytest.mark.parametrize("exc", [
+    RuntimeError("bug"), AttributeError("text"), ValueError(), HTTPError(400), HTTPError(403),
+])
+def test_other_errors_fail_fast(exc):
+    assert not default_is_retryable(exc)
+
+
+# --- Scheduler against a fake client ---
+
+def test_retries_transient_failure_then_succeeds():
+    model = FakeModel(ConnectionResetError("reset"), HTTPError(503), "ok")
+    scheduler = make_scheduler()
+    assert scheduler.submit(lambda: model.generate_content("p").text) == "ok"
+    assert model.calls == 3
+    assert scheduler.stats["retries"] == 2
+
+
+def test_non_transient_failure_is_not_retried():
+    model = FakeModel(RuntimeError("bad request"))
+    scheduler = make_scheduler()
+    with pytest.raises(RuntimeError):
+        scheduler.submit(lambda: model.generate_content("p").text)
+    assert model.calls == 1
+    assert scheduler.stats["failures"] == 1
+
+
+def test_gives_up_after_max_retries():
+    model = FakeModel(TimeoutError("slow"))
+    scheduler = make_scheduler(max_retries=2)
+    with pytest.raises(TimeoutError):
+        scheduler.submit(lambda: model.generate_content("p").text)
+    assert model.calls == 3
+
+
+def test_stats_count_every_call_from_concurrent_threads():
+    scheduler = make_scheduler(max_concurrency=8)
+
+    def call():
+        for _ in range(200):
+            model = FakeModel(ConnectionResetError("reset"), "ok")
+            scheduler.submit(lambda: model.generate_content("p").text)
+
+    threads = [threading.Thread(target=call) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(10)
+    assert scheduler.stats["calls"] == 8 * 200 * 2
+    assert scheduler.stats["retries"] == 8 * 200
+
+
+def test_identical_inflight_requests_share_one_call():
+    gate = threading.Event()
+    model = FakeModel("shared", gate=gate)
+    scheduler = make_scheduler()
+    key = scheduler.make_key("model", "extract", "same prompt")
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(scheduler.submit(lambda: model.generate_content("p").text, key=key)))
+               for _ in range(3)]
+    for t in threads:
+        t.start()
+    deadline = time.monotonic() + 5
+    while scheduler.stats["coalesced"] < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    gate.set()
+    for t in threads:
+        t.join(5)
+    assert results == ["shared"] * 3
+    assert model.calls == 1
+
+
+# --- Extractor ---
+
+def test_extract_inflows_returns_validated_rows():
+    extractor = IncomeVisionExtractor(model=FakeModel(INFLOWS_JSON), scheduler=make_scheduler())
+    assert extractor.extract_inflows(STATEMENT) == [{"date": "2025-02-01", "amount": 5000.0, "description": "ACME"}]
+
+
+def test_extract_inflows_raises_instead_of_returning_empty():
+    extractor = IncomeVisionExtractor(model=FakeModel(HTTPError(403)), scheduler=make_scheduler())
+    with pytest.raises(ExtractionError):
+        extractor.extract_inflows(STATEMENT)
+
+    extractor = IncomeVisionExtractor(model=FakeModel("not json"), scheduler=make_scheduler())
+    with pytest.raises(ExtractionError):
+        extractor.extract_inflows(STATEMENT)
@@ -0,0 +1,115 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from session_store import SessionQuotaError, SessionStore, nbytes # pyre-ignore[21]
+
+
+def frame(rows=1000, label="ACME"):
+    return pd.DataFrame({"amount": np.arange(rows, dtype=float), "description": label})
+
+
+SIZE = nbytes(frame())
+
+
+class Build:
+    """View builder that counts how often it runs."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, df):
+        self.calls += 1
+        return df["amount"].sum()
+
+
+# --- Datasets & views ---
+
+def test_views_are_memoized_and_invalidated_by_put():
+    store = SessionStore()
+    build = Build()
+    assert store.view("s", "tx", "total", build) is None
+    assert build.calls == 0
+
+    store.put("s", "tx", frame(10))
+    assert store.view("s", "tx", "total", build) == store.view("s", "tx", "total", build) == 45.0
+    assert build.calls == 1
+
+    store.put("s", "tx", frame(5))
+    assert store.view("s", "tx", "total", build) == 10.0
+    assert build.calls == 2
+
+    store.drop("s", "tx")
+    assert store.get("s", "tx") is None
+    assert store.view("s", "tx", "total", build) is None
+
+
+def test_quota_rejects_oversized_dataset():
+    store = SessionStore(session_max_bytes=int(SIZE * 1.5))
+    store.put("s", "tx", frame())
+    with pytest.raises(SessionQuotaError):
+        store.put("s", "other", frame())
+    # The failed put changed nothing; replacing a dataset only counts the difference
+    assert store.get("s", "other") is None
+    replaced = frame(label="replaced")
+    store.put("s", "tx", replaced)
+    assert store.get("s", "tx") is replaced
+    assert store.stats()["resident_bytes"] == nbytes(replaced)
+
+
+def test_view_over_quota_is_returned_but_not_kept():
+    store = SessionStore(session_max_bytes=int(SIZE * 1.5))
+    store.put("s", "tx", frame())
+    build = Build()
+    copy = lambda df: (build(df), df.copy())[1]
+    assert len(store.view("s", "tx", "copy", copy)) == 1000
+    assert len(store.view("s", "tx", "copy", copy)) == 1000
+    assert build.calls == 2
+    assert store.stats()["resident_bytes"] == SIZE
+
+
+# --- Global cap ---
+
+def test_least_recently_used_session_is_evicted():
+    store = SessionStore(store_max_bytes=int(SIZE * 2.5))
+    store.put("a", "tx", frame())
+    store.put("b", "tx", frame())
+    store.get("a", "tx")  # a is now more recent than b
+    store.put("c", "tx", frame())
+    assert store.get("b", "tx") is None
+    assert store.get("a", "tx") is not None and store.get("c", "tx") is not None
+    assert store.stats() == {"sessions": 2, "resident_sessions": 2, "resident_bytes": 2 * SIZE}
+
+
+def test_spilled_session_is_encrypted_and_reloaded(tmp_path):
+    store = SessionStore(store_max_bytes=int(SIZE * 1.5), spill_dir=str(tmp_path))
+    store.put("a", "tx", frame(label="SECRET-EMPLOYER"))
+    store.view("a", "tx", "total", Build())
+    store.put("b", "tx", frame())
+
+    spill = tmp_path / "a.pkl"
+    assert spill.exists()
+    assert os.stat(spill).st_mode & 0o077 == 0
+    assert b"SECRET-EMPLOYER" not in spill.read_bytes()
+    assert store.stats() == {"sessions": 2, "resident_sessions": 1, "resident_bytes": SIZE}
+
+    # Reloading a spills b in turn; views are rebuilt on demand
+    pd.testing.assert_frame_equal(store.get("a", "tx"), frame(label="SECRET-EMPLOYER"))
+    assert not spill.exists() and (tmp_path / "b.pkl").exists()
+    build = Build()
+    store.view("a", "tx", "total", build)
+    assert build.calls == 1
+
+    store.drop("b")
+    assert not (tmp_path / "b.pkl").exists()
+    assert store.stats()["sessions"] == 1
+
+
+def test_idle_sessions_expire():
+    store = SessionStore(ttl_secs=0)
+    store.put("a", "tx", frame())
+    store._last_sweep = float("-inf")
+    assert store.get("a", "tx") is None
+    assert store.stats() == {"sessions": 0, "resident_sessions": 0, "resident_bytes": 0}
@@ -0,0 +1,116 @@
+import numpy as np
+import pytest
+
+import repository # pyre-ignore[21]
+from engine import IDCS_Engine # pyre-ignore[21]
+from import_portfolio import SQL_UPSERT_INCOME # pyre-ignore[21]
+
+ENGINE = IDCS_Engine()
+SRC_CAP = 40000.0
+
+# (amount, status): NULL amounts and statuses, and statuses other than Paid/Unpaid
+MONTHS = [
+    (52000.0, "Paid"), (48000.0, "Paid"), (None, "Unpaid"), (51000.0, None),
+    (30000.0, "Pending"), (50500.0, "Paid"), (49000.0, "Paid"), (20000.0, "Unpaid"),
+]
+
+COMPARED = ("mu", "sigma", "stability_score", "dip_detected", "eligible", "payout",
+            "paid_months", "unpaid_months", "dip_probability")
+
+
+def stored_history(conn, user_id):
+    """What the API feeds calculate_metrics: NULL amounts count as 0, as in user_stats."""
+    return [{"amount": r["amount"] if r["amount"] is not None else 0.0, "status": r["status"]}
+            for r in repository.get_income_history(conn, user_id)]
+
+
+def assert_stats_match_history(conn, user_id):
+    history = stored_history(conn, user_id)
+    amounts = np.array([h["amount"] for h in history])
+    stats = repository.get_user_stats(conn, user_id)
+
+    assert stats["n"] == len(history)
+    assert stats["total"] == pytest.approx(amounts.sum())
+    assert stats["mean"] == pytest.approx(amounts.mean())
+    assert stats["m2"] == pytest.approx(((amounts - amounts.mean()) ** 2).sum(), rel=1e-9, abs=1e-3)
+    assert stats["dip_count"] == int((amounts < 0.8 * amounts.mean()).sum())
+    assert stats["paid_count"] == sum(h["status"] == "Paid" for h in history)
+    assert stats["unpaid_count"] == sum(h["status"] == "Unpaid" for h in history)
+
+    for current_income in (10000.0, 60000.0):
+        full = ENGINE.calculate_metrics(history, SRC_CAP, current_income)
+        fast = ENGINE.metrics_from_stats(stats, SRC_CAP, current_income)
+        for field in COMPARED:
+            assert fast[field] == pytest.approx(full[field]), field
+        if ENGINE.needs_full_history(stats):
+            # Repeated dips: the pattern check needs month positions, so stats report HIGH
+            assert fast["risk_level"] == "HIGH"
+        else:
+            assert fast["risk_level"] == full["risk_level"]
+    return stats
+
+
+def test_insert_trigger_matches_full_history(db_conn):
+    user_id = repository.create_user(db_conn, "Asha", 31, "Gig")
+    for month, (amount, status) in enumerate(MONTHS, 1):
+        db_conn.execute(repository.SQL_INSERT_INCOME, (user_id, month, amount, status))
+        assert_stats_match_history(db_conn, user_id)
+
+
+def test_stats_fast_path_can_be_eligible(db_conn):
+    user_id = repository.create_user(db_conn, "Ravi", 40, "Salaried")
+    repository.add_income_history(db_conn, user_id, [
+        {"amount": amount, "status": "Paid"} for amount in (50000.0, 51000.0, 49500.0, 50500.0)])
+    stats = assert_stats_match_history(db_conn, user_id)
+    assert ENGINE.metrics_from_stats(stats, SRC_CAP, 10000.0)["eligible"]
+
+
+def test_update_trigger_recomputes_changed_months(db_conn):
+    user_id = repository.create_user(db_conn, "Meera", 28, "Gig")
+    other_id = repository.create_user(db_conn, "Kiran", 35, "Gig")
+    for month, (amount, status) in enumerate(MONTHS, 1):
+        db_conn.execute(repository.SQL_INSERT_INCOME, (user_id, month, amount, status))
+        db_conn.execute(repository.SQL_INSERT_INCOME, (other_id, month, amount, status))
+    other_before = repository.get_user_stats(db_conn, other_id)
+
+    updates = [
+        (3, 47000.0, "Paid"),     # NULL amount filled in
+        (1, None, "Paid"),        # amount cleared
+        (5, 30000.0, "Unpaid"),   # status only
+        (4, 51000.0, "Paid"),     # NULL status set
+        (2, 48000.0, None),       # status cleared
+    ]
+    for month, amount, status in updates:
+        db_conn.execute("UPDATE income_history SET income_amount = ?, status = ? WHERE user_id = ? AND month_index = ?",
+                        (amount, status, user_id, month))
+        assert_stats_match_history(db_conn, user_id)
+
+    assert repository.get_user_stats(db_conn, other_id) == other_before
+
+
+def test_import_upsert_updates_stats(db_conn):
+    user_id = repository.create_user(db_conn, "Dev", 45, "Gig")
+    db_conn.executemany(SQL_UPSERT_INCOME, [(user_id, m, a, s) for m, (a, s) in enumerate(MONTHS, 1)])
+    assert_stats_match_history(db_conn, user_id)
+
+    # Re-running an import overwrites months in place; new months still go through the insert trigger
+    db_conn.executemany(SQL_UPSERT_INCOME, [(user_id, 2, None, "Unpaid"), (user_id, 9, 45000.0, "Paid")])
+    stats = assert_stats_match_history(db_conn, user_id)
+    assert stats["n"] == len(MONTHS) + 1
+
+
+@pytest.mark.parametrize("stats, expected", [
+    (None, False),
+    ({"n": 0, "dip_count": 0}, False),
+    ({"n": 6, "dip_count": 1}, False),
+    ({"n": 6, "dip_count": 2}, True),
+])
+def test_needs_full_history(stats, expected):
+    assert IDCS_Engine.needs_full_history(stats) is expected
+
+
+def test_metrics_from_missing_stats_match_empty_history():
+    full = ENGINE.calculate_metrics([], SRC_CAP, 1000.0)
+    fast = ENGINE.metrics_from_stats(None, SRC_CAP, 1000.0)
+    for field in COMPARED + ("risk_level",):
+        assert fast[field] == full[field], field
@@ -0,0 +1,231 @@
+import argparse
+import contextvars
+import functools
+import json
+import os
+import statistics
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional
+
+# --- Stage Tracing ---
+# Spans around each pipeline stage (PDF text, Gemini, grouping, Prophet, evaluation, charts)
+# are appended as one JSON object per line to the trace log:
+#
+#   {"ts": ..., "trace_id": "...", "span_id": "...", "parent_id": "...", "name": "gemini.extract",
+#    "duration_ms": 8123.4, "status": "ok", "pid": 4242, "attrs": {...}}
+#
+# trace_id is the correlation id: one per API request (X-Request-ID) or Streamlit session.
+# Each line is a single O_APPEND write, so the API, Streamlit and forecast workers can share a file.
+#
+#   python tracing.py summary --top 15      # slowest stages by p95
+#   python tracing.py show <trace_id>       # span tree for one request/session
+#
+# Off by default: the log is append-only and never rotated, so turn it on (IDCS_TRACE=1) for
+# investigations or behind external rotation (logrotate copytruncate). With it off spans and
+# the middleware are no-ops. IDCS_TRACE_LOG picks the file (default trace.log).
+
+TRACE_LOG = os.environ.get("IDCS_TRACE_LOG", "trace.log")
+ENABLED = os.environ.get("IDCS_TRACE", "0") == "1"
+
+_trace_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("idcs_trace_id", default=None)
+_parent_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("idcs_parent_span", default=None)
+_fd: Optional[int] = None
+
+
+def new_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def current_trace_id() -> Optional[str]:
+    return _trace_id.get()
+
+
+def set_trace_id(trace_id: Optional[str]):
+    """Binds the correlation id for the rest of the current thread/task (e.g. one Streamlit rerun)."""
+    _trace_id.set(trace_id)
+    _parent_id.set(None)
+
+
+@contextmanager
+def trace_context(trace_id: Optional[str] = None) -> Iterator[str]:
+    trace_id = trace_id or new_id()
+    token = _trace_id.set(trace_id)
+    parent_token = _parent_id.set(None)
+    try:
+        yield trace_id
+    finally:
+        _parent_id.reset(parent_token)
+        _trace_id.reset(token)
+
+
+def _write(record: Dict):
+    global _fd
+    if _fd is None:
+        _fd = os.open(TRACE_LOG, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+    os.write(_fd, (json.dumps(record, default=str) + "\n").encode("utf-8"))
+
+
+@contextmanager
+def span(name: str, **attrs) -> Iterator[Dict]:
+    """
+    Times the enclosed block as one stage. The yielded dict can be updated with attributes
+    that are only known at the end (row counts, cache hits). Never raises because of tracing.
+    """
+    if not ENABLED:
+        yield attrs
+        return
+
+    span_id = new_id()
+    parent_id = _parent_id.get()
+    parent_token = _parent_id.set(span_id)
+    status = "ok"
+    start = time.perf_counter()
+    ts = time.time()
+    try:
+        yield attrs
+    except BaseException as e:
+        status = f"error:{type(e).__name__}"
+        raise
+    finally:
+        duration_ms = (time.perf_counter() - start) * 1000
+        _parent_id.reset(parent_token)
+        try:
+            _write({
+                "ts": round(ts, 3),
+                "trace_id": _trace_id.get(),
+                "span_id": span_id,
+                "parent_id": parent_id,
+                "name": name,
+                "duration_ms": round(duration_ms, 3),
+                "status": status,
+                "pid": os.getpid(),
+                "attrs": attrs
+            })
+        except OSError:
+            pass
+
+
+def traced(name: str) -> Callable:
+    """Decorator form of `span` for whole functions."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class TracingMiddleware:
+    """Pure ASGI middleware: one trace per request, id taken from / echoed in X-Request-ID."""
+
+    header = b"x-request-id"
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        incoming = dict(scope.get("headers") or []).get(self.header)
+        trace_id = incoming.decode("latin-1")[:64] if incoming else new_id()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(self.header, trace_id.encode("latin-1"))]
+            await send(message)
+
+        with trace_context(trace_id):
+            with span("http.request", method=scope["method"], path=scope["path"]) as attrs:
+                await self.app(scope, receive, send_wrapper)
+                route = scope.get("route")
+                if route is not None:
+                    attrs["route"] = getattr(route, "path", None)
+
+
+# --- Trace log summary CLI ---
+
+def read_spans(path: str, since: Optional[float] = None) -> Iterator[Dict]:
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # a partially written last line
+            if since is None or record.get("ts", 0) >= since:
+                yield record
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    idx = min(len(sorted_values) - 1, max(0, int(round(q * (len(sorted_values) - 1)))))
+    return sorted_values[idx]
+
+
+def summarize(path: str, top: int, since: Optional[float] = None):
+    durations: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+    for record in read_spans(path, since):
+        # Request spans are broken down per route template
+        route = record.get("attrs", {}).get("route")
+        stage = f"{record['name']} {route}" if route else record["name"]
+        durations[stage].append(record["duration_ms"])
+        if record.get("status", "ok") != "ok":
+            errors[stage] += 1
+
+    rows = []
+    for name, values in durations.items():
+        values.sort()
+        rows.append((name, len(values), statistics.median(values), _percentile(values, 0.95), values[-1], sum(values), errors[name]))
+    rows.sort(key=lambda r: r[3], reverse=True)
+
+    print(f"{'stage':<40} {'count':>7} {'p50 ms':>10} {'p95 ms':>10} {'max ms':>10} {'total s':>9} {'errors':>7}")
+    for name, count, p50, p95, worst, total, errs in rows[:top]:
+        print(f"{name:<40} {count:>7} {p50:>10.1f} {p95:>10.1f} {worst:>10.1f} {total / 1000:>9.1f} {errs:>7}")
+
+
+def show_trace(path: str, trace_id: str):
+    spans = [r for r in read_spans(path) if r.get("trace_id") == trace_id]
+    if not spans:
+        print(f"No spans for trace {trace_id}")
+        return
+    children: Dict[Optional[str], List[Dict]] = defaultdict(list)
+    ids = {r["span_id"] for r in spans}
+    for r in spans:
+        # Spans whose parent is in another process (or not written yet) are shown as roots
+        children[r["parent_id"] if r["parent_id"] in ids else None].append(r)
+
+    def render(parent, depth):
+        for r in sorted(children[parent], key=lambda r: r["ts"]):
+            attrs = " ".join(f"{k}={v}" for k, v in r.get("attrs", {}).items())
+            print(f"{'  ' * depth}{r['name']:<{40 - 2 * depth}} {r['duration_ms']:>10.1f} ms  {r['status']}  {attrs}")
+            render(r["span_id"], depth + 1)
+
+    render(None, 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize IDCS stage traces")
+    parser.add_argument("--log", default=TRACE_LOG, help="Trace log to read")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_summary = sub.add_parser("summary", help="Slowest stages by p95 latency")
+    p_summary.add_argument("--top", type=int, default=20)
+    p_summary.add_argument("--minutes", type=float, help="Only spans from the last N minutes")
+    p_show = sub.add_parser("show", help="Span tree for one correlation id")
+    p_show.add_argument("trace_id")
+    args = parser.parse_args()
+
+    if args.command == "summary":
+        since = time.time() - args.minutes * 60 if args.minutes else None
+        summarize(args.log, args.top, since)
+    else:
+        show_trace(args.log, args.trace_id)
+
+
+if __name__ == "__main__":
+    main()